@@ -0,0 +1,117 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Platform registry contention benchmark.
+
+Readers list the platforms with a slow event queue while writers register
+and dismiss platforms. Reported latencies are the ones of writers.
+
+   $ PYTHONPATH=packages python3 benchmark/registry.py
+"""
+
+from storm.engine import Engine
+from storm.module import resource
+
+import argparse
+import threading
+import time
+
+class SlowEventQueue:
+
+	def __init__(self, delay):
+	
+		self.__delay = delay
+		
+	def dispatch(self, task, name, value):
+	
+		if name == "platform-entry":
+			time.sleep(self.__delay)
+			
+def percentile(values, ratio):
+
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * ratio))]
+	
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+	parser.add_argument("--platforms", type=int, default=200)
+	parser.add_argument("--readers", type=int, default=8)
+	parser.add_argument("--writers", type=int, default=4)
+	parser.add_argument("--duration", type=float, default=5.)
+	parser.add_argument("--delay", type=float, default=0.0001)
+	args = parser.parse_args()
+	
+	engine = Engine(
+		resource.ref("mem:///benchmark/state.json"),
+		SlowEventQueue(args.delay),
+		max_workers=args.readers + args.writers + 1
+	)
+	for i in range(args.platforms):
+		engine.register("platform-{}".format(i), "none").result()
+		
+	stop = threading.Event()
+	reads = []
+	latencies = []
+	
+	def reader():
+	
+		count = 0
+		while not stop.is_set():
+			engine.platforms().result()
+			count = count + 1
+		reads.append(count)
+		
+	def writer(index):
+	
+		count = 0
+		while not stop.is_set():
+			name = "writer-{}-{}".format(index, count)
+			start = time.perf_counter()
+			engine.register(name, "none").result()
+			engine.dismiss(name).result()
+			latencies.append(time.perf_counter() - start)
+			count = count + 1
+			
+	threads = [
+		threading.Thread(target=reader)
+		for i in range(args.readers)
+	]
+	threads.extend(
+		threading.Thread(target=writer, args=(i, ))
+		for i in range(args.writers)
+	)
+	for thread in threads:
+		thread.start()
+	time.sleep(args.duration)
+	stop.set()
+	for thread in threads:
+		thread.join()
+		
+	print("listings: {}".format(sum(reads)))
+	print("writes: {}".format(len(latencies)))
+	if len(latencies) > 0:
+		print("write p50: {:.3f} ms".format(
+			percentile(latencies, 0.5) * 1000
+		))
+		print("write p99: {:.3f} ms".format(
+			percentile(latencies, 0.99) * 1000
+		))
+		
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Engine startup benchmark.
+
+Starts an engine whose state holds many platforms of a provider taking some
+time to create each platform, and reports the startup time, the time of the
+first watch and the time of preloading every platform.
+
+   $ PYTHONPATH=packages python3 benchmark/startup.py
+"""
+
+from storm.engine import Engine
+from storm.module import resource
+
+import argparse
+import sys
+import time
+import types
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+	parser.add_argument("--platforms", type=int, default=1000)
+	parser.add_argument("--delay", type=float, default=0.001)
+	parser.add_argument("--workers", type=int, default=16)
+	args = parser.parse_args()
+	
+	class Platform:
+	
+		def __init__(self, base_res, props):
+		
+			time.sleep(args.delay)
+			
+	provider = types.ModuleType("storm.provider.platform.benchmark")
+	provider.Platform = Platform
+	sys.modules[provider.__name__] = provider
+	
+	state_res = resource.ref("mem:///benchmark/state.json")
+	engine = Engine(state_res)
+	for i in range(args.platforms):
+		engine.register("platform-{}".format(i), "benchmark", {}).result()
+	engine.store()
+	
+	start = time.perf_counter()
+	engine = Engine(state_res)
+	print("startup: {:.3f} s".format(time.perf_counter() - start))
+	
+	start = time.perf_counter()
+	engine.watch("platform-0").result()
+	print("first watch: {:.3f} s".format(time.perf_counter() - start))
+	
+	start = time.perf_counter()
+	engine.preload(max_workers=args.workers).result()
+	print("preload: {:.3f} s".format(time.perf_counter() - start))
+	
+if __name__ == "__main__":
+	main()
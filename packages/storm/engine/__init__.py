@@ -20,14 +20,34 @@ Engine module.
 """
 
 from storm.engine import layout
+from storm.engine import persister
+from storm.engine import scheduler
+from storm.engine import subscription
 
 from storm.module import jsons
 from storm.module import resolver
 from storm.module import resource
 
+import asyncio
+import atexit
 import concurrent.futures
 import importlib
+import importlib.util
+import sys
 import threading
+import time
+import weakref
+
+_engines = weakref.WeakSet()
+
+def _shutdown_all():
+
+	# Registered after the scheduler hook, so it runs first and the state
+	# changes of the completed tasks are stored
+	for engine in list(_engines):
+		engine.shutdown()
+		
+atexit.register(_shutdown_all)
 
 class Engine:
 
@@ -42,12 +62,81 @@ class Engine:
 	   Output stream.
 	:param err:
 	   Error stream.
+	:param int max_workers:
+	   Amount of threads running engine tasks.
+	:param int platform_limit:
+	   Maximum amount of tasks running on the same platform at the same time,
+	   or None for no limit.
+	:param dict platform_limits:
+	   Optional limits for specific platforms, overriding ``platform_limit``.
+	:param int reserved_workers:
+	   Amount of threads reserved for interactive tasks, which are the ones
+	   started by :meth:`platforms`, :meth:`register`, :meth:`watch` and
+	   :meth:`dismiss` without destroying. The rest are bulk tasks. At least
+	   one thread is kept for bulk tasks, so fewer threads than requested are
+	   reserved when needed.
+	:param float progress_interval:
+	   Minimum amount of seconds between the progress events of the same
+	   work.
+	:param float progress_delta:
+	   Minimum progress change between the progress events of the same work.
+	   Progress not dispatched because of these limits is dispatched along
+	   with the next progress event, or when the work is finished.
+	:param bool single_flight:
+	   If calls to :meth:`platforms` and :meth:`watch` identical to a task
+	   still in flight must share that task instead of starting a new one.
+	   Shared tasks dispatch their events to every caller, including the
+	   events dispatched before a caller joined, and are only cancelled once
+	   every caller cancelled them.
+	:param float watch_ttl:
+	   Amount of seconds the platform states retrieved by :meth:`watch` are
+	   served from cache.
+	:param float watch_stale:
+	   Amount of seconds an expired platform state is still served from
+	   cache, while it is refreshed by a background task.
+	:param float store_delay:
+	   Seconds after a platform is registered or dismissed before the state
+	   is stored in background, or None for only storing it on
+	   :meth:`store`. Changes not stored yet are stored on :meth:`shutdown`
+	   or when the process exits.
+	:raises ValueError:
+	   If ``max_workers`` is lower than one.
 	"""
 	
 	class __EngineTaskWorker:
 	
-		def __init__(self, event_queue, task_fn, out, err):
+		def __init__(
+			self,
+			event_queue,
+			task_fn,
+			out,
+			err,
+			progress_limits,
+			shared=False
+		):
 		
+			class EngineTask:
+			
+				def __init__(self, worker):
+				
+					self.__worker = worker
+					
+				def result(self, timeout=None):
+				
+					return self.__worker.result(timeout)
+					
+				def cancel(self):
+				
+					return self.__worker.cancel(self)
+					
+				def add_done_callback(self, fn):
+				
+					self.__worker.add_done_callback(self, fn)
+					
+				def snapshot(self):
+				
+					return self.__worker.snapshot()
+					
 			class PlatformTaskContext:
 			
 				def __init__(self, worker):
@@ -75,14 +164,20 @@ class Engine:
 					return self.__worker.work_start(desc)
 					
 			self.__event_queue = event_queue
+			self.__progress_limits = progress_limits
 			self.__task_fn = task_fn
 			self.__out = out
 			self.__err = err
 			self.__context = PlatformTaskContext(self)
 			self.__work_id = 0
 			self.__work_id_lock = threading.Lock()
+			self.__works = {}
+			self.__works_lock = threading.Lock()
 			self.__future = None
-			self.__engine_task = None
+			self.__task_class = EngineTask
+			self.__tasks = []
+			self.__history = [] if shared else None
+			self.__tasks_lock = threading.RLock()
 			self.__cancel_check = self.__cancel_check_pass
 				
 		def __task_run(self, *args, **kwargs):
@@ -118,34 +213,51 @@ class Engine:
 				return self.__work_id
 			finally:
 				self.__work_id = self.__work_id + 1
-				self.__worl_id_lock.release()
+				self.__work_id_lock.release()
 			
-		def submit(self, executor, args, kwargs):
+		def submit(self, executor, lane, key, args, kwargs):
 		
-			class EngineTask:
+			task = self.subscribe()
+			self.__future = executor.submit(
+				key,
+				self.__task_run,
+				args,
+				kwargs,
+				lane
+			)
+			return task
 			
-				def __init__(self, worker):
-				
-					self.__worker = worker
-				
-				def result(self, timeout=None):
-				
-					return self.__worker.result(timeout)
-				
-				def cancel(self):
+		def subscribe(self):
+		
+			with self.__tasks_lock:
+				task = self.__task_class(self)
+				for name, value in self.__history or ():
+					self.__event_queue.dispatch(task, name, value)
+				self.__tasks.append(task)
+				return task
 				
-					return self.__worker.cancel()
-					
-			self.__engine_task = EngineTask(self)
-			self.__future = executor.submit(self.__task_run, *args, **kwargs)
-			return self.__engine_task
-			
 		def result(self, timeout):
 		
 			return self.__future.result(timeout)
 			
-		def cancel(self):
+		def add_done_callback(self, task, fn):
+		
+			def done(future):
+			
+				fn(task)
+				
+			self.__future.add_done_callback(done)
+			
+		def cancel(self, task):
 		
+			# Tasks shared with other subscribers keep running for them, and
+			# detached tasks cannot cancel them anymore
+			with self.__tasks_lock:
+				if task not in self.__tasks:
+					return False
+				if len(self.__tasks) > 1:
+					self.__tasks.remove(task)
+					return False
 			cancelled = self.__future.cancel()
 			self.__cancel_check = self.__cancel_check_raise
 			return cancelled
@@ -164,14 +276,25 @@ class Engine:
 			
 		def work_start(self, desc):
 		
+			progress_interval, progress_delta = self.__progress_limits
+			
 			class PlatformTaskWork:
 			
-				def __init__(self, worker, desc, parent_id=None):
+				def __init__(self, worker, desc, parent_id=None, cost=1.):
 				
 					self.__worker = worker
 					self.__work_id = self.__worker.new_work_id()
-					self.__progress = 0.
+					self.__progress_desc = None
+					self.__progress_time = None
+					self.__progress_sent = 0.
+					self.__progress_lock = threading.Lock()
 					
+					self.__worker.work_add(
+						self.__work_id,
+						desc,
+						parent_id,
+						cost
+					)
 					self.__dispatch("started", {
 						"description": desc,
 						"parent-id": parent_id
@@ -185,57 +308,135 @@ class Engine:
 						"value": value
 					})
 					
+				def __progress_value(self, force):
+				
+					with self.__progress_lock:
+						value, ancestors = self.__worker.work_progress(
+							self.__work_id
+						)
+						now = time.monotonic()
+						delta = abs(value - self.__progress_sent)
+						if force:
+							if delta == 0.:
+								return None
+						elif self.__progress_time is not None and (
+							now - self.__progress_time < progress_interval
+							or delta < progress_delta
+						):
+							return None
+						self.__progress_time = now
+						self.__progress_sent = value
+						return {
+							"description": self.__progress_desc,
+							"value": value,
+							"ancestors": ancestors
+						}
+						
 				def context(self):
 				
 					return self.__worker.context()
 					
 				def progress(self, amount, desc=None):
 				
-					self.__progress = self.__progress + amount
-					self.__dispatch("progress", {
-						"description": desc,
-						"value": self.__progress
-					})
-					
+					with self.__progress_lock:
+						self.__worker.work_advance(self.__work_id, amount)
+						self.__progress_desc = desc
+					value = self.__progress_value(False)
+					if value is not None:
+						self.__dispatch("progress", value)
+						
 				def finished(self):
 				
+					value = self.__progress_value(True)
+					if value is not None:
+						self.__dispatch("progress", value)
+					self.__worker.work_finished(self.__work_id)
 					self.__dispatch("finished")
 					
 				def work_start(self, desc, cost):
 				
-					return PlatformTaskWorkChild(
+					return PlatformTaskWork(
 						self.__worker,
 						desc,
 						self.__work_id,
-						self,
 						cost
 					)
 					
-			class PlatformTaskWorkChild(PlatformTaskWork):
+			return PlatformTaskWork(self, desc)
 			
-				def __init__(self, worker, desc, parent_id, parent, cost):
+		def work_add(self, work_id, desc, parent_id, cost):
+		
+			with self.__works_lock:
+				self.__works[work_id] = {
+					"description": desc,
+					"parent-id": parent_id,
+					"cost": cost,
+					"value": 0.,
+					"finished": False
+				}
 				
-					super().__init__(worker, desc, parent_id)
-					self.__parent = parent
-					self.__cost = cost
+		def work_advance(self, work_id, amount):
+		
+			with self.__works_lock:
+				while work_id is not None:
+					work = self.__works[work_id]
+					work["value"] = work["value"] + amount
+					amount = work["cost"] * amount
+					work_id = work["parent-id"]
 					
-				def progress(self, amount, desc=None):
+		def work_progress(self, work_id):
+		
+			with self.__works_lock:
+				work = self.__works[work_id]
+				ancestors = []
+				parent_id = work["parent-id"]
+				while parent_id is not None:
+					parent = self.__works[parent_id]
+					ancestors.append({
+						"id": parent_id,
+						"value": parent["value"]
+					})
+					parent_id = parent["parent-id"]
+				return work["value"], ancestors
 				
-					self.__parent.progress(self.__cost * amount)
-					super().progress(amount, desc)
-					
-			return PlatformTaskWork(self, desc)
+		def work_finished(self, work_id):
+		
+			with self.__works_lock:
+				self.__works[work_id]["finished"] = True
+				
+		def snapshot(self):
+		
+			with self.__works_lock:
+				return {
+					work_id: dict(work)
+					for work_id, work in self.__works.items()
+				}
 			
 		def dispatch(self, name, value=None):
 		
-			self.__event_queue.dispatch(self.__engine_task, name, value)
+			with self.__tasks_lock:
+				if self.__history is not None:
+					self.__history.append((name, value))
+				tasks = list(self.__tasks)
+			for task in tasks:
+				self.__event_queue.dispatch(task, name, value)
 			
 	def __init__(
 		self,
 		state_res,
 		event_queue=None,
 		out=None,
-		err=None
+		err=None,
+		max_workers=10,
+		platform_limit=None,
+		platform_limits=None,
+		reserved_workers=1,
+		progress_interval=0.,
+		progress_delta=0.,
+		single_flight=False,
+		watch_ttl=0.,
+		watch_stale=0.,
+		store_delay=None
 	):
 	
 		class IgnoreEventQueue():
@@ -252,89 +453,114 @@ class Engine:
 				
 		class PlatformStubs:
 		
+			# Published dictionaries are never modified. Writers replace
+			# them with modified copies, so readers need no lock.
+			
 			def __init__(self):
 			
 				self.__stubs = {}
-				self.__access_lock = threading.Lock()
+				self.__write_lock = threading.Lock()
 				
 			def __len__(self):
 			
-				try:
-					self.__access_lock.acquire()
-					return len(self.__stubs)
-				finally:
-					self.__access_lock.release()
-					
+				return len(self.__stubs)
+				
 			def create(self, name, prov, props, state_res):
 			
 				data_res = state_res.parent().ref("platforms").ref(name)
 				return PlatformStub(prov, data_res, props)
 				
+			def snapshot(self):
+			
+				return self.__stubs
+				
 			def items(self):
 			
-				try:
-					self.__access_lock.acquire()
-					yield from self.__stubs.items()
-				finally:
-					self.__access_lock.release()
-					
+				return self.__stubs.items()
+				
 			def get(self, name):
 			
 				try:
-					self.__access_lock.acquire()
 					return self.__stubs[name]
 				except KeyError:
 					raise Exception("Platform '{}' does not exist".format(name))
-				finally:
-					self.__access_lock.release()
+					
+			def put_all(self, stubs):
+			
+				with self.__write_lock:
+					new_stubs = dict(self.__stubs)
+					new_stubs.update(stubs)
+					self.__stubs = new_stubs
 					
 			def put(self, name, stub):
 			
-				try:
-					self.__access_lock.acquire()
+				with self.__write_lock:
 					if name in self.__stubs:
 						msg = "Platform '{}' already exists".format(name)
 						raise Exception(msg)
-					self.__stubs[name] = stub
-				finally:
-					self.__access_lock.release()
+					stubs = dict(self.__stubs)
+					stubs[name] = stub
+					self.__stubs = stubs
 					
 			def remove(self, name):
 			
-				try:
-					self.__access_lock.acquire()
-					del self.__stubs[name]
-				except KeyError:
-					raise Exception("Platform '{}' does not exist".format(name))
-				finally:
-					self.__access_lock.release()
+				with self.__write_lock:
+					if name not in self.__stubs:
+						msg = "Platform '{}' does not exist".format(name)
+						raise Exception(msg)
+					stubs = dict(self.__stubs)
+					del stubs[name]
+					self.__stubs = stubs
 					
 		class PlatformStub:
 		
+			# Provider modules are imported and platforms are created on
+			# first use, so stubs are cheap to create.
+			
 			def __init__(self, prov, data_res, props):
 			
 				self.__prov = prov
 				self.__props = props
+				self.__data_res = data_res
+				self.__mod_name = "storm.provider.platform.{}".format(prov)
+				self.__plat = None
+				self.__loaded = False
+				self.__load_lock = threading.Lock()
 				
-				try:
-					mod_name = "storm.provider.platform.{}".format(self.__prov)
-					mod = importlib.import_module(mod_name)
-					rprops = resolver.resolvable(self.__props, self.__props)
-					self.__plat = mod.Platform(data_res, rprops)
-				except ImportError:
-					self.__plat = None
-					
 			def __platform(self):
 			
-				if not self.available():
+				if self.load() is None:
 					msg = "Platform with provider '{}'".format(self.__prov)
 					msg = "{} is not available".format(msg)
 					raise LookupError(msg)
 				return self.__plat
 				
+			def load(self):
+			
+				if self.__loaded:
+					return self.__plat
+				with self.__load_lock:
+					if not self.__loaded:
+						try:
+							mod = importlib.import_module(self.__mod_name)
+							props = self.__props
+							rprops = resolver.resolvable(props, props)
+							self.__plat = mod.Platform(self.__data_res, rprops)
+						except ImportError:
+							self.__plat = None
+						self.__loaded = True
+				return self.__plat
+				
 			def available(self):
 			
-				return self.__plat is not None
+				if self.__loaded:
+					return self.__plat is not None
+				if self.__mod_name in sys.modules:
+					return True
+				try:
+					return importlib.util.find_spec(self.__mod_name) is not None
+				except (ImportError, ValueError):
+					return False
 				
 			def provider(self):
 			
@@ -360,12 +586,51 @@ class Engine:
 			
 				return self.__platform().destroy(work)
 				
+			def state(self, work):
+			
+				state = getattr(self.__platform(), "state", None)
+				if state is None:
+					return None
+				return state(work)
+				
+			def watch(self, callback):
+			
+				watch = getattr(self.__platform(), "watch", None)
+				if watch is None:
+					return None
+				return watch(callback)
+				
 		self.__state_res = state_res
 		self.__event_queue = event_queue or IgnoreEventQueue()
+		self.__internal_event_queue = IgnoreEventQueue()
 		self.__out = out or NoneOutput()
 		self.__err = err or NoneOutput()
-		self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
+		self.__progress_limits = progress_interval, progress_delta
+		self.__scheduler = scheduler.Scheduler(
+			max_workers,
+			platform_limit,
+			platform_limits,
+			max(0, min(reserved_workers, max_workers - 1))
+		)
 		self.__platform_stubs = PlatformStubs()
+		self.__single_flight = single_flight
+		self.__in_flight = {}
+		self.__in_flight_lock = threading.Lock()
+		self.__deduplicated = 0
+		self.__watch_limits = watch_ttl, watch_stale
+		self.__watch_states = {}
+		self.__watch_generation = 0
+		self.__watch_refreshes = set()
+		self.__watch_lock = threading.Lock()
+		self.__feeds = {}
+		self.__feeds_lock = threading.Lock()
+		self.__store_delay = store_delay
+		self.__persister = persister.StatePersister(
+			state_res,
+			self.__state_dict,
+			0. if store_delay is None else store_delay
+		)
+		_engines.add(self)
 		
 		try:
 			state_file = self.__state_res.open("r")
@@ -377,73 +642,225 @@ class Engine:
 			state_file.close()
 			
 			if "platforms" in state:
+				stubs = {}
 				for name, data in state["platforms"].items():
 					prov = data["provider"]
 					props = data["properties"]
-					stub = self.__platform_stubs.create(
+					stubs[name] = self.__platform_stubs.create(
 						name,
 						prov,
 						props,
 						state_res
 					)
-					self.__platform_stubs.put(name, stub)
+				self.__platform_stubs.put_all(stubs)
 		except resource.ResourceNotFoundError:
 			pass
 			
-	def __engine_task(self, task_fn, *args, **kwargs):
+	def __engine_task(self, lane, key, task_fn, *args, **kwargs):
 	
 		worker = self.__EngineTaskWorker(
 			self.__event_queue,
 			task_fn,
 			self.__out,
-			self.__err
+			self.__err,
+			self.__progress_limits
 		)
-		return worker.submit(self.__executor, args, kwargs)
+		return worker.submit(self.__scheduler, lane, key, args, kwargs)
+		
+	def __internal_task(self, lane, key, task_fn, *args):
+	
+		# Nobody holds internal tasks, so their events are not dispatched
+		worker = self.__EngineTaskWorker(
+			self.__internal_event_queue,
+			task_fn,
+			self.__out,
+			self.__err,
+			self.__progress_limits
+		)
+		return worker.submit(self.__scheduler, lane, key, args, {})
+		
+	def __shared_task(self, lane, key, task_fn, *args):
+	
+		if not self.__single_flight:
+			return self.__engine_task(lane, key, task_fn, *args)
+		flight_key = (task_fn, args)
+		with self.__in_flight_lock:
+			worker = self.__in_flight.get(flight_key)
+			if worker is not None:
+				self.__deduplicated = self.__deduplicated + 1
+				return worker.subscribe()
+			worker = self.__EngineTaskWorker(
+				self.__event_queue,
+				task_fn,
+				self.__out,
+				self.__err,
+				self.__progress_limits,
+				True
+			)
+			task = worker.submit(self.__scheduler, lane, key, args, {})
+			self.__in_flight[flight_key] = worker
+			
+		def landed(task):
+		
+			with self.__in_flight_lock:
+				if self.__in_flight.get(flight_key) is worker:
+					del self.__in_flight[flight_key]
+					
+		task.add_done_callback(landed)
+		return task
 		
 	def __platforms(self, worker):
 	
-		for name, stub in self.__platform_stubs.items():
+		stubs = self.__platform_stubs.snapshot()
+		for name, stub in stubs.items():
 			worker.cancel_check()
 			worker.dispatch("platform-entry", {
 				"name": name,
 				"available": stub.available(),
 				"provider": stub.provider()
 			});
-		return len(self.__platform_stubs)
+		return len(stubs)
 		
 	def __register(self, worker, name, prov, props):
 	
 		state_res = self.__state_res
 		stub = self.__platform_stubs.create(name, prov, props, state_res)
 		self.__platform_stubs.put(name, stub)
+		self.invalidate(name)
+		self.__changed()
 		
 	def __dismiss(self, worker, name, destroy):
 	
-		if destroy:
-			stub = self.__platform_stubs.get(name)
-			work = worker.work_start("Destroying '{}' platform".format(name))
-			stub.destroy(work)
-			work.finished()
-		stub = self.__platform_stubs.remove(name)
+		try:
+			if destroy:
+				stub = self.__platform_stubs.get(name)
+				work = worker.work_start("Destroying '{}' platform".format(name))
+				stub.destroy(work)
+				work.finished()
+			stub = self.__platform_stubs.remove(name)
+			self.__changed()
+			with self.__feeds_lock:
+				feed = self.__feeds.pop(name, None)
+			if feed is not None:
+				feed.close()
+		finally:
+			self.invalidate(name)
 			
-	def __watch(self, worker, name):
+	def __changed(self):
 	
+		if self.__store_delay is not None:
+			self.__persister.mark()
+			
+	def __state_dict(self):
+	
+		state = {
+			"platforms": {}
+		}
+		for name, stub in self.__platform_stubs.items():
+			state["platforms"][name] = {
+				"provider": stub.provider(),
+				"properties": stub.properties()
+			}
+		return state
+		
+	def __state(self, worker, name, desc):
+	
+		# States retrieved across an invalidation are not cached
+		generation = self.__watch_generation
 		stub = self.__platform_stubs.get(name)
-		work = worker.work_start("Retrieving '{}' platform state".format(name))
-		return None
+		work = worker.work_start(desc.format(name))
+		state = stub.state(work)
+		work.finished()
+		if sum(self.__watch_limits) > 0.:
+			with self.__watch_lock:
+				if self.__watch_generation == generation:
+					self.__watch_states[name] = state, time.monotonic()
+		return state
 		
-	def __offer(self, worker, name, image):
+	def __refresh(self, worker, name):
 	
-		pass
+		try:
+			self.__state(worker, name, "Refreshing '{}' platform state")
+		finally:
+			with self.__watch_lock:
+				self.__watch_refreshes.discard(name)
+				
+	def __watch(self, worker, name):
+	
+		watch_ttl, watch_stale = self.__watch_limits
+		with self.__watch_lock:
+			entry = self.__watch_states.get(name)
+			if entry is not None:
+				state, stamp = entry
+				age = time.monotonic() - stamp
+				stale = age >= watch_ttl
+				if age < watch_ttl + watch_stale:
+					refresh = stale and name not in self.__watch_refreshes
+					if refresh:
+						self.__watch_refreshes.add(name)
+				else:
+					entry = None
+		if entry is None:
+			state = self.__state(worker, name, "Retrieving '{}' platform state")
+			return {
+				"state": state,
+				"cached": False,
+				"stale": False,
+				"age": 0.
+			}
+		if refresh:
+			try:
+				self.__internal_task(scheduler.BULK, name, self.__refresh, name)
+			except BaseException:
+				with self.__watch_lock:
+					self.__watch_refreshes.discard(name)
+				raise
+		return {
+			"state": state,
+			"cached": True,
+			"stale": stale,
+			"age": age
+		}
 		
+	def __offer(self, worker, name, image):
+	
+		# Watched states are invalidated once the platforms changed, as
+		# watches running meanwhile would cache their former states
+		try:
+			pass
+		finally:
+			self.invalidate(name)
+			
 	def __retire(self, worker, name, image):
 	
-		pass
-		
+		try:
+			pass
+		finally:
+			self.invalidate(name)
+			
 	def __emerge(self, worker, layout):
 	
-		pass
+		try:
+			pass
+		finally:
+			for execution in layout.executions:
+				self.invalidate(execution.platform_name)
+				
+	def __preload(self, worker, names, max_workers):
+	
+		if names is None:
+			stubs = list(self.__platform_stubs.snapshot().values())
+		else:
+			stubs = [ self.__platform_stubs.get(name) for name in names ]
+			
+		def load(stub):
 		
+			worker.cancel_check()
+			return stub.load() is not None
+			
+		with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+			return sum(executor.map(load, stubs))
+			
 	def platforms(self):
 	
 		"""
@@ -455,7 +872,11 @@ class Engine:
 		   The task running the platforms process.
 		"""
 		
-		return self.__engine_task(self.__platforms)
+		return self.__shared_task(
+			scheduler.INTERACTIVE,
+			None,
+			self.__platforms
+		)
 		
 	def register(self, name, prov, props=None):
 	
@@ -477,7 +898,14 @@ class Engine:
 		   If a platform with the given name already exists.
 		"""
 		
-		return self.__engine_task(self.__register, name, prov, props)
+		return self.__engine_task(
+			scheduler.INTERACTIVE,
+			name,
+			self.__register,
+			name,
+			prov,
+			props
+		)
 		
 	def dismiss(self, name, destroy=False):
 	
@@ -496,7 +924,8 @@ class Engine:
 		   If the platform with the given name does not exist.
 		"""
 		
-		return self.__engine_task(self.__dismiss, name, destroy)
+		lane = scheduler.BULK if destroy else scheduler.INTERACTIVE
+		return self.__engine_task(lane, name, self.__dismiss, name, destroy)
 		
 	def watch(self, name):
 	
@@ -508,13 +937,88 @@ class Engine:
 		:rtype:
 		   EngineTask
 		:return:
-		   The task running the watch process.
+		   The task running the watch process. Its result is a dictionary
+		   with the platform ``state``, if it was ``cached``, if it was
+		   ``stale`` and is being refreshed, and its ``age`` in seconds.
+		:raises Exception:
+		   If the platform with the given name does not exist.
+		"""
+		
+		return self.__shared_task(
+			scheduler.INTERACTIVE,
+			name,
+			self.__watch,
+			name
+		)
+		
+	def subscribe(self, name, callback, interval=None):
+	
+		"""
+		Subscribes to the state of some platform. The state is retrieved
+		once for every subscription to the same platform, when its provider
+		notifies a change through the optional ``watch`` function of the
+		platform, or by polling otherwise. Subscriptions receive the whole
+		state first, then only its changes.
+		
+		:param string name:
+		   The name of the platform.
+		:param callback:
+		   Callable receiving the events, as described by
+		   :class:`storm.engine.subscription.Subscription`.
+		:param float interval:
+		   Seconds between polls, or None for
+		   :data:`storm.engine.subscription.poll_interval`. It is only used
+		   by the first subscription to the platform.
+		:rtype:
+		   storm.engine.subscription.Subscription
+		:return:
+		   The subscription.
 		:raises Exception:
 		   If the platform with the given name does not exist.
 		"""
 		
-		return self.__engine_task(self.__watch, name)
+		def poll():
+		
+			task = self.__internal_task(
+				scheduler.BULK,
+				name,
+				self.__state,
+				name,
+				"Polling '{}' platform state"
+			)
+			return task.result()
+			
+		# Feeds stop with their last subscription, so a stopped feed may
+		# have to be replaced
+		while True:
+			stub = self.__platform_stubs.get(name)
+			with self.__feeds_lock:
+				feed = self.__feeds.get(name)
+				if feed is None or feed.closed:
+					feed = subscription.StateFeed(poll, stub.watch, interval)
+					self.__feeds[name] = feed
+			sub = feed.subscribe(callback)
+			if sub is not None:
+				return sub
+			
+	def invalidate(self, name=None):
+	
+		"""
+		Drops platform states cached by :meth:`watch`. Platform states are
+		also dropped when the platform is registered, dismissed, offered or
+		retired an image, or emerged a layout.
+		
+		:param string name:
+		   The name of the platform, or None for every platform.
+		"""
 		
+		with self.__watch_lock:
+			if name is None:
+				self.__watch_states.clear()
+			else:
+				self.__watch_states.pop(name, None)
+			self.__watch_generation = self.__watch_generation + 1
+				
 	def offer(self, name, image):
 	
 		"""
@@ -532,7 +1036,13 @@ class Engine:
 		   If the platform with the given name does not exist.
 		"""
 		
-		return self.__engine_task(self.__offer, name, image)
+		return self.__engine_task(
+			scheduler.BULK,
+			name,
+			self.__offer,
+			name,
+			image
+		)
 		
 	def retire(self, name, image):
 	
@@ -551,7 +1061,13 @@ class Engine:
 		   If the platform with the given name does not exist.
 		"""
 		
-		return self.__engine_task(self.__retire, name, image)
+		return self.__engine_task(
+			scheduler.BULK,
+			name,
+			self.__retire,
+			name,
+			image
+		)
 		
 	def emerge(self, layout):
 	
@@ -566,26 +1082,365 @@ class Engine:
 		   The task running the emerge process.
 		"""
 		
-		return self.__engine_task(self.__emerge, layout)
+		return self.__engine_task(
+			scheduler.BULK,
+			None,
+			self.__emerge,
+			layout
+		)
 		
-	def store(self):
+	def preload(self, names=None, max_workers=None):
 	
 		"""
-		Store the current engine state to the state resource.
+		Load the providers of the given platforms in parallel.
+		
+		Platform providers are loaded on first use otherwise.
+		
+		:param list names:
+		   Names of the platforms to be loaded, or None for all of them.
+		:param int max_workers:
+		   Maximum amount of threads loading providers.
+		:rtype:
+		   EngineTask
+		:return:
+		   The task running the preload process. Its result is the amount
+		   of loaded platforms whose provider is available.
+		:raises Exception:
+		   If some platform with the given names does not exist.
 		"""
 		
-		state = {
-			"platforms": {}
+		return self.__engine_task(
+			scheduler.BULK,
+			None,
+			self.__preload,
+			names,
+			max_workers
+		)
+		
+	def stats(self):
+	
+		"""
+		Returns the engine task statistics.
+		
+		:rtype:
+		   dict
+		:return:
+		   The ``tasks`` queue depth statistics, as returned by
+		   :meth:`storm.engine.scheduler.Scheduler.stats` with platform
+		   names as keys. Tasks not bound to a platform have None as key.
+		   Also the amount of ``deduplicated`` calls which were given an
+		   identical task already in flight.
+		"""
+		
+		return {
+			"tasks": self.__scheduler.stats(),
+			"deduplicated": self.__deduplicated
 		}
-		for name, stub in self.__platform_stubs.items():
-			state["platforms"][name] = {
-				"provider": stub.provider(),
-				"properties": stub.properties()
-			}
-		state_file = self.__state_res.open("w")
-		jsons.write_dict(state_file, state, True)
-		state_file.write("\n")
-		state_file.close()
+		
+	def shutdown(self, wait=True):
+	
+		"""
+		Stops accepting tasks. Queued and running tasks are completed, as
+		they are when the interpreter exits. Once they are, the state changes
+		not stored yet are stored.
+		
+		:param bool wait:
+		   If it must wait for the queued and running tasks to be completed.
+		   If not, the state changes are stored when the interpreter exits.
+		"""
+		
+		self.__scheduler.shutdown(wait)
+		if wait:
+			self.__persister.close()
+		
+	def store(self):
+	
+		"""
+		Store the current engine state to the state resource, unless it did
+		not change since it was last stored. The state is written to a
+		temporary sibling resource first, which then replaces the state
+		resource.
+		
+		:rtype:
+		   bool
+		:return:
+		   True if the state resource was written.
+		"""
+		
+		return self.__persister.store()
+		
+class AsyncEngine:
+
+	"""
+	Front end of the engine for :mod:`asyncio` applications.
+	
+	It runs an :class:`Engine` whose tasks are returned as
+	:class:`AsyncEngineTask` objects, which can be awaited without blocking
+	any thread and give their events as an asynchronous iterator. Tasks must
+	be started from a running event loop.
+	
+	:param Resource state_res:
+	   Resource holding the state of the engine.
+	:param EngineEventQueue event_queue:
+	   Optional event queue also receiving the events of every task.
+	:param out:
+	   Output stream.
+	:param err:
+	   Error stream.
+	:param kwargs:
+	   Other :class:`Engine` arguments.
+	"""
+	
+	class __EventRouter:
+	
+		def __init__(self, event_queue):
+		
+			self.__event_queue = event_queue
+			self.__streams = {}
+			self.__pending = {}
+			self.__lock = threading.Lock()
+			
+		def dispatch(self, task, name, value):
+		
+			if self.__event_queue is not None:
+				self.__event_queue.dispatch(task, name, value)
+			with self.__lock:
+				stream = self.__streams.get(task)
+				if stream is None:
+					self.__pending.setdefault(task, []).append((name, value))
+					return
+			stream(name, value)
+			
+		def attach(self, task, stream):
+		
+			with self.__lock:
+				self.__streams[task] = stream
+				for name, value in self.__pending.pop(task, []):
+					stream(name, value)
+					
+		def detach(self, task):
+		
+			with self.__lock:
+				self.__streams.pop(task, None)
+				self.__pending.pop(task, None)
+				
+	class __AsyncEngineTask:
+	
+		def __init__(self, router, task):
+		
+			self.__task = task
+			self.__loop = asyncio.get_running_loop()
+			self.__future = self.__loop.create_future()
+			self.__future.add_done_callback(self.__future_done)
+			self.__events = asyncio.Queue()
+			self.__router = router
+			router.attach(task, self.__event)
+			task.add_done_callback(self.__task_done)
+			
+		def __await__(self):
+		
+			return self.__future.__await__()
+			
+		def __event(self, name, value):
+		
+			self.__loop.call_soon_threadsafe(
+				self.__events.put_nowait,
+				(name, value)
+			)
+			
+		def __task_done(self, task):
+		
+			self.__router.detach(task)
+			self.__loop.call_soon_threadsafe(self.__events.put_nowait, None)
+			self.__loop.call_soon_threadsafe(self.__resolve)
+			
+		def __resolve(self):
+		
+			if self.__future.done():
+				return
+			try:
+				self.__future.set_result(self.__task.result(0))
+			except concurrent.futures.CancelledError:
+				self.__future.cancel()
+			except BaseException as err:
+				self.__future.set_exception(err)
+				
+		def __future_done(self, future):
+		
+			if future.cancelled():
+				self.__task.cancel()
+				
+		def cancel(self):
+		
+			# The engine task is cancelled once by the future callback
+			return self.__future.cancel()
+			
+		def done(self):
+		
+			return self.__future.done()
+			
+		async def events(self):
+		
+			while True:
+				event = await self.__events.get()
+				if event is None:
+					return
+				yield event
+				
+	def __init__(
+		self,
+		state_res,
+		event_queue=None,
+		out=None,
+		err=None,
+		**kwargs
+	):
+	
+		self.__router = self.__EventRouter(event_queue)
+		self.__engine = Engine(state_res, self.__router, out, err, **kwargs)
+		
+	def __task(self, task):
+	
+		return self.__AsyncEngineTask(self.__router, task)
+		
+	@property
+	def engine(self):
+	
+		"""
+		Underlying engine.
+		"""
+		
+		return self.__engine
+		
+	def platforms(self):
+	
+		"""
+		Asynchronous version of :meth:`Engine.platforms`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.platforms())
+		
+	def register(self, name, prov, props=None):
+	
+		"""
+		Asynchronous version of :meth:`Engine.register`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.register(name, prov, props))
+		
+	def dismiss(self, name, destroy=False):
+	
+		"""
+		Asynchronous version of :meth:`Engine.dismiss`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.dismiss(name, destroy))
+		
+	def watch(self, name):
+	
+		"""
+		Asynchronous version of :meth:`Engine.watch`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.watch(name))
+		
+	def subscribe(self, name, callback, interval=None):
+	
+		"""
+		Same as :meth:`Engine.subscribe`.
+		"""
+		
+		return self.__engine.subscribe(name, callback, interval)
+		
+	def invalidate(self, name=None):
+	
+		"""
+		Same as :meth:`Engine.invalidate`.
+		"""
+		
+		self.__engine.invalidate(name)
+		
+	def offer(self, name, image):
+	
+		"""
+		Asynchronous version of :meth:`Engine.offer`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.offer(name, image))
+		
+	def retire(self, name, image):
+	
+		"""
+		Asynchronous version of :meth:`Engine.retire`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.retire(name, image))
+		
+	def emerge(self, layout):
+	
+		"""
+		Asynchronous version of :meth:`Engine.emerge`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.emerge(layout))
+		
+	def preload(self, names=None, max_workers=None):
+	
+		"""
+		Asynchronous version of :meth:`Engine.preload`.
+		
+		:rtype:
+		   AsyncEngineTask
+		"""
+		
+		return self.__task(self.__engine.preload(names, max_workers))
+		
+	def stats(self):
+	
+		"""
+		Same as :meth:`Engine.stats`.
+		"""
+		
+		return self.__engine.stats()
+		
+	def shutdown(self, wait=True):
+	
+		"""
+		Same as :meth:`Engine.shutdown`.
+		"""
+		
+		self.__engine.shutdown(wait)
+		
+	async def store(self):
+	
+		"""
+		Asynchronous version of :meth:`Engine.store`, run on the default
+		executor of the running event loop.
+		"""
+		
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(None, self.__engine.store)
 		
 class EngineTaskCancelled(Exception):
 
@@ -596,4 +1451,3 @@ class EngineTaskCancelled(Exception):
 	def __init__(self):
 	
 		super().__init__(None)
-
@@ -0,0 +1,273 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Engine event dispatching module.
+"""
+
+from storm.module import util
+
+import collections
+import threading
+
+BLOCK = "block"
+
+"""
+Overflow policy making dispatching tasks wait until there is room for their
+events.
+"""
+
+DROP_PROGRESS = "drop-progress"
+
+"""
+Overflow policy dropping the oldest buffered progress event to make room for
+new events.
+"""
+
+COALESCE = "coalesce"
+
+"""
+Overflow policy replacing the value of a buffered progress event with the
+value of a new progress event of the same work, instead of buffering it.
+"""
+
+def _progress_key(task, name, value):
+
+	if name == "work" and value["cause"] == "progress":
+		return task, value["id"]
+	return None
+	
+class EventDispatcher:
+
+	"""
+	Event queue delivering the events dispatched by engine tasks to another
+	event queue from a dedicated thread, so tasks do not wait for slow
+	consumers.
+	
+	Events are kept in a bounded buffer and delivered in batches, through
+	the ``dispatch_batch`` function of the consumer when it has one. Once the
+	buffer is full, dispatching waits for room, unless the overflow policy
+	allows to drop or coalesce progress events.
+	
+	:param EngineEventQueue event_queue:
+	   Consumer event queue.
+	:param int capacity:
+	   Maximum amount of buffered events.
+	:param string overflow:
+	   One of :data:`BLOCK`, :data:`DROP_PROGRESS` or :data:`COALESCE`.
+	:param int batch_size:
+	   Maximum amount of events delivered at once.
+	"""
+	
+	def __init__(
+		self,
+		event_queue,
+		capacity=1024,
+		overflow=BLOCK,
+		batch_size=64
+	):
+	
+		if overflow not in (BLOCK, DROP_PROGRESS, COALESCE):
+			raise ValueError("Unknown overflow policy '{}'".format(overflow))
+		if capacity < 1:
+			raise ValueError("Event buffer needs room for one event")
+		self.__event_queue = event_queue
+		self.__capacity = capacity
+		self.__overflow = overflow
+		self.__batch_size = batch_size
+		self.__cond = threading.Condition()
+		self.__buffer = collections.deque()
+		self.__progress = {}
+		self.__delivering = 0
+		self.__closed = False
+		self.__dispatched = 0
+		self.__dropped = 0
+		self.__coalesced = 0
+		self.__failed = 0
+		self.__thread = threading.Thread(
+			target=self.__deliver,
+			name="storm-engine-events",
+			daemon=True
+		)
+		self.__thread.start()
+		
+	def __make_room(self):
+	
+		if self.__overflow != DROP_PROGRESS:
+			return False
+		for i, event in enumerate(self.__buffer):
+			old_key = _progress_key(*event)
+			if old_key is not None:
+				del self.__buffer[i]
+				if self.__progress.get(old_key) is event:
+					del self.__progress[old_key]
+				self.__dropped = self.__dropped + 1
+				return True
+		return False
+		
+	def __deliver(self):
+	
+		while True:
+			with self.__cond:
+				while len(self.__buffer) == 0:
+					if self.__closed:
+						return
+					self.__cond.wait()
+				batch = []
+				while self.__buffer and len(batch) < self.__batch_size:
+					event = self.__buffer.popleft()
+					key = _progress_key(*event)
+					if self.__progress.get(key) is event:
+						del self.__progress[key]
+					batch.append(tuple(event))
+				self.__delivering = len(batch)
+				self.__cond.notify_all()
+			try:
+				self.__deliver_batch(batch)
+			finally:
+				with self.__cond:
+					self.__dispatched = self.__dispatched + len(batch)
+					self.__delivering = 0
+					self.__cond.notify_all()
+					
+	def __deliver_batch(self, batch):
+	
+		try:
+			dispatch_batch = self.__event_queue.dispatch_batch
+		except AttributeError:
+			dispatch_batch = None
+		# Consumers may raise anything, even resource errors which are not
+		# exceptions, and delivery must go on for tasks not to block
+		if dispatch_batch is not None:
+			try:
+				dispatch_batch(batch)
+			except BaseException as e:
+				if util.fatal(e):
+					raise
+				self.__failed = self.__failed + len(batch)
+			return
+		for task, name, value in batch:
+			try:
+				self.__event_queue.dispatch(task, name, value)
+			except BaseException as e:
+				if util.fatal(e):
+					raise
+				self.__failed = self.__failed + 1
+				
+	def dispatch(self, task, name, value):
+	
+		"""
+		Buffers an event for its delivery.
+		
+		:param EngineTask task:
+		   Source task.
+		:param string name:
+		   Event type name.
+		:param value:
+		   Event value.
+		:raises RuntimeError:
+		   If this dispatcher was closed, even while waiting for room.
+		"""
+		
+		key = _progress_key(task, name, value)
+		with self.__cond:
+			while True:
+				if self.__closed:
+					raise RuntimeError("Event dispatcher was closed")
+				if self.__overflow == COALESCE and key is not None:
+					event = self.__progress.get(key)
+					if event is not None:
+						event[2] = value
+						self.__coalesced = self.__coalesced + 1
+						return
+				if len(self.__buffer) < self.__capacity:
+					break
+				if not self.__make_room():
+					self.__cond.wait()
+			event = [ task, name, value ]
+			self.__buffer.append(event)
+			if key is not None:
+				self.__progress[key] = event
+			self.__cond.notify_all()
+			
+	def flush(self, timeout=None):
+	
+		"""
+		Waits until every buffered event was delivered.
+		
+		:param float timeout:
+		   Maximum amount of seconds to wait, or None for no limit.
+		:rtype:
+		   bool
+		:return:
+		   True if every event was delivered.
+		"""
+		
+		with self.__cond:
+			return self.__cond.wait_for(
+				lambda: len(self.__buffer) == 0 and self.__delivering == 0,
+				timeout
+			)
+			
+	def close(self):
+	
+		"""
+		Delivers the buffered events and stops the dispatcher thread.
+		"""
+		
+		with self.__cond:
+			self.__closed = True
+			self.__cond.notify_all()
+		if self.__thread is not threading.current_thread():
+			self.__thread.join()
+			
+	@property
+	def dispatched(self):
+	
+		"""
+		Amount of delivered events.
+		"""
+		
+		return self.__dispatched
+		
+	@property
+	def dropped(self):
+	
+		"""
+		Amount of progress events dropped for making room.
+		"""
+		
+		return self.__dropped
+		
+	@property
+	def coalesced(self):
+	
+		"""
+		Amount of progress events whose value was merged into a buffered
+		event.
+		"""
+		
+		return self.__coalesced
+		
+	@property
+	def failed(self):
+	
+		"""
+		Amount of events whose delivery raised an exception.
+		"""
+		
+		return self.__failed
@@ -0,0 +1,229 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Engine state persistence module.
+"""
+
+from storm.module import jsons
+from storm.module import resource
+from storm.module import util
+
+import hashlib
+import io
+import os
+import threading
+import weakref
+
+retry_delay = 1.
+
+"""
+Minimum seconds between the attempts of writing changes in background when
+writes fail.
+"""
+
+class StatePersister:
+
+	"""
+	Writer of the engine state to its resource.
+	
+	The state is serialized and written to a temporary sibling resource,
+	which then replaces the state resource, so readers never see partial
+	content. Writes are skipped when the serialized state did not change
+	since the last write, and never overlap.
+	
+	Changes marked with :meth:`mark` are written from a background thread
+	once the debounce delay after the first of them passed, so bursts of
+	changes are written at once.
+	
+	:param Resource state_res:
+	   Resource holding the state.
+	:param build:
+	   Callable returning the state dictionary.
+	:param float debounce:
+	   Seconds between a marked change and its write.
+	"""
+	
+	def __init__(self, state_res, build, debounce=0.5):
+	
+		self.__state_res = state_res
+		self.__build = build
+		self.__debounce = debounce
+		self.__digest = None
+		self.__write_lock = threading.Lock()
+		self.__cond = threading.Condition()
+		self.__dirty = False
+		self.__closed = False
+		self.__thread = None
+		self.__writes = 0
+		self.__skipped = 0
+		
+	def __serialize(self):
+	
+		stream = io.StringIO()
+		jsons.write_dict(stream, self.__build(), True)
+		stream.write("\n")
+		return stream.getvalue()
+		
+	def __current_digest(self):
+	
+		try:
+			return self.__state_res.digest()
+		except resource.ResourceNotFoundError:
+			return None
+			
+	@staticmethod
+	def __run(persister_ref, cond):
+	
+		# The persister is only weakly referenced while waiting for changes,
+		# so the thread exits once the persister is collected
+		delay = None
+		while True:
+			with cond:
+				persister = persister_ref()
+				while (
+					persister is not None and
+					not persister.__dirty and
+					not persister.__closed
+				):
+					persister = None
+					cond.wait()
+					persister = persister_ref()
+				if persister is None or not persister.__dirty:
+					return
+				if delay is None:
+					delay = persister.__debounce
+				cond.wait_for(lambda: persister.__closed, delay)
+			try:
+				persister.store()
+				delay = None
+			except BaseException as e:
+				if util.fatal(e):
+					raise
+				# Kept dirty, so it is retried after a delay
+				with cond:
+					persister.__dirty = True
+					if persister.__closed:
+						return
+				delay = max(persister.__debounce, retry_delay)
+			persister = None
+			
+	@property
+	def dirty(self):
+	
+		"""
+		If there are marked changes not written yet.
+		"""
+		
+		return self.__dirty
+		
+	@property
+	def writes(self):
+	
+		"""
+		Amount of writes of the state resource.
+		"""
+		
+		return self.__writes
+		
+	@property
+	def skipped(self):
+	
+		"""
+		Amount of writes skipped because the state did not change.
+		"""
+		
+		return self.__skipped
+		
+	def mark(self):
+	
+		"""
+		Marks the state as changed, so it is written in background.
+		
+		:raises RuntimeError:
+		   If this persister was closed.
+		"""
+		
+		with self.__cond:
+			if self.__closed:
+				raise RuntimeError("State persister was closed")
+			self.__dirty = True
+			if self.__thread is None:
+				cond = self.__cond
+				self.__thread = threading.Thread(
+					target=StatePersister.__run,
+					args=(
+						weakref.ref(self, lambda ref: util.notify_all(cond)),
+						cond
+					),
+					name="storm-engine-persister",
+					daemon=True
+				)
+				self.__thread.start()
+			self.__cond.notify_all()
+			
+	def store(self):
+	
+		"""
+		Writes the state right away, unless it did not change.
+		
+		:rtype:
+		   bool
+		:return:
+		   True if the state resource was written.
+		"""
+		
+		with self.__write_lock:
+			with self.__cond:
+				self.__dirty = False
+			content = self.__serialize()
+			digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+			if self.__digest is None:
+				self.__digest = self.__current_digest()
+			if digest == self.__digest:
+				self.__skipped = self.__skipped + 1
+				return False
+			temp_res = self.__state_res.parent().ref(".{}.{}.{:x}.tmp".format(
+				self.__state_res.name(),
+				os.getpid(),
+				id(self)
+			))
+			try:
+				with temp_res.open("w") as temp_file:
+					temp_file.write(content)
+				temp_res.replace(self.__state_res)
+			except BaseException:
+				temp_res.delete()
+				raise
+			self.__digest = digest
+			self.__writes = self.__writes + 1
+			return True
+			
+	def close(self):
+	
+		"""
+		Writes the marked changes and stops the background thread.
+		"""
+		
+		with self.__cond:
+			self.__closed = True
+			self.__cond.notify_all()
+			thread = self.__thread
+		if thread is not None and thread is not threading.current_thread():
+			thread.join()
+		if self.__dirty:
+			self.store()
@@ -0,0 +1,325 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Engine task scheduling module.
+"""
+
+from storm.module import util
+
+import atexit
+import collections
+import concurrent.futures
+import threading
+import weakref
+
+INTERACTIVE = "interactive"
+
+"""
+Lane of short tasks somebody is waiting for.
+"""
+
+BULK = "bulk"
+
+"""
+Lane of long running tasks.
+"""
+
+_schedulers = weakref.WeakSet()
+
+def _shutdown_all():
+
+	# Workers are daemon threads, so queued tasks are completed before the
+	# interpreter stops them
+	for sched in list(_schedulers):
+		sched.shutdown()
+		
+atexit.register(_shutdown_all)
+
+class _Lane:
+
+	def __init__(self):
+	
+		self.queues = {}
+		self.ready = collections.deque()
+		self.running = 0
+		
+	def queued(self):
+	
+		return sum(len(queue) for queue in self.queues.values())
+		
+class Scheduler:
+
+	"""
+	Scheduler running tasks on a pool of worker threads.
+	
+	Tasks are queued by lane and key, the key usually being the name of the
+	platform they work on. Workers take :data:`INTERACTIVE` tasks before
+	:data:`BULK` ones, and take the tasks of each lane from the keys with
+	queued tasks in round robin order, so the tasks of one key cannot block
+	the tasks of the other keys. No more tasks of the same key than its limit
+	run at the same time.
+	
+	Some workers are reserved for interactive tasks, so they can start even
+	when bulk tasks keep the rest busy. Bulk tasks are not starved either, as
+	one is taken after some interactive tasks were taken in a row while bulk
+	tasks were waiting.
+	
+	Queued tasks are completed when the interpreter exits, unless the
+	scheduler was shut down without waiting.
+	
+	:param int max_workers:
+	   Amount of worker threads.
+	:param int key_limit:
+	   Maximum amount of running tasks with the same key, or None for no
+	   limit.
+	:param dict limits:
+	   Optional limits for specific keys, overriding ``key_limit``.
+	:param int reserved:
+	   Amount of workers which only run interactive tasks.
+	:param int starvation_limit:
+	   Maximum amount of interactive tasks taken in a row while bulk tasks
+	   are waiting.
+	"""
+	
+	def __init__(
+		self,
+		max_workers=10,
+		key_limit=None,
+		limits=None,
+		reserved=0,
+		starvation_limit=8
+	):
+	
+		if max_workers < 1:
+			raise ValueError("Scheduler needs at least one worker")
+		if reserved < 0 or reserved >= max_workers:
+			raise ValueError("Scheduler needs at least one bulk worker")
+		self.__max_workers = max_workers
+		self.__key_limit = key_limit
+		self.__limits = dict(limits or {})
+		self.__reserved = reserved
+		self.__starvation_limit = starvation_limit
+		self.__cond = threading.Condition()
+		self.__lanes = {
+			INTERACTIVE: _Lane(),
+			BULK: _Lane()
+		}
+		self.__running = collections.Counter()
+		self.__streak = 0
+		self.__threads = []
+		self.__idle = 0
+		self.__shutdown = False
+		cond = self.__cond
+		self.__ref = weakref.ref(self, lambda ref: util.notify_all(cond))
+		_schedulers.add(self)
+		
+	def __limit(self, key):
+	
+		return self.__limits.get(key, self.__key_limit)
+		
+	def __wake(self):
+	
+		if self.__idle > 0:
+			self.__idle = self.__idle - 1
+			self.__cond.notify()
+			return True
+		return False
+		
+	def __next_of(self, lane_name):
+	
+		lane = self.__lanes[lane_name]
+		for i in range(len(lane.ready)):
+			key = lane.ready[0]
+			lane.ready.rotate(-1)
+			limit = self.__limit(key)
+			if limit is not None and self.__running[key] >= limit:
+				continue
+			queue = lane.queues[key]
+			entry = queue.popleft()
+			if len(queue) == 0:
+				del lane.queues[key]
+				lane.ready.pop()
+			self.__running[key] = self.__running[key] + 1
+			lane.running = lane.running + 1
+			return (lane_name, key) + entry
+		return None
+		
+	def __next(self):
+	
+		bulk = self.__lanes[BULK]
+		bulk_allowed = bulk.running < self.__max_workers - self.__reserved
+		if bulk_allowed and self.__streak >= self.__starvation_limit:
+			lane_names = (BULK, INTERACTIVE)
+		else:
+			lane_names = (INTERACTIVE, BULK)
+		for lane_name in lane_names:
+			if lane_name == BULK and not bulk_allowed:
+				continue
+			entry = self.__next_of(lane_name)
+			if entry is None:
+				continue
+			if lane_name == BULK or len(bulk.queues) == 0:
+				self.__streak = 0
+			else:
+				self.__streak = self.__streak + 1
+			return entry
+		return None
+		
+	@staticmethod
+	def __work(sched_ref, cond):
+	
+		# The scheduler is only weakly referenced while waiting for tasks, so
+		# workers exit once the scheduler is collected
+		while True:
+			with cond:
+				sched = sched_ref()
+				entry = None if sched is None else sched.__next()
+				while entry is None:
+					if sched is None or sched.__shutdown:
+						return
+					sched.__idle = sched.__idle + 1
+					sched = None
+					cond.wait()
+					sched = sched_ref()
+					entry = None if sched is None else sched.__next()
+			sched.__run(entry)
+			sched = entry = None
+			
+	def __run(self, entry):
+	
+		lane_name, key, future, fn, args, kwargs = entry
+		try:
+			if future.set_running_or_notify_cancel():
+				try:
+					result = fn(*args, **kwargs)
+				except BaseException as err:
+					future.set_exception(err)
+				else:
+					future.set_result(result)
+		finally:
+			with self.__cond:
+				lane = self.__lanes[lane_name]
+				lane.running = lane.running - 1
+				self.__running[key] = self.__running[key] - 1
+				if self.__running[key] == 0:
+					del self.__running[key]
+				self.__wake()
+				
+	def submit(self, key, fn, args=(), kwargs=None, lane=BULK):
+	
+		"""
+		Queues a task.
+		
+		:param key:
+		   Hashable key of the task.
+		:param fn:
+		   Callable running the task.
+		:param tuple args:
+		   Positional arguments of the callable.
+		:param dict kwargs:
+		   Keyword arguments of the callable.
+		:param string lane:
+		   Either :data:`INTERACTIVE` or :data:`BULK`.
+		:rtype:
+		   concurrent.futures.Future
+		:return:
+		   The future of the task result.
+		:raises RuntimeError:
+		   If the scheduler was shut down.
+		"""
+		
+		future = concurrent.futures.Future()
+		entry = (future, fn, args, kwargs or {})
+		with self.__cond:
+			if self.__shutdown:
+				raise RuntimeError("Scheduler was shut down")
+			queues = self.__lanes[lane].queues
+			queue = queues.get(key)
+			if queue is None:
+				queue = queues[key] = collections.deque()
+				self.__lanes[lane].ready.append(key)
+			queue.append(entry)
+			if not self.__wake() and len(self.__threads) < self.__max_workers:
+				thread = threading.Thread(
+					target=Scheduler.__work,
+					args=(self.__ref, self.__cond),
+					name="storm-engine-{}".format(len(self.__threads)),
+					daemon=True
+				)
+				self.__threads.append(thread)
+				thread.start()
+		return future
+		
+	def stats(self):
+	
+		"""
+		Returns the queue depth statistics.
+		
+		:rtype:
+		   dict
+		:return:
+		   The amount of ``workers``, the total amount of ``queued`` and
+		   ``running`` tasks, the ``lanes`` dictionary with the amount of
+		   ``queued`` and ``running`` tasks of each lane, and the ``keys``
+		   dictionary with the amount of ``queued`` and ``running`` tasks of
+		   each key.
+		"""
+		
+		with self.__cond:
+			lanes = {}
+			keys = {}
+			for lane_name, lane in self.__lanes.items():
+				lanes[lane_name] = {
+					"queued": lane.queued(),
+					"running": lane.running
+				}
+				for key, queue in lane.queues.items():
+					key_stats = keys.setdefault(key, {
+						"queued": 0,
+						"running": 0
+					})
+					key_stats["queued"] = key_stats["queued"] + len(queue)
+			for key, running in self.__running.items():
+				keys.setdefault(key, {
+					"queued": 0
+				})["running"] = running
+			return {
+				"workers": len(self.__threads),
+				"queued": sum(lane["queued"] for lane in lanes.values()),
+				"running": sum(lane["running"] for lane in lanes.values()),
+				"lanes": lanes,
+				"keys": keys
+			}
+			
+	def shutdown(self, wait=True):
+	
+		"""
+		Stops accepting tasks. Workers exit once the queued tasks are done.
+		
+		:param bool wait:
+		   If it must wait for the workers to exit.
+		"""
+		
+		with self.__cond:
+			self.__shutdown = True
+			self.__cond.notify_all()
+			threads = list(self.__threads)
+		if wait:
+			for thread in threads:
+				if thread is not threading.current_thread():
+					thread.join()
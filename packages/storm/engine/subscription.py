@@ -0,0 +1,316 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Platform state subscription module.
+"""
+
+import copy
+import threading
+
+poll_interval = 1.
+
+"""
+Seconds between polls of subscribed platforms whose provider cannot notify
+their state changes.
+"""
+
+_unknown = object()
+
+def diff(old, new):
+
+	"""
+	Returns the structural changes turning a state into another one.
+	Dictionaries are compared key by key, and other values are replaced as a
+	whole.
+	
+	:param old:
+	   Previous state.
+	:param new:
+	   Current state.
+	:rtype:
+	   list
+	:return:
+	   The changes, as dictionaries with the ``op`` name, being ``set`` or
+	   ``remove``, the ``path`` list of dictionary keys, and the ``value``
+	   of ``set`` changes.
+	"""
+	
+	changes = []
+	_diff(old, new, [], changes)
+	return changes
+	
+def _diff(old, new, path, changes):
+
+	if isinstance(old, dict) and isinstance(new, dict):
+		for key in old:
+			if key not in new:
+				changes.append({
+					"op": "remove",
+					"path": path + [ key ]
+				})
+		for key, value in new.items():
+			if key in old:
+				_diff(old[key], value, path + [ key ], changes)
+			else:
+				changes.append({
+					"op": "set",
+					"path": path + [ key ],
+					"value": value
+				})
+	elif type(old) is not type(new) or old != new:
+		changes.append({
+			"op": "set",
+			"path": path,
+			"value": new
+		})
+		
+def patch(state, changes):
+
+	"""
+	Applies the changes returned by :func:`diff` to a copy of a state.
+	
+	:param state:
+	   Previous state.
+	:param list changes:
+	   Changes to be applied.
+	:return:
+	   The current state.
+	"""
+	
+	state = copy.deepcopy(state)
+	for change in changes:
+		path = change["path"]
+		if len(path) == 0:
+			state = copy.deepcopy(change["value"])
+			continue
+		parent = state
+		for key in path[:-1]:
+			parent = parent[key]
+		if change["op"] == "remove":
+			del parent[path[-1]]
+		else:
+			parent[path[-1]] = copy.deepcopy(change["value"])
+	return state
+	
+class Subscription:
+
+	"""
+	Subscription to the state of a platform, created by
+	:meth:`storm.engine.Engine.subscribe`.
+	
+	The callback receives the event name and value, being ``snapshot`` with
+	the whole state first, then ``diff`` with the changes returned by
+	:func:`diff` every time the state changes, ``error`` with the exception
+	raised while retrieving the state, and ``closed`` with None once the
+	platform was dismissed. It is called from a background thread, and
+	exceptions raised from it are ignored.
+	
+	:param StateFeed feed:
+	   Feed delivering the events.
+	:param callback:
+	   Callable receiving the events.
+	"""
+	
+	def __init__(self, feed, callback):
+	
+		self.__feed = feed
+		self.__callback = callback
+		self.__cancelled = False
+		
+	def __enter__(self):
+	
+		return self
+		
+	def __exit__(self, exc_type, exc_value, traceback):
+	
+		self.cancel()
+		
+	def _deliver(self, event, value):
+	
+		if not self.__cancelled:
+			try:
+				self.__callback(event, value)
+			except Exception:
+				pass
+				
+	@property
+	def cancelled(self):
+	
+		"""
+		If this subscription was cancelled.
+		"""
+		
+		return self.__cancelled
+		
+	def cancel(self):
+	
+		"""
+		Stops receiving events. No event is delivered once it returns, unless
+		it is called from the callback itself.
+		"""
+		
+		self.__feed.unsubscribe(self)
+		self.__cancelled = True
+		
+class StateFeed:
+
+	"""
+	Feed of the state of a platform, shared by all its subscriptions. The
+	state is retrieved once for every subscription from a single thread,
+	when the provider notifies a change, or at regular intervals when it
+	cannot notify changes. The feed stops once it has no subscription left.
+	
+	:param poll:
+	   Callable returning the current state.
+	:param watch:
+	   Callable receiving a callable to be called on state changes, and
+	   returning a callable cancelling these notifications, or None if
+	   changes cannot be notified.
+	:param float interval:
+	   Seconds between polls, or None for :data:`poll_interval`.
+	"""
+	
+	def __init__(self, poll, watch=None, interval=None):
+	
+		self.__poll = poll
+		self.__watch = watch
+		self.__interval = poll_interval if interval is None else interval
+		self.__lock = threading.RLock()
+		self.__wake = threading.Event()
+		self.__subscriptions = []
+		self.__state = _unknown
+		self.__closed = False
+		self.__thread = threading.Thread(
+			target=self.__run,
+			name="storm-engine-feed",
+			daemon=True
+		)
+		self.__thread.start()
+		
+	def __run(self):
+	
+		cancel = None
+		try:
+			if self.__watch is not None:
+				cancel = self.__watch(self.notify)
+		except Exception:
+			cancel = None
+		interval = self.__interval if cancel is None else None
+		try:
+			while not self.__closed:
+				self.__publish()
+				self.__wake.wait(interval)
+				self.__wake.clear()
+		finally:
+			if cancel is not None:
+				cancel()
+				
+	def __publish(self):
+	
+		try:
+			state = self.__poll()
+		except Exception as err:
+			self.__deliver("error", err)
+			return
+		with self.__lock:
+			if self.__state is _unknown:
+				event, value = "snapshot", state
+			else:
+				event, value = "diff", diff(self.__state, state)
+				if len(value) == 0:
+					return
+			self.__state = state
+			self.__deliver(event, value)
+			
+	def __deliver(self, event, value):
+	
+		with self.__lock:
+			for subscription in list(self.__subscriptions):
+				subscription._deliver(event, value)
+				
+	def __stop(self):
+	
+		self.__closed = True
+		self.__wake.set()
+		
+	@property
+	def closed(self):
+	
+		"""
+		If this feed was stopped.
+		"""
+		
+		return self.__closed
+		
+	def subscribe(self, callback):
+	
+		"""
+		Subscribes to this feed. The current state is delivered right away
+		if it is already known.
+		
+		:param callback:
+		   Callable receiving the events.
+		:rtype:
+		   Subscription
+		:return:
+		   The subscription, or None if this feed was stopped.
+		"""
+		
+		with self.__lock:
+			if self.__closed:
+				return None
+			subscription = Subscription(self, callback)
+			if self.__state is not _unknown:
+				subscription._deliver("snapshot", self.__state)
+			self.__subscriptions.append(subscription)
+			return subscription
+			
+	def unsubscribe(self, subscription):
+	
+		"""
+		Removes a subscription, stopping this feed if it was the last one.
+		
+		:param Subscription subscription:
+		   The subscription.
+		"""
+		
+		with self.__lock:
+			if subscription in self.__subscriptions:
+				self.__subscriptions.remove(subscription)
+			if len(self.__subscriptions) == 0:
+				self.__stop()
+				
+	def notify(self):
+	
+		"""
+		Makes the state be retrieved again right away.
+		"""
+		
+		self.__wake.set()
+		
+	def close(self):
+	
+		"""
+		Stops this feed, delivering a ``closed`` event to its subscriptions.
+		"""
+		
+		with self.__lock:
+			if not self.__closed:
+				self.__deliver("closed", None)
+				self.__subscriptions = []
+				self.__stop()
@@ -19,8 +19,22 @@
 Resource management module.
 """
 
+import asyncio
+import bz2
+import collections
+import concurrent.futures
+import functools
+import gzip
+import hashlib
 import importlib
+import importlib.metadata
+import io
+import json
+import lzma
+import posixpath
+import threading
 import urllib.parse
+import weakref
 
 default_scheme = "file"
 
@@ -28,6 +42,58 @@ default_scheme = "file"
 Scheme used when no one is specified on resource creation.
 """
 
+entry_point_group = "storm.provider.resource"
+
+"""
+Entry point group where resource providers are looked up by scheme.
+"""
+
+buffer_size = 1024 * 1024
+
+"""
+Chunk size used when streaming resource content.
+"""
+
+async_workers = 32
+
+"""
+Maximum amount of threads running blocking operations of the asynchronous
+resource API.
+"""
+
+async_limit = 8
+
+"""
+Maximum amount of concurrent asynchronous operations on resources of the same
+provider, used when the provider does not define its own ``async_limit``.
+"""
+
+watch_interval = 1.
+
+"""
+Seconds between polls of watched resources whose provider cannot notify their
+changes.
+"""
+
+_decompressors = {
+	"gzip": gzip.open,
+	"bz2": bz2.open,
+	"xz": lzma.open
+}
+
+_compression_suffixes = {
+	".gz": "gzip",
+	".bz2": "bz2",
+	".xz": "xz",
+	".lzma": "xz"
+}
+
+_compression_magics = (
+	(b"\x1f\x8b", "gzip"),
+	(b"BZh", "bz2"),
+	(b"\xfd7zXZ\x00", "xz")
+)
+
 class ResourceNotFoundError(BaseException):
 
 	"""
@@ -41,185 +107,1501 @@ class ResourceNotFoundError(BaseException):
 	
 		super().__init__(args)
 		
-def ref(uri_str, props=None):
+class ResourceStat:
 
 	"""
-	References a resource identifier URI representation.
+	Metadata of a resource.
 	
-	:param string uri_str:
-	   Representation of the resource identifier. Path must be absolute.
-	:param props:
-	   Implementation specific properties.
-	:rtype:
-	   Resource
-	:return:
-	   The referenced resource.
-	:raises TypeError:
-	   If URI path is not absolute.
+	:param int size:
+	   Content size in bytes.
+	:param float mtime:
+	   Last modification time in seconds since the epoch, if known.
+	:param bool isdir:
+	   If the resource is a directory.
+	:param version:
+	   Provider supplied token which changes whenever content changes, if
+	   any.
 	"""
 	
-	class Resource:
+	def __init__(self, size, mtime=None, isdir=False, version=None):
 	
-		def __init__(self, mod, uri, props):
+		self.__size = size
+		self.__mtime = mtime
+		self.__isdir = isdir
+		self.__version = version
 		
-			if not mod.isabs(uri.path):
-				if default_scheme == uri.scheme:
-					url_parts = urllib.parse.SplitResult(
-						uri.scheme,
-						uri.location or "",
-						mod.abspath(uri.path),
-						uri.query or "",
-						uri.fragment or ""
-					)
-					self.__uri = URI(url_parts)
-				else:
-					raise TypeError("Resource cannot have a relative path")
-			else:
-				self.__uri = uri
+	@property
+	def size(self):
+	
+		"""
+		Content size in bytes.
+		"""
+		
+		return self.__size
+		
+	@property
+	def mtime(self):
+	
+		"""
+		Last modification time in seconds since the epoch.
+		"""
+		
+		return self.__mtime
+		
+	@property
+	def isdir(self):
+	
+		"""
+		If the resource is a directory.
+		"""
+		
+		return self.__isdir
+		
+	@property
+	def version(self):
+	
+		"""
+		Provider supplied content version token.
+		"""
+		
+		return self.__version
+		
+	def token(self):
+	
+		"""
+		Returns a value which changes whenever content changes. It is the
+		version token if the provider supplies one, or the modification time
+		and size otherwise. It is None if none of them is known.
+		"""
+		
+		if self.__version is not None:
+			return self.__version
+		if self.__mtime is not None:
+			return (self.__mtime, self.__size)
+		return None
+		
+class ResourceCache:
 
-			self.__mod = mod
-			self.__handler = mod.ResourceHandler(self.__uri, props)
-			self.__props = props
-			
-		def __url_parts(self, path, query, fragment):
+	"""
+	Content cache for resources returned by :func:`cached`, holding up to the
+	given amount of bytes and evicting the least recently used entries.
+	
+	:param int max_size:
+	   Maximum amount of cached bytes.
+	"""
+	
+	def __init__(self, max_size):
+	
+		self.__max_size = max_size
+		self.__size = 0
+		self.__entries = collections.OrderedDict()
+		self.__hits = 0
+		self.__misses = 0
+		self.__access_lock = threading.Lock()
 		
-			return urllib.parse.SplitResult(
-				self.__uri.scheme,
-				self.__uri.location or "",
-				path,
-				query or self.__uri.query or "",
-				fragment or self.__uri.fragment or ""
-			)
-			
-		@property
-		def scheme(self):
+	def __drop(self, key):
+	
+		token, data = self.__entries.pop(key)
+		self.__size = self.__size - len(data)
 		
-			return self.__uri.scheme
-			
-		@property
-		def location(self):
+	@property
+	def max_size(self):
+	
+		"""
+		Maximum amount of cached bytes.
+		"""
+		
+		return self.__max_size
+		
+	@property
+	def size(self):
+	
+		"""
+		Current amount of cached bytes.
+		"""
 		
-			return self.__uri.location
+		return self.__size
+		
+	@property
+	def hits(self):
+	
+		"""
+		Amount of reads served from this cache.
+		"""
+		
+		return self.__hits
+		
+	@property
+	def misses(self):
+	
+		"""
+		Amount of reads served by the resource provider.
+		"""
+		
+		return self.__misses
+		
+	def fetch(self, key, load):
+	
+		"""
+		Returns the content for the given key, loading it when it is not
+		cached yet or when it changed.
+		
+		:param key:
+		   Entry key.
+		:param load:
+		   Callable receiving the cached content version token, or None if
+		   there is no cached content, and returning a pair with the content,
+		   or None if it did not change, and its version token.
+		:return:
+		   The content.
+		"""
+		
+		try:
+			self.__access_lock.acquire()
+			entry = self.__entries.get(key)
+			if entry is None:
+				self.__misses = self.__misses + 1
+		finally:
+			self.__access_lock.release()
 			
-		@property
-		def path(self):
+		if entry is None:
+			data, token = load(None)
+		else:
+			data, token = load(entry[0])
+			try:
+				self.__access_lock.acquire()
+				if data is None:
+					self.__hits = self.__hits + 1
+					if key in self.__entries:
+						self.__entries.move_to_end(key)
+					return entry[1]
+				self.__misses = self.__misses + 1
+			finally:
+				self.__access_lock.release()
+				
+		if token is not None:
+			self.put(key, token, data)
+		return data
+		
+	def put(self, key, token, data):
+	
+		"""
+		Cache the given content for the given key and token.
+		
+		:param key:
+		   Entry key.
+		:param token:
+		   Content version token.
+		:param data:
+		   Content as bytes or string.
+		"""
 		
-			return self.__uri.path
+		try:
+			self.__access_lock.acquire()
+			if key in self.__entries:
+				self.__drop(key)
+			if len(data) > self.__max_size:
+				return
+			self.__entries[key] = (token, data)
+			self.__size = self.__size + len(data)
+			while self.__size > self.__max_size:
+				self.__drop(next(iter(self.__entries)))
+		finally:
+			self.__access_lock.release()
 			
-		@property
-		def query(self):
+	def invalidate(self, key):
+	
+		"""
+		Remove the entry of the given key, if any.
+		
+		:param key:
+		   Entry key.
+		"""
 		
-			return self.__uri.query
+		try:
+			self.__access_lock.acquire()
+			if key in self.__entries:
+				self.__drop(key)
+		finally:
+			self.__access_lock.release()
 			
-		@property
-		def fragment(self):
+	def clear(self):
+	
+		"""
+		Remove all entries.
+		"""
 		
-			return self.__uri.fragment
+		try:
+			self.__access_lock.acquire()
+			self.__entries.clear()
+			self.__size = 0
+		finally:
+			self.__access_lock.release()
 			
-		def unref(self):
+class DigestCache:
+
+	"""
+	Content digests of resources, kept by URI and validated with the
+	modification time and size of the resources. Persisted digests which
+	cannot be read are ignored.
+	
+	:param Resource res:
+	   Optional resource where digests are persisted.
+	"""
+	
+	def __init__(self, res=None):
+	
+		self.__res = res
+		self.__entries = None
+		self.__access_lock = threading.Lock()
+		
+	def __load(self):
+	
+		if self.__entries is None:
+			self.__entries = {}
+			if self.__res is not None:
+				try:
+					with self.__res.open("r") as f:
+						entries = json.load(f)
+					if isinstance(entries, dict):
+						self.__entries = entries
+				except (ResourceNotFoundError, ValueError):
+					pass
+		return self.__entries
+		
+	def get(self, uri_str, algo, mtime, size):
+	
+		"""
+		Returns the digest of the given resource, if it is known and the
+		resource did not change.
 		
-			return str(self.__uri)
+		:param string uri_str:
+		   Resource URI.
+		:param string algo:
+		   Digest algorithm name.
+		:param float mtime:
+		   Current resource modification time.
+		:param int size:
+		   Current resource size.
+		:rtype:
+		   string
+		:return:
+		   The hexadecimal digest or None.
+		"""
+		
+		try:
+			self.__access_lock.acquire()
+			entry = self.__load().get(uri_str)
+			if entry is None:
+				return None
+			if entry["mtime"] != mtime or entry["size"] != size:
+				return None
+			return entry["digests"].get(algo)
+		finally:
+			self.__access_lock.release()
 			
-		def ref(self, path, query=None, fragment=None):
+	def put(self, uri_str, algo, mtime, size, digest):
+	
+		"""
+		Keep the digest of the given resource.
 		
-			new_path = self.__mod.join(self.path, path)
-			url_parts = self.__url_parts(new_path, query, fragment)
-			return resource_ref(url_parts, self.__props)
+		:param string uri_str:
+		   Resource URI.
+		:param string algo:
+		   Digest algorithm name.
+		:param float mtime:
+		   Resource modification time.
+		:param int size:
+		   Resource size.
+		:param string digest:
+		   The hexadecimal digest.
+		"""
+		
+		try:
+			self.__access_lock.acquire()
+			entries = self.__load()
+			entry = entries.get(uri_str)
+			if (
+				entry is None
+				or entry["mtime"] != mtime
+				or entry["size"] != size
+			):
+				entry = {
+					"mtime": mtime,
+					"size": size,
+					"digests": {}
+				}
+				entries[uri_str] = entry
+			entry["digests"][algo] = digest
+		finally:
+			self.__access_lock.release()
 			
-		def parent(self, query=None, fragment=None):
+	def store(self):
+	
+		"""
+		Persist the kept digests to the cache resource, if any.
+		"""
 		
-			new_path = self.__mod.dirname(self.path)
-			url_parts = self.__url_parts(new_path, query, fragment)
-			return resource_ref(url_parts, self.__props)
+		if self.__res is None:
+			return
+		try:
+			self.__access_lock.acquire()
+			entries = self.__load()
+			with self.__res.open("w") as f:
+				json.dump(entries, f, indent="\t")
+				f.write("\n")
+		finally:
+			self.__access_lock.release()
 			
-		def exists(self):
+class ResourceWatch:
+
+	"""
+	Watch of resource changes, created by :meth:`Resource.watch` and
+	:func:`watch_many`.
+	
+	Resources whose handler supports ``watch`` are notified by their
+	provider. The rest are polled together from a single thread, stating the
+	resources sharing a parent with one :meth:`Resource.stat_many` call.
+	
+	:param resources:
+	   Iterable of resources to be watched.
+	:param callback:
+	   Callable receiving the changed resource and the event name, being
+	   ``created``, ``modified`` or ``deleted``. It is called from a
+	   background thread, and exceptions raised from it are ignored.
+	:param float interval:
+	   Seconds between polls, or None for :data:`watch_interval`.
+	"""
+	
+	def __init__(self, resources, callback, interval=None):
+	
+		self.__callback = callback
+		self.__interval = watch_interval if interval is None else interval
+		self.__cancelled = threading.Event()
+		self.__resources = tuple(dict.fromkeys(resources))
+		self.__cancels = []
+		polled = []
+		for res in self.__resources:
+			cancel = res._notify(functools.partial(self.__notify, res))
+			if cancel is None:
+				polled.append(res)
+			else:
+				self.__cancels.append(cancel)
+		self.__polled = tuple(polled)
+		self.__tokens = _poll_tokens(self.__polled)
+		self.__thread = None
+		if len(self.__polled) > 0:
+			self.__thread = threading.Thread(
+				target=self.__poll,
+				name="storm-resource-watch",
+				daemon=True
+			)
+			self.__thread.start()
+			
+	def __enter__(self):
+	
+		return self
+		
+	def __exit__(self, exc_type, exc_value, traceback):
+	
+		self.cancel()
 		
-			return self.__handler.exists()
+	def __notify(self, res, event):
+	
+		if not self.__cancelled.is_set():
+			try:
+				self.__callback(res, event)
+			except Exception:
+				pass
+			
+	def __poll(self):
+	
+		while not self.__cancelled.wait(self.__interval):
+			try:
+				tokens = _poll_tokens(self.__polled)
+			except OSError:
+				continue
+			for res in self.__polled:
+				event = _change(self.__tokens.get(res), tokens.get(res))
+				if event is not None:
+					self.__notify(res, event)
+			self.__tokens = tokens
 			
-		def name(self):
+	@property
+	def resources(self):
+	
+		"""
+		Watched resources.
+		"""
+		
+		return self.__resources
+		
+	@property
+	def polled(self):
+	
+		"""
+		Watched resources whose changes are detected by polling.
+		"""
+		
+		return self.__polled
+		
+	def cancel(self):
+	
+		"""
+		Stops watching. No event is notified once it returns, unless it is
+		called from the callback itself.
+		"""
 		
-			return self.__handler.name()
+		self.__cancelled.set()
+		for cancel in self.__cancels:
+			cancel()
+		self.__cancels = []
+		thread = self.__thread
+		if thread is not None and thread is not threading.current_thread():
+			thread.join()
 			
-		def delete(self):
+class _RangeStream(io.RawIOBase):
+
+	def __init__(self, stream, length):
+	
+		self.__stream = stream
+		self.__remaining = length
+		
+	def readable(self):
+	
+		return True
+		
+	def readinto(self, buf):
+	
+		if self.__remaining is None:
+			return self.__stream.readinto(buf)
+		if self.__remaining <= 0:
+			return 0
+		with memoryview(buf) as view:
+			count = self.__stream.readinto(view[:self.__remaining])
+		self.__remaining = self.__remaining - count
+		return count
+		
+	def close(self):
+	
+		if not self.closed:
+			self.__stream.close()
+		super().close()
+		
+class _DecodedStream(io.RawIOBase):
+
+	def __init__(self, stream, decompressor, hasher):
+	
+		self.__stream = stream
+		if decompressor is None:
+			self.__decoded = stream
+		else:
+			self.__decoded = decompressor(stream, "rb")
+		self.__hasher = hasher
+		
+	def __read_into(self, buf):
+	
+		data = self.__decoded.read(len(buf))
+		buf[:len(data)] = data
+		return len(data)
+		
+	def readable(self):
+	
+		return True
+		
+	def readinto(self, buf):
+	
+		if hasattr(self.__decoded, "readinto"):
+			count = self.__decoded.readinto(buf)
+		else:
+			count = self.__read_into(buf)
+		if self.__hasher is not None and count:
+			with memoryview(buf) as view:
+				self.__hasher.update(view[:count])
+		return count
+		
+	def hexdigest(self):
+	
+		return self.__hasher.hexdigest()
+		
+	def close(self):
+	
+		if not self.closed:
+			try:
+				self.__decoded.close()
+			finally:
+				self.__stream.close()
+		super().close()
+		
+class _DecodedReader(io.BufferedReader):
+
+	def hexdigest(self):
+	
+		"""
+		Returns the hexadecimal digest of the content read so far.
+		"""
+		
+		return self.raw.hexdigest()
+		
+class _DecodedTextReader(io.TextIOWrapper):
+
+	def hexdigest(self):
+	
+		"""
+		Returns the hexadecimal digest of the content read so far.
+		"""
+		
+		return self.buffer.hexdigest()
+		
+def _compression(path, stream):
+
+	suffix = posixpath.splitext(path or "")[1]
+	if suffix in _compression_suffixes:
+		return _compression_suffixes[suffix], stream
+		
+	if hasattr(stream, "peek"):
+		magic = stream.peek(6)[:6]
+	elif hasattr(stream, "seekable") and stream.seekable():
+		magic = stream.read(6)
+		stream.seek(0)
+	else:
+		stream = io.BufferedReader(stream, buffer_size)
+		magic = stream.peek(6)[:6]
+	for prefix, compression in _compression_magics:
+		if magic.startswith(prefix):
+			return compression, stream
+	return None, stream
+	
+class _Resource:
+
+	__slots__ = (
+		"__uri",
+		"__prov",
+		"__handler",
+		"__props",
+		"__weakref__"
+	)
+	
+	def __init__(self, prov, uri, props):
+	
+		self.__uri = uri
+		self.__prov = prov
+		self.__handler = prov.handler(uri, props)
+		self.__props = props
+		
+	def __eq__(self, other):
+	
+		if not isinstance(other, _Resource):
+			return NotImplemented
+		if self is other:
+			return True
+		return self.__uri == other.__uri and self.__props == other.__props
 		
-			return self.__handler.delete()
+	def __hash__(self):
+	
+		return hash(self.__uri)
+		
+	def __repr__(self):
+	
+		return "<Resource {}>".format(self.__uri)
+		
+	def __url_parts(self, path, query, fragment):
+	
+		parts = self.__uri.parts
+		return urllib.parse.SplitResult(
+			parts.scheme,
+			parts.netloc,
+			path,
+			query or parts.query,
+			fragment or parts.fragment
+		)
+		
+	@property
+	def scheme(self):
+	
+		return self.__uri.scheme
+		
+	@property
+	def location(self):
+	
+		return self.__uri.location
+		
+	@property
+	def path(self):
+	
+		return self.__uri.path
+		
+	@property
+	def query(self):
+	
+		return self.__uri.query
+		
+	@property
+	def fragment(self):
+	
+		return self.__uri.fragment
+		
+	def unref(self):
+	
+		return str(self.__uri)
+		
+	def ref(self, path, query=None, fragment=None):
+	
+		new_path = self.__prov.join(self.path, path)
+		url_parts = self.__url_parts(new_path, query, fragment)
+		return _resource_ref(self.__prov, url_parts, self.__props)
+		
+	def parent(self, query=None, fragment=None):
+	
+		new_path = self.__prov.dirname(self.path)
+		url_parts = self.__url_parts(new_path, query, fragment)
+		return _resource_ref(self.__prov, url_parts, self.__props)
+		
+	def exists(self):
+	
+		return self.__handler.exists()
+		
+	def name(self):
+	
+		return self.__handler.name()
+		
+	def delete(self):
+	
+		return self.__handler.delete()
+		
+	async def aexists(self):
+	
+		try:
+			aexists = self.__handler.aexists
+		except AttributeError:
+			return await _offload(self.scheme, self.exists)
+		async with self.__prov.semaphore():
+			return await aexists()
 			
-		def open(self, flags):
+	async def adelete(self):
+	
+		try:
+			adelete = self.__handler.adelete
+		except AttributeError:
+			return await _offload(self.scheme, self.delete)
+		async with self.__prov.semaphore():
+			return await adelete()
+			
+	async def aopen(self, flags, compression=None, digest=None):
+	
+		if compression is None and digest is None:
+			try:
+				aopen = self.__handler.aopen
+			except AttributeError:
+				pass
+			else:
+				async with self.__prov.semaphore():
+					return await aopen(flags)
+		stream = await _offload(
+			self.scheme,
+			self.open,
+			flags,
+			compression,
+			digest
+		)
+		return _AsyncStream(self.scheme, stream)
 		
+	def open(self, flags, compression=None, digest=None):
+	
+		if compression is None and digest is None:
 			return self.__handler.open(flags)
+		if "r" not in flags or "+" in flags:
+			raise ValueError("Only read streams can be decoded")
+		if compression not in (None, "auto", *_decompressors):
+			raise ValueError("Unknown compression '{}'".format(compression))
 			
-	class URI:
+		stream = self.__handler.open("rb")
+		try:
+			if compression == "auto":
+				compression, stream = _compression(self.path, stream)
+			if compression is None:
+				decompressor = None
+			else:
+				decompressor = _decompressors[compression]
+			hasher = None if digest is None else hashlib.new(digest)
+		except:
+			stream.close()
+			raise
+		decoded = _DecodedReader(
+			_DecodedStream(stream, decompressor, hasher),
+			buffer_size
+		)
+		if "b" in flags:
+			return decoded
+		return _DecodedTextReader(decoded)
+		
+	def stat(self):
 	
-		def __init__(self, url_parts):
+		try:
+			stat = self.__handler.stat
+		except AttributeError:
+			return None
+		return stat()
 		
-			self.__url_parts = url_parts
+	def open_if_changed(self, flags, version):
+	
+		try:
+			open_if_changed = self.__handler.open_if_changed
+		except AttributeError:
+			pass
+		else:
+			return open_if_changed(flags, version)
 			
-		def __str__(self):
+		stat = self.stat()
+		token = None if stat is None else stat.token()
+		if token is not None and token == version:
+			return None, token
+		return self.open(flags), token
 		
-			return urllib.parse.urlunsplit(self.__url_parts)
+	def open_range(self, offset, length=None):
+	
+		try:
+			open_range = self.__handler.open_range
+		except AttributeError:
+			pass
+		else:
+			return open_range(offset, length)
+		return range_stream(self.open("rb"), offset, length)
+		
+	def view(self):
+	
+		try:
+			view = self.__handler.view
+		except AttributeError:
+			pass
+		else:
+			return view()
+		with self.open("rb") as stream:
+			return memoryview(stream.read()).toreadonly()
+			
+	def list(self):
+	
+		try:
+			entries = self.__handler.list()
+		except AttributeError:
+			msg = "Resource provider of '{}' cannot list".format(self.scheme)
+			raise NotImplementedError(msg)
+		for name, stat in entries:
+			yield self.ref(name), stat
+			
+	def walk(self):
+	
+		pending = [ self.list() ]
+		while len(pending) > 0:
+			for res, stat in pending[-1]:
+				yield res, stat
+				if stat.isdir:
+					pending.append(res.list())
+					break
+			else:
+				pending.pop()
+				
+	def stat_many(self, paths):
+	
+		try:
+			stat_many = self.__handler.stat_many
+		except AttributeError:
+			pass
+		else:
+			return stat_many(paths)
 			
-		@property
-		def scheme(self):
+		stats = []
+		for path in paths:
+			try:
+				stats.append(self.ref(path).stat())
+			except ResourceNotFoundError:
+				stats.append(None)
+		return stats
 		
-			return self.__url_parts[0]
+	def copy_to(self, target, progress=None):
+	
+		try:
+			copy_to = self.__handler.copy_to
+		except AttributeError:
+			copied = None
+		else:
+			copied = copy_to(target, progress)
+		if copied is not None:
+			return copied
 			
-		@property
-		def location(self):
+		stat = self.stat()
+		size = None if stat is None else stat.size
+		copied = 0
+		with self.open("rb") as source, target.open("wb") as dest:
+			for chunk in _chunks(source):
+				dest.write(chunk)
+				copied = copied + len(chunk)
+				if progress is not None:
+					progress(copied, size)
+		return copied
+		
+	def replace(self, target):
+	
+		try:
+			replace = self.__handler.replace
+		except AttributeError:
+			replaced = None
+		else:
+			replaced = replace(target)
+		if replaced is None:
+			self.copy_to(target)
+			self.delete()
+			return False
+		return True
+		
+	def watch(self, callback, interval=None):
+	
+		return ResourceWatch([ self ], callback, interval)
 		
-			if len(self.__url_parts[1]) > 0:
-				return Location(self.__url_parts)
+	def _notify(self, callback):
+	
+		try:
+			watch = self.__handler.watch
+		except AttributeError:
 			return None
-			
-		@property
-		def path(self):
+		return watch(callback)
 		
-			return self.__url_parts[2] or None
-			
-		@property
-		def query(self):
+	def digest(self, algo="sha256", cache=None):
+	
+		uri_str = self.unref()
+		stat = None if cache is None else self.stat()
+		if stat is not None and stat.mtime is None:
+			stat = None
+		if stat is not None:
+			digest = cache.get(uri_str, algo, stat.mtime, stat.size)
+			if digest is not None:
+				return digest
+				
+		hasher = hashlib.new(algo)
+		with self.open("rb") as stream:
+			for chunk in _chunks(stream):
+				hasher.update(chunk)
+		digest = hasher.hexdigest()
 		
-			return self.__url_parts[3] or None
-			
-		@property
-		def fragment(self):
+		if stat is not None:
+			cache.put(uri_str, algo, stat.mtime, stat.size, digest)
+		return digest
 		
-			return self.__url_parts[4] or None
-			
-	class Location:
+class _URI:
+
+	__slots__ = (
+		"__url_parts",
+		"__str"
+	)
+	
+	def __init__(self, url_parts):
 	
-		def __init__(self, url_parts):
+		self.__url_parts = url_parts
+		self.__str = urllib.parse.urlunsplit(url_parts)
 		
-			self.__url_parts = url_parts
-			
-		def __str__(self):
+	def __str__(self):
+	
+		return self.__str
 		
-			return self.__url_parts[1]
-			
-		@property
-		def username(self):
+	def __eq__(self, other):
+	
+		if not isinstance(other, _URI):
+			return NotImplemented
+		return self.__str == other.__str
 		
-			return self.__url_parts.username
-			
-		@property
-		def password(self):
+	def __hash__(self):
+	
+		return hash(self.__str)
+		
+	@property
+	def parts(self):
+	
+		return self.__url_parts
+		
+	@property
+	def scheme(self):
+	
+		return self.__url_parts[0]
+		
+	@property
+	def location(self):
+	
+		if len(self.__url_parts[1]) > 0:
+			return _Location(self.__url_parts)
+		return None
+		
+	@property
+	def path(self):
+	
+		return self.__url_parts[2] or None
+		
+	@property
+	def query(self):
+	
+		return self.__url_parts[3] or None
+		
+	@property
+	def fragment(self):
+	
+		return self.__url_parts[4] or None
+		
+class _Location:
+
+	def __init__(self, url_parts):
+	
+		self.__url_parts = url_parts
+		
+	def __str__(self):
+	
+		return self.__url_parts[1]
+		
+	@property
+	def username(self):
+	
+		return self.__url_parts.username
+		
+	@property
+	def password(self):
+	
+		return self.__url_parts.password
+		
+	@property
+	def hostname(self):
+	
+		return self.__url_parts.hostname
+		
+	@property
+	def port(self):
+	
+		return self.__url_parts.port
+		
+class _CachedResource:
+
+	def __init__(self, res, cache):
+	
+		self.__res = res
+		self.__cache = cache
+		
+	def __getattr__(self, name):
+	
+		return getattr(self.__res, name)
+		
+	def ref(self, path, query=None, fragment=None):
+	
+		res = self.__res.ref(path, query, fragment)
+		return _CachedResource(res, self.__cache)
+		
+	def parent(self, query=None, fragment=None):
+	
+		res = self.__res.parent(query, fragment)
+		return _CachedResource(res, self.__cache)
+		
+	def delete(self):
+	
+		self.__invalidate()
+		return self.__res.delete()
+		
+	def replace(self, target):
+	
+		self.__invalidate()
+		return self.__res.replace(target)
+		
+	async def adelete(self):
+	
+		return await _offload(self.scheme, self.delete)
 		
-			return self.__url_parts.password
+	async def aopen(self, flags, compression=None, digest=None):
+	
+		stream = await _offload(
+			self.scheme,
+			self.open,
+			flags,
+			compression,
+			digest
+		)
+		return _AsyncStream(self.scheme, stream)
+		
+	def open(self, flags, compression=None, digest=None):
+	
+		if "r" not in flags or "+" in flags:
+			self.__invalidate()
+			return self.__res.open(flags)
+		if compression is not None or digest is not None:
+			return self.__res.open(flags, compression, digest)
 			
-		@property
-		def hostname(self):
+		def load(token):
+		
+			stream, token = self.__res.open_if_changed(flags, token)
+			if stream is None:
+				return None, token
+			with stream:
+				return stream.read(), token
+				
+		data = self.__cache.fetch((self.__res.unref(), "b" in flags), load)
+		if isinstance(data, str):
+			return io.StringIO(data, newline="")
+		return io.BytesIO(data)
+		
+	def __invalidate(self):
+	
+		uri_str = self.__res.unref()
+		self.__cache.invalidate((uri_str, True))
+		self.__cache.invalidate((uri_str, False))
+		
+class _AsyncStream:
+
+	def __init__(self, scheme, stream):
+	
+		self.__scheme = scheme
+		self.__stream = stream
+		
+	async def __aenter__(self):
+	
+		return self
+		
+	async def __aexit__(self, exc_type, exc_value, traceback):
+	
+		await self.close()
+		
+	@property
+	def stream(self):
+	
+		return self.__stream
+		
+	async def read(self, size=-1):
+	
+		return await _offload(self.__scheme, self.__stream.read, size)
+		
+	async def readline(self, size=-1):
+	
+		return await _offload(self.__scheme, self.__stream.readline, size)
+		
+	async def write(self, data):
+	
+		return await _offload(self.__scheme, self.__stream.write, data)
+		
+	async def flush(self):
+	
+		return await _offload(self.__scheme, self.__stream.flush)
 		
-			return self.__url_parts.hostname
+	async def close(self):
+	
+		return await _offload(self.__scheme, self.__stream.close)
+		
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+def _executor():
+
+	global _async_executor
+	
+	if _async_executor is None:
+		try:
+			_async_executor_lock.acquire()
+			if _async_executor is None:
+				_async_executor = concurrent.futures.ThreadPoolExecutor(
+					async_workers,
+					"storm-resource"
+				)
+		finally:
+			_async_executor_lock.release()
+	return _async_executor
+	
+async def _offload(scheme, fn, *args):
+
+	async with _providers.get(scheme).semaphore():
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(
+			_executor(),
+			functools.partial(fn, *args)
+		)
+		
+def _read_all(res, flags):
+
+	with res.open(flags) as stream:
+		return stream.read()
+		
+def _write_all(res, data, flags):
+
+	with res.open(flags) as stream:
+		stream.write(data)
+		
+class _Provider:
+
+	def __init__(self, impl):
+	
+		self.impl = impl
+		self.handler = impl.ResourceHandler
+		self.isabs = impl.isabs
+		self.abspath = impl.abspath
+		self.dirname = impl.dirname
+		self.join = impl.join
+		self.async_limit = getattr(impl, "async_limit", None)
+		self.__semaphores = weakref.WeakKeyDictionary()
+		self.__semaphores_lock = threading.Lock()
+		
+	def semaphore(self):
+	
+		loop = asyncio.get_running_loop()
+		try:
+			self.__semaphores_lock.acquire()
+			semaphore = self.__semaphores.get(loop)
+			if semaphore is None:
+				limit = self.async_limit or async_limit
+				semaphore = asyncio.Semaphore(limit)
+				self.__semaphores[loop] = semaphore
+			return semaphore
+		finally:
+			self.__semaphores_lock.release()
 			
-		@property
-		def port(self):
+class _ProviderRegistry:
+
+	def __init__(self):
+	
+		self.__providers = {}
+		self.__entry_points = None
+		self.__access_lock = threading.Lock()
+		
+	def __entry_point(self, scheme):
+	
+		if self.__entry_points is None:
+			self.__entry_points = {
+				entry_point.name: entry_point
+				for entry_point in importlib.metadata.entry_points(
+					group=entry_point_group
+				)
+			}
+		return self.__entry_points.get(scheme)
 		
-			return self.__url_parts.port
+	def __resolve(self, scheme):
+	
+		entry_point = self.__entry_point(scheme)
+		if entry_point is not None:
+			return entry_point.load()
+		mod_name = "storm.provider.resource.{}".format(scheme)
+		return importlib.import_module(mod_name)
+		
+	def get(self, scheme):
+	
+		prov = self.__providers.get(scheme)
+		if prov is not None:
+			return prov
+		try:
+			self.__access_lock.acquire()
+			prov = self.__providers.get(scheme)
+			if prov is None:
+				prov = _Provider(self.__resolve(scheme))
+				self.__providers[scheme] = prov
+			return prov
+		finally:
+			self.__access_lock.release()
 			
-	def resource_ref(url_parts, props):
+	def put(self, scheme, impl):
 	
-		uri = URI(url_parts)
-		mod_name = "storm.provider.resource.{}".format(uri.scheme)
-		return Resource(importlib.import_module(mod_name), uri, props)
+		try:
+			self.__access_lock.acquire()
+			self.__providers[scheme] = _Provider(impl)
+		finally:
+			self.__access_lock.release()
+			
+	def remove(self, scheme):
+	
+		try:
+			self.__access_lock.acquire()
+			return self.__providers.pop(scheme, None) is not None
+		finally:
+			self.__access_lock.release()
+			
+_providers = _ProviderRegistry()
+
+def _chunks(stream):
+
+	try:
+		readinto = stream.readinto
+	except AttributeError:
+		chunk = stream.read(buffer_size)
+		while len(chunk) > 0:
+			yield chunk
+			chunk = stream.read(buffer_size)
+		return
+		
+	buf = bytearray(buffer_size)
+	view = memoryview(buf)
+	count = readinto(buf)
+	while count:
+		yield view[:count]
+		count = readinto(buf)
+		
+def _poll_tokens(resources):
+
+	siblings = collections.OrderedDict()
+	for res in resources:
+		siblings.setdefault(res.parent(), []).append(res)
+	tokens = {}
+	for parent, members in siblings.items():
+		stats = parent.stat_many([ res.name() for res in members ])
+		for res, stat in zip(members, stats):
+			if stat is not None:
+				tokens[res] = stat.token(), stat.size
+			elif res.exists():
+				tokens[res] = True
+	return tokens
+	
+def _change(token, new_token):
+
+	if token is None:
+		return None if new_token is None else "created"
+	if new_token is None:
+		return "deleted"
+	return None if token == new_token else "modified"
+	
+def _freeze(value):
+
+	if isinstance(value, dict):
+		return tuple(sorted(
+			(key, _freeze(item_value))
+			for key, item_value in value.items()
+		))
+	if isinstance(value, list):
+		return tuple(_freeze(item) for item in value)
+	hash(value)
+	return value
+	
+_resources = weakref.WeakValueDictionary()
+_resources_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4096)
+def _split(uri_str, scheme):
+
+	return urllib.parse.urlsplit(uri_str, scheme)
+	
+def _resource_ref(prov, url_parts, props):
+
+	if not prov.isabs(url_parts.path):
+		if default_scheme != url_parts.scheme:
+			raise TypeError("Resource cannot have a relative path")
+		url_parts = url_parts._replace(path=prov.abspath(url_parts.path))
+	uri = _URI(url_parts)
+	
+	try:
+		key = (prov, str(uri), _freeze(props))
+	except TypeError:
+		return _Resource(prov, uri, props)
+	res = _resources.get(key)
+	if res is not None:
+		return res
+	res = _Resource(prov, uri, props)
+	try:
+		_resources_lock.acquire()
+		return _resources.setdefault(key, res)
+	finally:
+		_resources_lock.release()
 		
-	return resource_ref(urllib.parse.urlsplit(uri_str, default_scheme), props)
+def register(scheme, impl):
+
+	"""
+	Register a resource provider for the given scheme.
+	
+	Registered providers take precedence over the ones found at the
+	:data:`entry_point_group` entry points and over the
+	``storm.provider.resource.<scheme>`` modules.
+	
+	:param string scheme:
+	   Scheme handled by the provider.
+	:param impl:
+	   Module or object implementing the resource provider interface.
+	"""
+	
+	_providers.put(scheme, impl)
+	
+def unregister(scheme):
+
+	"""
+	Forget the resource provider resolved or registered for the given scheme.
+	
+	:param string scheme:
+	   Scheme handled by the provider.
+	:rtype:
+	   bool
+	:return:
+	   True if some provider was forgotten. False otherwise.
+	"""
+	
+	return _providers.remove(scheme)
+	
+def provider(scheme):
+
+	"""
+	Returns the resource provider for the given scheme.
+	
+	Providers are resolved once and kept for later lookups.
+	
+	:param string scheme:
+	   Scheme handled by the provider.
+	:return:
+	   Module or object implementing the resource provider interface.
+	:raises ImportError:
+	   If no provider is available for the given scheme.
+	"""
+	
+	return _providers.get(scheme).impl
+	
+def ref(uri_str, props=None):
 
+	"""
+	References a resource identifier URI representation.
+	
+	:param string uri_str:
+	   Representation of the resource identifier. Path must be absolute.
+	:param props:
+	   Implementation specific properties.
+	:rtype:
+	   Resource
+	:return:
+	   The referenced resource.
+	:raises TypeError:
+	   If URI path is not absolute.
+	:raises ImportError:
+	   If no provider is available for the URI scheme.
+	   
+	Resources are immutable and hashable values. Resources with the same URI
+	and properties are equal, and they are the same object while it is
+	referenced.
+	"""
+	
+	url_parts = _split(uri_str, default_scheme)
+	return _resource_ref(_providers.get(url_parts.scheme), url_parts, props)
+	
+def range_stream(stream, offset=0, length=None):
+
+	"""
+	Returns a stream reading a range of the given binary stream, seeking to
+	the range start when the given stream supports it.
+	
+	:param stream:
+	   Binary stream positioned at its start.
+	:param int offset:
+	   Range start.
+	:param int length:
+	   Range length, or None for reading up to the stream end.
+	:rtype:
+	   ResourceStream
+	:return:
+	   The range stream. It closes the given stream when closed.
+	"""
+	
+	try:
+		stream.seek(offset)
+	except (AttributeError, OSError, ValueError):
+		remaining = offset
+		while remaining > 0:
+			skipped = len(stream.read(min(remaining, buffer_size)))
+			if skipped == 0:
+				break
+			remaining = remaining - skipped
+	return _RangeStream(stream, length)
+	
+def cached(res, cache):
+
+	"""
+	Returns a resource which serves its content, and the content of the
+	resources referenced from it, through the given cache.
+	
+	Cached content is revalidated on every read with the resource metadata,
+	so resources whose provider does not support :meth:`Resource.stat` are
+	always read from the provider.
+	
+	:param Resource res:
+	   Resource to be cached.
+	:param ResourceCache cache:
+	   Cache holding the content.
+	:rtype:
+	   Resource
+	:return:
+	   The caching resource.
+	"""
+	
+	return _CachedResource(res, cache)
+	
+def digests(resources, algo="sha256", cache=None, max_workers=None):
+
+	"""
+	Computes the content digests of the given resources in parallel.
+	
+	:param resources:
+	   Iterable of resources.
+	:param string algo:
+	   Digest algorithm name.
+	:param DigestCache cache:
+	   Optional cache of already known digests.
+	:param int max_workers:
+	   Maximum amount of threads computing digests.
+	:rtype:
+	   list
+	:return:
+	   The hexadecimal digests, in the same order than the given resources.
+	"""
+	
+	def digest(res):
+	
+		return res.digest(algo, cache)
+		
+	with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+		return list(executor.map(digest, resources))
+		
+def watch_many(resources, callback, interval=None):
+
+	"""
+	Watches the changes of the given resources with a single watch.
+	
+	:param resources:
+	   Iterable of resources.
+	:param callback:
+	   Callable receiving the changed resource and the event name, being
+	   ``created``, ``modified`` or ``deleted``.
+	:param float interval:
+	   Seconds between polls of the resources whose provider cannot notify
+	   their changes, or None for :data:`watch_interval`.
+	:rtype:
+	   ResourceWatch
+	:return:
+	   The watch. It must be cancelled when changes are no longer needed.
+	"""
+	
+	return ResourceWatch(resources, callback, interval)
+	
+async def read_all(res, flags="rb"):
+
+	"""
+	Reads the whole content of the given resource without blocking the
+	running event loop.
+	
+	:param Resource res:
+	   Resource to be read.
+	:param flags:
+	   Open flags.
+	:return:
+	   The resource content.
+	:raises ResourceNotFoundError:
+	   If the resource does not exist.
+	"""
+	
+	return await _offload(res.scheme, _read_all, res, flags)
+	
+async def write_all(res, data, flags=None):
+
+	"""
+	Replaces the whole content of the given resource without blocking the
+	running event loop.
+	
+	:param Resource res:
+	   Resource to be written.
+	:param data:
+	   Content as bytes or string.
+	:param flags:
+	   Open flags. By default, they are chosen from the content type.
+	"""
+	
+	if flags is None:
+		flags = "w" if isinstance(data, str) else "wb"
+	await _offload(res.scheme, _write_all, res, data, flags)
@@ -49,6 +49,35 @@ def merge_dict(source, other):
 		except KeyError:
 			source[key] = value
 			
+def fatal(error):
+
+	"""
+	Tells if an error must end the thread it was raised in, rather than be
+	handled as a failure by threads serving others. Only system exits and
+	keyboard interrupts are, as resource errors are not exceptions either.
+	
+	:param BaseException error:
+	   The error.
+	:rtype:
+	   bool
+	:return:
+	   True if the error must be raised again.
+	"""
+	
+	return isinstance(error, (SystemExit, KeyboardInterrupt))
+	
+def notify_all(cond):
+
+	"""
+	Wakes up every thread waiting for a condition.
+	
+	:param threading.Condition cond:
+	   The condition, which is acquired meanwhile.
+	"""
+	
+	with cond:
+		cond.notify_all()
+		
 def execute(context, cmd_args, wait_timeout=0.1):
 
 	"""
@@ -0,0 +1,363 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Common implementation of archive resource providers.
+
+Archive resource paths are made of the local path of the archive and the path
+of the member within it, separated by ``!``, like in
+``zip:///path/to/archive.zip!/path/to/member``.
+"""
+
+from storm.module import resource
+
+import collections
+import io
+import mmap
+import os
+import posixpath
+import threading
+
+index_limit = 16
+
+"""
+Maximum amount of archive indexes kept. The least recently used ones are
+closed first.
+"""
+
+class Member:
+
+	def __init__(self, path, size, mtime, isdir, offset=None, info=None):
+	
+		self.path = path
+		self.size = size
+		self.mtime = mtime
+		self.isdir = isdir
+		self.offset = offset
+		self.info = info
+		
+class Index:
+
+	def __init__(
+		self,
+		archive_path,
+		version,
+		members,
+		handle=None,
+		close=None
+	):
+	
+		self.archive_path = archive_path
+		self.version = version
+		self.members = {
+			"/": Member("/", 0, None, True)
+		}
+		self.children = {}
+		self.handle = handle
+		self.__close = close
+		self.__mmap = None
+		self.__users = 0
+		self.__closed = False
+		self.__lock = threading.Lock()
+		for member in members:
+			self.members[member.path] = member
+			path = member.path
+			while path != "/":
+				parent = posixpath.dirname(path)
+				if parent not in self.members:
+					self.members[parent] = Member(parent, 0, None, True)
+				names = self.children.setdefault(parent, set())
+				if posixpath.basename(path) in names:
+					break
+				names.add(posixpath.basename(path))
+				path = parent
+				
+	def __enter__(self):
+	
+		return self
+		
+	def __exit__(self, exc_type, exc_value, traceback):
+	
+		self.release()
+		
+	def __release(self):
+	
+		if self.__close is not None:
+			self.__close()
+		if self.__mmap is not None:
+			try:
+				self.__mmap.close()
+			except BufferError:
+				# Still viewed, it is unmapped once the views are released
+				pass
+				
+	def acquire(self):
+	
+		try:
+			self.__lock.acquire()
+			self.__users = self.__users + 1
+		finally:
+			self.__lock.release()
+			
+	def release(self):
+	
+		try:
+			self.__lock.acquire()
+			self.__users = self.__users - 1
+			released = self.__closed and self.__users == 0
+		finally:
+			self.__lock.release()
+		if released:
+			self.__release()
+			
+	def close(self):
+	
+		try:
+			self.__lock.acquire()
+			self.__closed = True
+			released = self.__users == 0
+		finally:
+			self.__lock.release()
+		if released:
+			self.__release()
+			
+	def view(self, offset, size):
+	
+		try:
+			self.__lock.acquire()
+			if self.__mmap is None:
+				with open(self.archive_path, "rb", buffering=0) as f:
+					self.__mmap = mmap.mmap(
+						f.fileno(),
+						0,
+						access=mmap.ACCESS_READ
+					)
+		finally:
+			self.__lock.release()
+		return memoryview(self.__mmap)[offset:offset + size]
+		
+	def open_stored(self, member):
+	
+		stream = open(self.archive_path, "rb", buffering=0)
+		return resource.range_stream(stream, member.offset, member.size)
+		
+_indexes = collections.OrderedDict()
+_indexes_lock = threading.Lock()
+
+def member_path(path):
+
+	return posixpath.normpath(posixpath.join("/", path))
+	
+def split(path):
+
+	archive_path, sep, path = path.partition("!")
+	return archive_path, member_path(path)
+	
+def index(archive_path, build):
+
+	# Returned indexes are acquired, so they are only closed once released
+	st = os.stat(archive_path)
+	version = (st.st_mtime_ns, st.st_size)
+	try:
+		_indexes_lock.acquire()
+		idx = _indexes.get(archive_path)
+		if idx is not None and idx.version == version:
+			_indexes.move_to_end(archive_path)
+			idx.acquire()
+			return idx
+	finally:
+		_indexes_lock.release()
+	idx = build(archive_path, version)
+	idx.acquire()
+	stale = []
+	try:
+		_indexes_lock.acquire()
+		old = _indexes.pop(archive_path, None)
+		if old is not None:
+			stale.append(old)
+		_indexes[archive_path] = idx
+		while len(_indexes) > index_limit:
+			stale.append(_indexes.popitem(False)[1])
+	finally:
+		_indexes_lock.release()
+	for old in stale:
+		old.close()
+	return idx
+	
+def isabs(path):
+
+	return posixpath.isabs(path)
+	
+def abspath(path):
+
+	return os.path.abspath(path)
+	
+def dirname(path):
+
+	archive_path, path = split(path)
+	if path == "/":
+		return posixpath.dirname(archive_path)
+	return "{}!{}".format(archive_path, posixpath.dirname(path))
+	
+def join(base_path, relative_path):
+
+	if "!" in base_path:
+		return posixpath.join(base_path, relative_path)
+	return posixpath.join("{}!/".format(base_path), relative_path)
+	
+class ArchiveHandler:
+
+	def __init__(self, uri, props):
+	
+		self.__archive_path, self.__path = split(uri.path)
+		
+	def _build(self, archive_path, version):
+	
+		"""
+		Abstract. Reads the member index of an archive.
+		
+		:param string archive_path:
+		   Local path of the archive.
+		:param version:
+		   Version of the archive, kept by the index.
+		:rtype:
+		   Index
+		"""
+		
+		raise NotImplementedError()
+		
+	def _open(self, idx, member):
+	
+		"""
+		Abstract. Opens a binary stream reading a member which is not stored
+		as is in the archive.
+		
+		:param Index idx:
+		   The archive index.
+		:param Member member:
+		   The member.
+		:rtype:
+		   ResourceStream
+		"""
+		
+		raise NotImplementedError()
+		
+	def _offset(self, idx, member):
+	
+		"""
+		Returns the offset of a member stored as is in the archive file,
+		which is then read or viewed straight from it. None by default.
+		
+		:param Index idx:
+		   The archive index.
+		:param Member member:
+		   The member.
+		:rtype:
+		   int
+		"""
+		
+		return None
+		
+	def __offset(self, idx, member):
+	
+		if member.offset is None:
+			member.offset = self._offset(idx, member)
+		return member.offset
+		
+	def __index(self):
+	
+		try:
+			return index(self.__archive_path, self._build)
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__archive_path) from err
+			
+	def __member(self, idx, path):
+	
+		member = idx.members.get(path)
+		if member is None:
+			raise resource.ResourceNotFoundError(path)
+		return member
+		
+	def __stat(self, idx, member):
+	
+		return resource.ResourceStat(
+			member.size,
+			member.mtime,
+			member.isdir,
+			(idx.version, member.path)
+		)
+		
+	def exists(self):
+	
+		try:
+			with self.__index() as idx:
+				return self.__path in idx.members
+		except resource.ResourceNotFoundError:
+			return False
+			
+	def name(self):
+	
+		if self.__path == "/":
+			return posixpath.basename(self.__archive_path)
+		return posixpath.basename(self.__path)
+		
+	def delete(self):
+	
+		return False
+		
+	def open(self, flags):
+	
+		if "r" not in flags or "+" in flags:
+			raise io.UnsupportedOperation("Archive members are read only")
+		with self.__index() as idx:
+			member = self.__member(idx, self.__path)
+			if member.isdir:
+				raise IsADirectoryError(self.__path)
+			if self.__offset(idx, member) is not None:
+				stream = idx.open_stored(member)
+			else:
+				stream = self._open(idx, member)
+		if "b" in flags:
+			return stream
+		return io.TextIOWrapper(io.BufferedReader(stream))
+		
+	def stat(self):
+	
+		with self.__index() as idx:
+			return self.__stat(idx, self.__member(idx, self.__path))
+			
+	def list(self):
+	
+		with self.__index() as idx:
+			if not self.__member(idx, self.__path).isdir:
+				raise NotADirectoryError(self.__path)
+			entries = []
+			for name in idx.children.get(self.__path, ()):
+				member = idx.members[posixpath.join(self.__path, name)]
+				entries.append((name, self.__stat(idx, member)))
+		return iter(entries)
+		
+	def view(self):
+	
+		with self.__index() as idx:
+			member = self.__member(idx, self.__path)
+			if member.isdir:
+				raise IsADirectoryError(self.__path)
+			if self.__offset(idx, member) is not None:
+				return idx.view(member.offset, member.size)
+			with self._open(idx, member) as stream:
+				return memoryview(stream.read())
@@ -0,0 +1,586 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+File resource provider.
+"""
+
+from storm.module import resource
+
+import collections
+import errno
+import io
+import mmap
+import os
+import os.path
+import stat
+import struct
+import threading
+
+try:
+	import ctypes
+	import ctypes.util
+except ImportError:
+	ctypes = None
+	
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+	
+buffer_size = 1024 * 1024
+
+"""
+Stream buffer size used when no ``buffer-size`` property is given.
+"""
+
+copy_size = 16 * 1024 * 1024
+
+"""
+Maximum amount of bytes copied by each system call when copying files.
+"""
+
+_FICLONE = 0x40049409
+
+_copy_fallback_errnos = (
+	errno.EXDEV,
+	errno.ENOSYS,
+	errno.EINVAL,
+	errno.EOPNOTSUPP,
+	errno.ENOTSUP
+)
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+
+_watch_mask = (
+	_IN_MODIFY
+	| _IN_ATTRIB
+	| _IN_CLOSE_WRITE
+	| _IN_MOVED_FROM
+	| _IN_MOVED_TO
+	| _IN_CREATE
+	| _IN_DELETE
+	| _IN_ONLYDIR
+)
+
+_inotify_event = struct.Struct("iIII")
+
+class _Inotify:
+
+	def __init__(self, libc):
+	
+		self.__libc = libc
+		self.__fd = libc.inotify_init1(os.O_CLOEXEC)
+		if self.__fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1")
+		self.__lock = threading.Lock()
+		self.__wds = {}
+		self.__callbacks = {}
+		self.__thread = threading.Thread(
+			target=self.__read,
+			name="storm-resource-inotify",
+			daemon=True
+		)
+		self.__thread.start()
+		
+	def __read(self):
+	
+		while True:
+			data = os.read(self.__fd, 64 * 1024)
+			events = collections.OrderedDict()
+			offset = 0
+			while offset < len(data):
+				wd, mask, cookie, length = _inotify_event.unpack_from(
+					data,
+					offset
+				)
+				offset = offset + _inotify_event.size
+				name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+				offset = offset + length
+				self.__collect(events, wd, mask, name)
+			for callback, event in events:
+				callback(event)
+				
+	def __collect(self, events, wd, mask, name):
+	
+		with self.__lock:
+			if mask & _IN_Q_OVERFLOW:
+				for names in self.__callbacks.values():
+					for callbacks in names.values():
+						for callback in callbacks:
+							events[callback, "modified"] = None
+				return
+			if mask & _IN_IGNORED:
+				self.__callbacks.pop(wd, None)
+				for path, path_wd in list(self.__wds.items()):
+					if path_wd == wd:
+						del self.__wds[path]
+				return
+			callbacks = self.__callbacks.get(wd, {}).get(name, ())
+			if mask & (_IN_CREATE | _IN_MOVED_TO):
+				event = "created"
+			elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+				event = "deleted"
+			else:
+				event = "modified"
+			for callback in callbacks:
+				events[callback, event] = None
+				
+	def add(self, path, callback):
+	
+		dir_path, name = os.path.split(path)
+		with self.__lock:
+			wd = self.__wds.get(dir_path)
+			if wd is None:
+				wd = self.__libc.inotify_add_watch(
+					self.__fd,
+					os.fsencode(dir_path),
+					_watch_mask
+				)
+				if wd < 0:
+					return None
+				self.__wds[dir_path] = wd
+			names = self.__callbacks.setdefault(wd, {})
+			names.setdefault(name, []).append(callback)
+			
+		def cancel():
+		
+			with self.__lock:
+				names = self.__callbacks.get(wd)
+				if names is None or callback not in names.get(name, ()):
+					return
+				names[name].remove(callback)
+				if len(names[name]) == 0:
+					del names[name]
+				if len(names) == 0:
+					del self.__callbacks[wd]
+					del self.__wds[dir_path]
+					self.__libc.inotify_rm_watch(self.__fd, wd)
+					
+		return cancel
+		
+_inotify_instance = None
+_inotify_lock = threading.Lock()
+
+def _inotify():
+
+	global _inotify_instance
+	
+	with _inotify_lock:
+		if _inotify_instance is None and ctypes is not None:
+			try:
+				libc = ctypes.CDLL(
+					ctypes.util.find_library("c"),
+					use_errno=True
+				)
+				_inotify_instance = _Inotify(libc)
+			except (AttributeError, OSError):
+				_inotify_instance = False
+		return _inotify_instance or None
+		
+def _stat(st):
+
+	return resource.ResourceStat(
+		st.st_size,
+		st.st_mtime,
+		stat.S_ISDIR(st.st_mode),
+		(st.st_mtime_ns, st.st_size, st.st_ino)
+	)
+	
+class _MappedStream(io.RawIOBase):
+
+	def __init__(self, mapping):
+	
+		self.__mapping = mapping
+		
+	def readable(self):
+	
+		return True
+		
+	def seekable(self):
+	
+		return True
+		
+	def readinto(self, buf):
+	
+		pos = self.__mapping.tell()
+		with memoryview(buf) as view, memoryview(self.__mapping) as mapped:
+			size = min(view.nbytes, len(mapped) - pos)
+			view.cast("B")[:size] = mapped[pos:pos + size]
+		self.__mapping.seek(pos + size)
+		return size
+		
+	def read(self, size=-1):
+	
+		self._checkClosed()
+		return self.__mapping.read(None if size < 0 else size)
+		
+	def readall(self):
+	
+		return self.read()
+		
+	def seek(self, offset, whence=io.SEEK_SET):
+	
+		self._checkClosed()
+		self.__mapping.seek(offset, whence)
+		return self.__mapping.tell()
+		
+	def tell(self):
+	
+		self._checkClosed()
+		return self.__mapping.tell()
+		
+	def close(self):
+	
+		if not self.closed:
+			self.__mapping.close()
+		super().close()
+		
+def _reflink(src_fd, dst_fd):
+
+	if fcntl is None:
+		return False
+	try:
+		fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+		return True
+	except OSError:
+		return False
+		
+def _copy_file_range(src_fd, dst_fd, count):
+
+	return os.copy_file_range(src_fd, dst_fd, count)
+	
+def _sendfile(src_fd, dst_fd, count):
+
+	return os.sendfile(dst_fd, src_fd, None, count)
+	
+_copy_fns = [
+	copy_fn
+	for copy_fn, name in (
+		(_copy_file_range, "copy_file_range"),
+		(_sendfile, "sendfile")
+	)
+	if hasattr(os, name)
+]
+
+def _copy_with(copy_fn, src_fd, dst_fd, size, progress):
+
+	copied = 0
+	while True:
+		try:
+			count = copy_fn(src_fd, dst_fd, copy_size)
+		except OSError as err:
+			if copied > 0 or err.errno not in _copy_fallback_errnos:
+				raise
+			return None
+		if count == 0:
+			return copied
+		copied = copied + count
+		if progress is not None:
+			progress(copied, size)
+			
+def _copy(src_fd, dst_fd, size, progress):
+
+	if size > 0 and _reflink(src_fd, dst_fd):
+		if progress is not None:
+			progress(size, size)
+		return size
+	for copy_fn in _copy_fns:
+		copied = _copy_with(copy_fn, src_fd, dst_fd, size, progress)
+		if copied is not None:
+			return copied
+	return None
+	
+def isabs(path):
+
+	"""
+	Checks if the given path is an absolute path.
+	
+	:param string path:
+	   The path to be checked.
+	:rtype:
+	   bool
+	:return:
+	   True if the given path is an absolute path. False otherwise.
+	"""
+	
+	return os.path.isabs(path)
+	
+def abspath(path):
+
+	"""
+	Returns the absolute version of the given path.
+	
+	:param string path:
+	   The path relative to the current working directory.
+	:rtype:
+	   string
+	"""
+	
+	return os.path.abspath(path)
+	
+def dirname(path):
+
+	"""
+	Returns the directory part of the given path.
+	
+	:param string path:
+	   The path.
+	:rtype:
+	   string
+	"""
+	
+	return os.path.dirname(path)
+	
+def join(base_path, relative_path):
+
+	"""
+	Joins the relative path to the base path.
+	
+	:param string base_path:
+	   The base path.
+	:param string relative_path:
+	   The path relative to the base path.
+	:rtype:
+	   string
+	"""
+	
+	return os.path.join(base_path, relative_path)
+	
+class ResourceHandler:
+
+	"""
+	Handler of local file resources.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Optional properties. ``buffer-size`` sets the stream buffer size and
+	   ``mmap`` makes binary read streams to be memory mapped.
+	"""
+	
+	def __init__(self, uri, props):
+	
+		self.__path = uri.path
+		if props is None:
+			props = {}
+		self.__buffer_size = props.get("buffer-size", buffer_size)
+		self.__mmap = props.get("mmap", False)
+		
+	def __open_mmap(self):
+	
+		with open(self.__path, "rb", buffering=0) as f:
+			try:
+				return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				# Empty files cannot be mapped
+				return None
+				
+	def exists(self):
+	
+		return os.path.exists(self.__path)
+		
+	def name(self):
+	
+		return os.path.basename(self.__path)
+		
+	def delete(self):
+	
+		try:
+			if os.path.isdir(self.__path):
+				os.rmdir(self.__path)
+			else:
+				os.remove(self.__path)
+			return True
+		except OSError:
+			return False
+			
+	def open(self, flags):
+	
+		try:
+			if self.__mmap and flags == "rb":
+				mapping = self.__open_mmap()
+				if mapping is not None:
+					return _MappedStream(mapping)
+			if "r" not in flags:
+				os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+			return open(self.__path, flags, buffering=self.__buffer_size)
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__path) from err
+			
+	def stat(self):
+	
+		try:
+			return _stat(os.stat(self.__path))
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__path) from err
+			
+	def list(self):
+	
+		"""
+		Returns the entries of this directory resource, enumerated with
+		:func:`os.scandir`. Symbolic links are described themselves rather
+		than their targets, so walks do not follow them.
+		
+		:rtype:
+		   iterator
+		:return:
+		   Entry name and :class:`storm.module.resource.ResourceStat` pairs.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		try:
+			with os.scandir(self.__path) as entries:
+				for entry in entries:
+					try:
+						entry_stat = entry.stat(follow_symlinks=False)
+						yield entry.name, _stat(entry_stat)
+					except FileNotFoundError:
+						pass
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__path) from err
+			
+	def stat_many(self, paths):
+	
+		"""
+		Returns the metadata of the resources at the given paths relative to
+		this directory resource, resolved against a single directory
+		descriptor when the platform supports it.
+		
+		:param list paths:
+		   Relative paths.
+		:rtype:
+		   list
+		:return:
+		   :class:`storm.module.resource.ResourceStat` values, or None for
+		   the resources which do not exist.
+		"""
+		
+		def stat_path(path, dir_fd):
+		
+			try:
+				return _stat(os.stat(path, dir_fd=dir_fd))
+			except (FileNotFoundError, NotADirectoryError):
+				return None
+				
+		if os.stat not in os.supports_dir_fd:
+			return [
+				stat_path(os.path.join(self.__path, path), None)
+				for path in paths
+			]
+		try:
+			dir_fd = os.open(self.__path, os.O_RDONLY | os.O_DIRECTORY)
+		except (FileNotFoundError, NotADirectoryError):
+			return [ None for path in paths ]
+		try:
+			return [ stat_path(path, dir_fd) for path in paths ]
+		finally:
+			os.close(dir_fd)
+			
+	def watch(self, callback):
+	
+		"""
+		Notifies the changes of this resource with the inotify facility of
+		Linux, watching its parent directory. Changes are no longer notified
+		once the parent directory is removed.
+		
+		:param callback:
+		   Callable receiving the event name, being ``created``,
+		   ``modified`` or ``deleted``.
+		:rtype:
+		   callable
+		:return:
+		   Callable cancelling the notifications, or None if inotify is not
+		   available or the parent directory does not exist.
+		"""
+		
+		inotify = _inotify()
+		if inotify is None:
+			return None
+		return inotify.add(self.__path, callback)
+		
+	def copy_to(self, target, progress=None):
+	
+		"""
+		Copy the content of this resource to the given file resource within
+		the kernel, by cloning it when the file system supports it.
+		
+		:param Resource target:
+		   Target resource.
+		:param progress:
+		   Optional callable receiving the copied and the total amount of
+		   bytes.
+		:rtype:
+		   int
+		:return:
+		   The amount of copied bytes, or None if the target is not a local
+		   file or the content could not be copied within the kernel.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if target.scheme != "file" or target.location is not None:
+			return None
+		try:
+			src = open(self.__path, "rb", buffering=0)
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__path) from err
+		with src:
+			size = os.fstat(src.fileno()).st_size
+			os.makedirs(os.path.dirname(target.path), exist_ok=True)
+			with open(target.path, "wb", buffering=0) as dst:
+				return _copy(src.fileno(), dst.fileno(), size, progress)
+				
+	def replace(self, target):
+	
+		"""
+		Moves this resource to the given file resource with
+		:func:`os.replace`, which is atomic within a file system.
+		
+		:param Resource target:
+		   Target resource.
+		:rtype:
+		   bool
+		:return:
+		   True, or None if the target is not a local file of the same file
+		   system.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if target.scheme != "file" or target.location is not None:
+			return None
+		os.makedirs(os.path.dirname(target.path), exist_ok=True)
+		try:
+			os.replace(self.__path, target.path)
+		except FileNotFoundError as err:
+			raise resource.ResourceNotFoundError(self.__path) from err
+		except OSError as err:
+			if err.errno == errno.EXDEV:
+				return None
+			raise
+		return True
@@ -0,0 +1,426 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+HTTP resource provider.
+
+Connections are kept alive and reused, pooled by location. Resources opened
+for writing are uploaded with a PUT request when their stream is closed.
+"""
+
+from storm.module import resource
+
+import email.utils
+import http.client
+import io
+import posixpath
+import threading
+
+pool_size = 8
+
+"""
+Maximum amount of idle connections kept for each location.
+"""
+
+timeout = 30.
+
+"""
+Connection timeout in seconds used when no ``timeout`` property is given.
+"""
+
+class _ConnectionPool:
+
+	def __init__(self, connection_class, host, port, timeout):
+	
+		self.__connection_class = connection_class
+		self.__host = host
+		self.__port = port
+		self.__timeout = timeout
+		self.__idle = []
+		self.__access_lock = threading.Lock()
+		
+	def acquire(self):
+	
+		try:
+			self.__access_lock.acquire()
+			if len(self.__idle) > 0:
+				return self.__idle.pop(), True
+		finally:
+			self.__access_lock.release()
+		conn = self.__connection_class(
+			self.__host,
+			self.__port,
+			timeout=self.__timeout
+		)
+		return conn, False
+		
+	def release(self, conn):
+	
+		try:
+			self.__access_lock.acquire()
+			if len(self.__idle) < pool_size:
+				self.__idle.append(conn)
+				return
+		finally:
+			self.__access_lock.release()
+		conn.close()
+		
+	def clear(self):
+	
+		try:
+			self.__access_lock.acquire()
+			idle = self.__idle
+			self.__idle = []
+		finally:
+			self.__access_lock.release()
+		for conn in idle:
+			conn.close()
+			
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(connection_class, host, port, timeout):
+
+	key = (connection_class, host, port, timeout)
+	pool = _pools.get(key)
+	if pool is not None:
+		return pool
+	try:
+		_pools_lock.acquire()
+		return _pools.setdefault(
+			key,
+			_ConnectionPool(connection_class, host, port, timeout)
+		)
+	finally:
+		_pools_lock.release()
+		
+class _ResponseStream(io.RawIOBase):
+
+	def __init__(self, pool, conn, response):
+	
+		self.__pool = pool
+		self.__conn = conn
+		self.__response = response
+		
+	def readable(self):
+	
+		return True
+		
+	def readinto(self, buf):
+	
+		return self.__response.readinto(buf)
+		
+	def close(self):
+	
+		if not self.closed:
+			if self.__response.isclosed() and not self.__response.will_close:
+				self.__pool.release(self.__conn)
+			else:
+				self.__response.close()
+				self.__conn.close()
+		super().close()
+		
+class _PutStream(io.BytesIO):
+
+	def __init__(self, handler):
+	
+		super().__init__()
+		self.__handler = handler
+		
+	def close(self):
+	
+		if not self.closed:
+			try:
+				self.__handler.put(self.getvalue())
+			finally:
+				super().close()
+				
+def isabs(path):
+
+	"""
+	Checks if the given path is an absolute path.
+	
+	:param string path:
+	   The path to be checked.
+	:rtype:
+	   bool
+	:return:
+	   True if the given path is an absolute path. False otherwise.
+	"""
+	
+	return posixpath.isabs(path)
+	
+def abspath(path):
+
+	"""
+	Returns the absolute version of the given path, relative to the root.
+	
+	:param string path:
+	   The relative path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.normpath(posixpath.join("/", path))
+	
+def dirname(path):
+
+	"""
+	Returns the directory part of the given path.
+	
+	:param string path:
+	   The path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.dirname(path)
+	
+def join(base_path, relative_path):
+
+	"""
+	Joins the relative path to the base path.
+	
+	:param string base_path:
+	   The base path.
+	:param string relative_path:
+	   The path relative to the base path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.join(base_path, relative_path)
+	
+def clear():
+
+	"""
+	Closes all idle pooled connections.
+	"""
+	
+	try:
+		_pools_lock.acquire()
+		pools = list(_pools.values())
+	finally:
+		_pools_lock.release()
+	for pool in pools:
+		pool.clear()
+		
+class ResourceHandler:
+
+	"""
+	Handler of HTTP resources.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Optional properties. ``headers`` is a dictionary of headers sent
+	   with every request and ``timeout`` sets the connection timeout.
+	"""
+	
+	connection_class = http.client.HTTPConnection
+	
+	"""
+	Class of the pooled connections.
+	"""
+	
+	def __init__(self, uri, props):
+	
+		if props is None:
+			props = {}
+		location = uri.location
+		self.__pool = _pool(
+			self.connection_class,
+			location.hostname,
+			location.port,
+			props.get("timeout", timeout)
+		)
+		self.__target = uri.path
+		if uri.query is not None:
+			self.__target = "{}?{}".format(self.__target, uri.query)
+		self.__headers = dict(props.get("headers", {}))
+		
+	def __request(self, method, headers=None, body=None):
+	
+		all_headers = dict(self.__headers)
+		if headers is not None:
+			all_headers.update(headers)
+		while True:
+			conn, reused = self.__pool.acquire()
+			try:
+				conn.request(method, self.__target, body, all_headers)
+				return conn, conn.getresponse()
+			except (http.client.HTTPException, OSError):
+				conn.close()
+				# Idle connections may have been closed by the server
+				if not reused:
+					raise
+					
+	def __discard(self, conn, response):
+	
+		response.read()
+		if response.will_close:
+			conn.close()
+		else:
+			self.__pool.release(conn)
+			
+	def __check(self, response):
+	
+		if response.status == 404:
+			raise resource.ResourceNotFoundError(self.__target)
+		if response.status >= 400:
+			msg = "HTTP {} {}".format(response.status, response.reason)
+			raise OSError(msg)
+			
+	def __stream(self, conn, response, flags):
+	
+		stream = io.BufferedReader(
+			_ResponseStream(self.__pool, conn, response),
+			resource.buffer_size
+		)
+		if "b" in flags:
+			return stream
+		charset = response.msg.get_content_charset("utf-8")
+		return io.TextIOWrapper(stream, charset)
+		
+	def __get(self, headers, allowed=()):
+	
+		conn, response = self.__request("GET", headers)
+		try:
+			if response.status not in allowed:
+				self.__check(response)
+		except:
+			self.__discard(conn, response)
+			raise
+		return conn, response
+		
+	def exists(self):
+	
+		conn, response = self.__request("HEAD")
+		self.__discard(conn, response)
+		return response.status < 400
+		
+	def name(self):
+	
+		return posixpath.basename(self.__target.split("?", 1)[0])
+		
+	def delete(self):
+	
+		conn, response = self.__request("DELETE")
+		self.__discard(conn, response)
+		return response.status < 300
+		
+	def open(self, flags):
+	
+		if "r" not in flags:
+			stream = _PutStream(self)
+			if "b" in flags:
+				return stream
+			return io.TextIOWrapper(stream, "utf-8", write_through=True)
+		conn, response = self.__get(None)
+		return self.__stream(conn, response, flags)
+		
+	def put(self, data):
+	
+		"""
+		Upload the given content to this resource.
+		
+		:param bytes data:
+		   The content.
+		:raises OSError:
+		   If the server rejects it.
+		"""
+		
+		conn, response = self.__request("PUT", None, data)
+		self.__discard(conn, response)
+		self.__check(response)
+		
+	def stat(self):
+	
+		conn, response = self.__request("HEAD")
+		self.__discard(conn, response)
+		self.__check(response)
+		size = response.getheader("Content-Length")
+		mtime = response.getheader("Last-Modified")
+		if mtime is not None:
+			mtime = email.utils.parsedate_to_datetime(mtime).timestamp()
+		return resource.ResourceStat(
+			None if size is None else int(size),
+			mtime,
+			False,
+			response.getheader("ETag")
+		)
+		
+	def open_if_changed(self, flags, version):
+	
+		"""
+		Open this resource with a conditional request, unless its entity tag
+		still matches the given version.
+		
+		:param flags:
+		   Open flags.
+		:param string version:
+		   Entity tag of the known content, or None.
+		:return:
+		   Stream, or None if content did not change, and entity tag pair.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		headers = None
+		if version is not None:
+			headers = {
+				"If-None-Match": version
+			}
+		conn, response = self.__get(headers)
+		if response.status == 304:
+			self.__discard(conn, response)
+			return None, version
+		etag = response.getheader("ETag")
+		return self.__stream(conn, response, flags), etag
+		
+	def open_range(self, offset, length=None):
+	
+		"""
+		Open a binary stream reading only the given range of this resource.
+		
+		:param int offset:
+		   Range start.
+		:param int length:
+		   Range length, or None for reading up to the end.
+		:rtype:
+		   ResourceStream
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if length is None:
+			byte_range = "bytes={}-".format(offset)
+		elif length > 0:
+			byte_range = "bytes={}-{}".format(offset, offset + length - 1)
+		else:
+			return io.BytesIO()
+		conn, response = self.__get({
+			"Range": byte_range
+		}, (416, ))
+		if response.status == 416:
+			# The range starts past the end
+			self.__discard(conn, response)
+			return io.BytesIO()
+		stream = self.__stream(conn, response, "rb")
+		if response.status == 206:
+			return stream
+		return resource.range_stream(stream, offset, length)
@@ -0,0 +1,43 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+HTTPS resource provider, as the HTTP resource provider over TLS connections.
+"""
+
+from storm.provider.resource import http as http_resource
+
+import http.client
+
+isabs = http_resource.isabs
+abspath = http_resource.abspath
+dirname = http_resource.dirname
+join = http_resource.join
+clear = http_resource.clear
+
+class ResourceHandler(http_resource.ResourceHandler):
+
+	"""
+	Handler of HTTPS resources.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Optional properties, as for HTTP resources.
+	"""
+	
+	connection_class = http.client.HTTPSConnection
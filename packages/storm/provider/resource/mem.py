@@ -0,0 +1,456 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+In-memory resource provider.
+
+Resources are kept in a tree shared by the whole process, where each
+location is an independent root. Stored contents are never modified in place,
+so views returned by :meth:`ResourceHandler.view` remain valid snapshots.
+"""
+
+from storm.module import resource
+
+import io
+import itertools
+import posixpath
+import threading
+import time
+
+class _Tree:
+
+	def __init__(self):
+	
+		self.__files = {}
+		self.__stats = {}
+		self.__dirs = {}
+		self.__versions = itertools.count()
+		self.__access_lock = threading.Lock()
+		
+	def __link(self, key):
+	
+		location, path = key
+		while path != "/":
+			parent = posixpath.dirname(path)
+			names = self.__dirs.setdefault((location, parent), set())
+			if posixpath.basename(path) in names:
+				return
+			names.add(posixpath.basename(path))
+			path = parent
+			
+	def __unlink(self, key):
+	
+		location, path = key
+		while path != "/":
+			parent = posixpath.dirname(path)
+			names = self.__dirs[(location, parent)]
+			names.discard(posixpath.basename(path))
+			if len(names) > 0:
+				return
+			del self.__dirs[(location, parent)]
+			path = parent
+			
+	def get(self, key):
+	
+		return self.__files.get(key)
+		
+	def isdir(self, key):
+	
+		return key in self.__dirs
+		
+	def __stat(self, key):
+	
+		data = self.__files.get(key)
+		if data is not None:
+			mtime, version = self.__stats[key]
+			return resource.ResourceStat(len(data), mtime, False, version)
+		if key in self.__dirs:
+			return resource.ResourceStat(0, None, True)
+		return None
+		
+	def stat(self, key):
+	
+		try:
+			self.__access_lock.acquire()
+			return self.__stat(key)
+		finally:
+			self.__access_lock.release()
+			
+	def stat_many(self, keys):
+	
+		try:
+			self.__access_lock.acquire()
+			return [ self.__stat(key) for key in keys ]
+		finally:
+			self.__access_lock.release()
+			
+	def entries(self, key):
+	
+		try:
+			self.__access_lock.acquire()
+			location, path = key
+			return [
+				(name, self.__stat((location, posixpath.join(path, name))))
+				for name in self.__dirs.get(key, ())
+			]
+		finally:
+			self.__access_lock.release()
+			
+	def put(self, key, data):
+	
+		try:
+			self.__access_lock.acquire()
+			if key in self.__dirs:
+				raise IsADirectoryError(key[1])
+			if key not in self.__files:
+				self.__link(key)
+			self.__files[key] = data
+			self.__stats[key] = (time.time(), next(self.__versions))
+		finally:
+			self.__access_lock.release()
+			
+	def move(self, key, target_key):
+	
+		try:
+			self.__access_lock.acquire()
+			data = self.__files.get(key)
+			if data is None:
+				raise resource.ResourceNotFoundError(key[1])
+			if target_key in self.__dirs:
+				raise IsADirectoryError(target_key[1])
+			if target_key == key:
+				return
+			if target_key not in self.__files:
+				self.__link(target_key)
+			self.__files[target_key] = data
+			self.__stats[target_key] = (time.time(), next(self.__versions))
+			del self.__files[key]
+			del self.__stats[key]
+			self.__unlink(key)
+		finally:
+			self.__access_lock.release()
+			
+	def remove(self, key):
+	
+		try:
+			self.__access_lock.acquire()
+			if self.__files.pop(key, None) is None:
+				return False
+			del self.__stats[key]
+			self.__unlink(key)
+			return True
+		finally:
+			self.__access_lock.release()
+			
+	def clear(self, location):
+	
+		try:
+			self.__access_lock.acquire()
+			if location is None:
+				self.__files.clear()
+				self.__stats.clear()
+				self.__dirs.clear()
+			else:
+				for key in [key for key in self.__files if key[0] == location]:
+					del self.__files[key]
+					del self.__stats[key]
+				for key in [key for key in self.__dirs if key[0] == location]:
+					del self.__dirs[key]
+		finally:
+			self.__access_lock.release()
+			
+class _BytesStream(io.BytesIO):
+
+	def __init__(self, key, initial):
+	
+		super().__init__(initial)
+		self.__key = key
+		
+	def flush(self):
+	
+		super().flush()
+		with self.getbuffer() as data:
+			_tree.put(self.__key, bytearray(data))
+			
+	def close(self):
+	
+		if not self.closed:
+			self.flush()
+		super().close()
+		
+class _StrStream(io.StringIO):
+
+	def __init__(self, key, initial):
+	
+		super().__init__(initial, newline="")
+		self.__key = key
+		
+	def flush(self):
+	
+		super().flush()
+		_tree.put(self.__key, bytearray(self.getvalue().encode("utf-8")))
+		
+	def close(self):
+	
+		if not self.closed:
+			self.flush()
+		super().close()
+		
+_tree = _Tree()
+
+def isabs(path):
+
+	"""
+	Checks if the given path is an absolute path.
+	
+	:param string path:
+	   The path to be checked.
+	:rtype:
+	   bool
+	:return:
+	   True if the given path is an absolute path. False otherwise.
+	"""
+	
+	return posixpath.isabs(path)
+	
+def abspath(path):
+
+	"""
+	Returns the absolute version of the given path, relative to the root.
+	
+	:param string path:
+	   The relative path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.normpath(posixpath.join("/", path))
+	
+def dirname(path):
+
+	"""
+	Returns the directory part of the given path.
+	
+	:param string path:
+	   The path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.dirname(path)
+	
+def join(base_path, relative_path):
+
+	"""
+	Joins the relative path to the base path.
+	
+	:param string base_path:
+	   The base path.
+	:param string relative_path:
+	   The path relative to the base path.
+	:rtype:
+	   string
+	"""
+	
+	return posixpath.join(base_path, relative_path)
+	
+def clear(location=None):
+
+	"""
+	Removes all resources of the given location, or of every location.
+	
+	:param string location:
+	   Location to be cleared. None for clearing all of them.
+	"""
+	
+	_tree.clear(location)
+	
+class ResourceHandler:
+
+	"""
+	Handler of in-memory resources.
+	
+	Streams opened for reading are :class:`io.BytesIO` or :class:`io.StringIO`
+	instances. Streams opened for writing publish their content when flushed or
+	closed. Text is encoded as UTF-8.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Ignored properties.
+	"""
+	
+	def __init__(self, uri, props):
+	
+		location = uri.location
+		self.__key = (
+			"" if location is None else str(location),
+			posixpath.normpath(uri.path)
+		)
+		
+	def __data(self):
+	
+		data = _tree.get(self.__key)
+		if data is None:
+			raise resource.ResourceNotFoundError(self.__key[1])
+		return data
+		
+	def exists(self):
+	
+		return _tree.get(self.__key) is not None or _tree.isdir(self.__key)
+		
+	def name(self):
+	
+		return posixpath.basename(self.__key[1])
+		
+	def delete(self):
+	
+		return _tree.remove(self.__key)
+		
+	def open(self, flags):
+	
+		if "r" in flags:
+			data = self.__data()
+		elif "a" in flags:
+			data = _tree.get(self.__key) or b""
+		elif "x" in flags and _tree.get(self.__key) is not None:
+			raise FileExistsError(self.__key[1])
+		else:
+			data = b""
+			
+		if "b" in flags:
+			if "r" in flags and "+" not in flags:
+				return io.BytesIO(data)
+			stream = _BytesStream(self.__key, data)
+		else:
+			text = bytes(data).decode("utf-8")
+			if "r" in flags and "+" not in flags:
+				return io.StringIO(text, newline="")
+			stream = _StrStream(self.__key, text)
+			
+		if "a" in flags:
+			stream.seek(0, io.SEEK_END)
+		else:
+			stream.flush()
+		return stream
+		
+	def stat(self):
+	
+		stat = _tree.stat(self.__key)
+		if stat is None:
+			raise resource.ResourceNotFoundError(self.__key[1])
+		return stat
+		
+	def copy_to(self, target, progress=None):
+	
+		"""
+		Copy the content of this resource to the given in-memory resource by
+		sharing it.
+		
+		:param Resource target:
+		   Target resource.
+		:param progress:
+		   Optional callable receiving the copied and the total amount of
+		   bytes.
+		:rtype:
+		   int
+		:return:
+		   The amount of copied bytes, or None if the target is not an
+		   in-memory resource.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if target.scheme != "mem":
+			return None
+		data = self.__data()
+		_tree.put(ResourceHandler(target, None).__key, data)
+		if progress is not None:
+			progress(len(data), len(data))
+		return len(data)
+		
+	def replace(self, target):
+	
+		"""
+		Moves the content of this resource to the given in-memory resource
+		at once.
+		
+		:param Resource target:
+		   Target resource.
+		:rtype:
+		   bool
+		:return:
+		   True, or None if the target is not an in-memory resource.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if target.scheme != "mem":
+			return None
+		_tree.move(self.__key, ResourceHandler(target, None).__key)
+		return True
+		
+	def view(self):
+	
+		"""
+		Returns a read only view of the current content, without copying it.
+		
+		:rtype:
+		   memoryview
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		return memoryview(self.__data()).toreadonly()
+		
+	def list(self):
+	
+		"""
+		Returns the entries of this directory resource.
+		
+		:rtype:
+		   iterator
+		:return:
+		   Entry name and :class:`storm.module.resource.ResourceStat` pairs.
+		:raises storm.module.resource.ResourceNotFoundError:
+		   If this resource does not exist.
+		"""
+		
+		if not _tree.isdir(self.__key):
+			raise resource.ResourceNotFoundError(self.__key[1])
+		yield from _tree.entries(self.__key)
+		
+	def stat_many(self, paths):
+	
+		"""
+		Returns the metadata of the resources at the given paths relative to
+		this resource, all of them read at once.
+		
+		:param list paths:
+		   Relative paths.
+		:rtype:
+		   list
+		:return:
+		   :class:`storm.module.resource.ResourceStat` values, or None for
+		   the resources which do not exist.
+		"""
+		
+		location, base_path = self.__key
+		return _tree.stat_many([
+			(location, posixpath.normpath(posixpath.join(base_path, path)))
+			for path in paths
+		])
@@ -0,0 +1,85 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+TAR archive resource provider.
+
+Resources are members of local TAR archives, optionally compressed, addressed
+like ``tar:///path/to/archive.tar.gz!/path/to/member``. The member indexes of
+the most recently used archives are kept until the archives are modified.
+Members of uncompressed archives are read straight from the archive file and
+can be viewed without copying them.
+"""
+
+from storm.module import resource
+from storm.provider.resource import _archive
+
+import bz2
+import gzip
+import lzma
+import tarfile
+
+isabs = _archive.isabs
+abspath = _archive.abspath
+dirname = _archive.dirname
+join = _archive.join
+
+_decompressors = (
+	gzip.GzipFile,
+	bz2.BZ2File,
+	lzma.LZMAFile
+)
+
+class ResourceHandler(_archive.ArchiveHandler):
+
+	"""
+	Handler of TAR archive member resources. Members are read only.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Ignored properties.
+	"""
+	
+	def _build(self, archive_path, version):
+	
+		with tarfile.open(archive_path) as tf:
+			decompressor = None
+			if isinstance(tf.fileobj, _decompressors):
+				decompressor = type(tf.fileobj)
+			members = []
+			for info in tf:
+				if not info.isfile() and not info.isdir():
+					continue
+				members.append(_archive.Member(
+					_archive.member_path(info.name),
+					info.size,
+					info.mtime,
+					info.isdir(),
+					info.offset_data if decompressor is None else None,
+					info
+				))
+		return _archive.Index(archive_path, version, members, decompressor)
+		
+	def _open(self, idx, member):
+	
+		stream = idx.handle(idx.archive_path, "rb")
+		return resource.range_stream(
+			stream,
+			member.info.offset_data,
+			member.size
+		)
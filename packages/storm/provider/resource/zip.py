@@ -0,0 +1,78 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+ZIP archive resource provider.
+
+Resources are members of local ZIP archives, addressed like
+``zip:///path/to/archive.zip!/path/to/member``. The member indexes of the
+most recently used archives are kept until the archives are modified. Stored
+members are read straight from the archive file and can be viewed without
+copying them.
+"""
+
+from storm.provider.resource import _archive
+
+import struct
+import time
+import zipfile
+
+isabs = _archive.isabs
+abspath = _archive.abspath
+dirname = _archive.dirname
+join = _archive.join
+
+class ResourceHandler(_archive.ArchiveHandler):
+
+	"""
+	Handler of ZIP archive member resources. Members are read only.
+	
+	:param uri:
+	   Resource URI.
+	:param props:
+	   Ignored properties.
+	"""
+	
+	def _build(self, archive_path, version):
+	
+		zf = zipfile.ZipFile(archive_path)
+		members = []
+		for info in zf.infolist():
+			members.append(_archive.Member(
+				_archive.member_path(info.filename),
+				info.file_size,
+				time.mktime(info.date_time + (0, 0, -1)),
+				info.is_dir(),
+				None,
+				info
+			))
+		return _archive.Index(archive_path, version, members, zf, zf.close)
+		
+	def _offset(self, idx, member):
+	
+		info = member.info
+		if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+			return None
+		with open(idx.archive_path, "rb") as f:
+			f.seek(info.header_offset)
+			header = f.read(30)
+		name_len, extra_len = struct.unpack("<HH", header[26:30])
+		return info.header_offset + 30 + name_len + extra_len
+		
+	def _open(self, idx, member):
+	
+		return idx.handle.open(member.info)
@@ -0,0 +1,237 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import dispatcher
+from storm.module import resource
+
+import threading
+import unittest
+
+def progress(work_id, value):
+
+	return "work", {
+		"id": work_id,
+		"cause": "progress",
+		"value": {
+			"description": None,
+			"value": value
+		}
+	}
+	
+class EventQueue:
+
+	def __init__(self):
+	
+		self.events = []
+		self.entered = threading.Event()
+		self.release = threading.Event()
+		self.release.set()
+		
+	def dispatch(self, task, name, value):
+	
+		self.entered.set()
+		self.release.wait(5)
+		self.events.append((task, name, value))
+		
+class BatchEventQueue:
+
+	def __init__(self):
+	
+		self.batches = []
+		
+	def dispatch_batch(self, events):
+	
+		self.batches.append(events)
+		
+class TestEventDispatcher(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.queue = EventQueue()
+		
+	def tearDown(self):
+	
+		self.queue.release.set()
+		
+	def hold(self, disp):
+	
+		self.queue.release.clear()
+		disp.dispatch("task", "started", None)
+		self.queue.entered.wait(5)
+		
+	def test_order(self):
+	
+		disp = dispatcher.EventDispatcher(self.queue, 4)
+		for i in range(8):
+			disp.dispatch("task", "message", i)
+		disp.close()
+		self.assertEqual(
+			[ value for task, name, value in self.queue.events ],
+			list(range(8))
+		)
+		self.assertEqual(disp.dispatched, 8)
+		
+	def test_batch(self):
+	
+		queue = BatchEventQueue()
+		disp = dispatcher.EventDispatcher(queue, batch_size=2)
+		for i in range(5):
+			disp.dispatch("task", "message", i)
+		disp.close()
+		for batch in queue.batches:
+			self.assertLessEqual(len(batch), 2)
+		self.assertEqual(
+			[ value for batch in queue.batches for task, name, value in batch ],
+			list(range(5))
+		)
+		
+	def test_block(self):
+	
+		disp = dispatcher.EventDispatcher(self.queue, 2)
+		self.hold(disp)
+		disp.dispatch("task", *progress(0, 1.))
+		disp.dispatch("task", *progress(0, 2.))
+		blocked = threading.Thread(
+			target=disp.dispatch,
+			args=("task", "finished", None)
+		)
+		blocked.start()
+		blocked.join(0.1)
+		self.assertTrue(blocked.is_alive())
+		self.queue.release.set()
+		blocked.join(5)
+		disp.close()
+		self.assertEqual(len(self.queue.events), 4)
+		self.assertEqual(disp.dropped, 0)
+		
+	def test_drop_progress(self):
+	
+		disp = dispatcher.EventDispatcher(
+			self.queue,
+			2,
+			dispatcher.DROP_PROGRESS
+		)
+		self.hold(disp)
+		disp.dispatch("task", "message", "text")
+		disp.dispatch("task", *progress(0, 1.))
+		disp.dispatch("task", *progress(0, 2.))
+		self.queue.release.set()
+		disp.close()
+		self.assertEqual(self.queue.events, [
+			("task", "started", None),
+			("task", "message", "text"),
+			("task", ) + progress(0, 2.)
+		])
+		self.assertEqual(disp.dropped, 1)
+		
+	def test_coalesce(self):
+	
+		disp = dispatcher.EventDispatcher(self.queue, 8, dispatcher.COALESCE)
+		self.hold(disp)
+		for i in range(5):
+			disp.dispatch("task", *progress(0, float(i)))
+			disp.dispatch("task", *progress(1, float(i)))
+		disp.dispatch("other", *progress(0, 0.))
+		self.queue.release.set()
+		disp.close()
+		self.assertEqual(self.queue.events, [
+			("task", "started", None),
+			("task", ) + progress(0, 4.),
+			("task", ) + progress(1, 4.),
+			("other", ) + progress(0, 0.)
+		])
+		self.assertEqual(disp.coalesced, 8)
+		self.assertEqual(disp.dispatched, 4)
+		
+	def test_flush(self):
+	
+		disp = dispatcher.EventDispatcher(self.queue)
+		self.hold(disp)
+		self.assertFalse(disp.flush(0.01))
+		self.queue.release.set()
+		self.assertTrue(disp.flush(5))
+		disp.close()
+		with self.assertRaises(RuntimeError):
+			disp.dispatch("task", "finished", None)
+			
+	def test_failed(self):
+	
+		class FailingEventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				raise ValueError(value)
+				
+		disp = dispatcher.EventDispatcher(FailingEventQueue())
+		disp.dispatch("task", "message", "text")
+		disp.close()
+		self.assertEqual(disp.failed, 1)
+		
+	def test_failed_base(self):
+	
+		class Interrupted(BaseException):
+		
+			pass
+			
+		class FailingEventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				if value == "missing":
+					raise resource.ResourceNotFoundError(value)
+				if value == "interrupted":
+					raise Interrupted(value)
+				self.value = value
+				
+		queue = FailingEventQueue()
+		disp = dispatcher.EventDispatcher(queue, 1)
+		disp.dispatch("task", "message", "missing")
+		disp.dispatch("task", "message", "interrupted")
+		disp.dispatch("task", "message", "text")
+		disp.close()
+		self.assertEqual(disp.failed, 2)
+		self.assertEqual(queue.value, "text")
+		
+	def test_close_blocked(self):
+	
+		disp = dispatcher.EventDispatcher(self.queue, 1)
+		self.hold(disp)
+		disp.dispatch("task", "message", "text")
+		errors = []
+		
+		def dispatch():
+		
+			try:
+				disp.dispatch("task", "finished", None)
+			except RuntimeError as e:
+				errors.append(e)
+				
+		blocked = threading.Thread(target=dispatch)
+		blocked.start()
+		blocked.join(0.1)
+		self.assertTrue(blocked.is_alive())
+		closing = threading.Thread(target=disp.close)
+		closing.start()
+		closing.join(0.1)
+		self.queue.release.set()
+		closing.join(5)
+		blocked.join(5)
+		self.assertEqual(len(errors), 1)
+		self.assertEqual(
+			[ name for task, name, value in self.queue.events ],
+			[ "started", "message" ]
+		)
@@ -0,0 +1,537 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import AsyncEngine
+from storm.engine import Engine
+from storm.engine import layout
+from storm.module import resource
+from storm.provider.resource import mem
+
+import asyncio
+import queue
+import sys
+import threading
+import time
+import types
+import unittest
+
+class FakePlatform:
+
+	started = threading.Event()
+	release = threading.Event()
+	action = None
+	created = 0
+	states = 0
+	
+	def __init__(self, base_res, props):
+	
+		self.base_res = base_res
+		FakePlatform.created = FakePlatform.created + 1
+		
+	def destroy(self, work):
+	
+		if FakePlatform.action is not None:
+			FakePlatform.action(work)
+		FakePlatform.started.set()
+		FakePlatform.release.wait(5)
+		
+	def state(self, work):
+	
+		FakePlatform.states = FakePlatform.states + 1
+		return {
+			"calls": FakePlatform.states
+		}
+		
+fake_provider = types.ModuleType("storm.provider.platform.fake")
+fake_provider.Platform = FakePlatform
+
+class TestEngine(unittest.TestCase):
+
+	def setUp(self):
+	
+		sys.modules[fake_provider.__name__] = fake_provider
+		FakePlatform.started.clear()
+		FakePlatform.release.clear()
+		FakePlatform.action = None
+		FakePlatform.created = 0
+		FakePlatform.states = 0
+		self.state_res = resource.ref("mem:///engine/state.json")
+		self.events = []
+		
+	def tearDown(self):
+	
+		FakePlatform.release.set()
+		del sys.modules[fake_provider.__name__]
+		mem.clear()
+		
+	def dispatch(self, task, name, value):
+	
+		self.events.append((name, value))
+		
+	def destroy(self, action, **kwargs):
+	
+		engine = Engine(self.state_res, self, **kwargs)
+		engine.register("local", "fake").result(5)
+		FakePlatform.action = action
+		FakePlatform.release.set()
+		task = engine.dismiss("local", True)
+		task.result(5)
+		return task
+		
+	def progress_events(self):
+	
+		return [
+			(value["id"], value["value"])
+			for name, value in self.events
+			if name == "work" and value["cause"] == "progress"
+		]
+		
+	def progress_values(self, **kwargs):
+	
+		def action(work):
+		
+			for i in range(100):
+				work.progress(1.)
+				
+		self.destroy(action, **kwargs)
+		return [ value["value"] for work_id, value in self.progress_events() ]
+		
+	def test_progress_tree(self):
+	
+		def action(work):
+		
+			child = work.work_start("child", 0.5)
+			grandchild = child.work_start("grandchild", 0.1)
+			grandchild.progress(10., "step")
+			grandchild.finished()
+			child.progress(2.)
+			child.finished()
+			
+		task = self.destroy(action)
+		self.assertEqual(self.progress_events(), [
+			(2, {
+				"description": "step",
+				"value": 10.,
+				"ancestors": [
+					{
+						"id": 1,
+						"value": 1.
+					},
+					{
+						"id": 0,
+						"value": 0.5
+					}
+				]
+			}),
+			(1, {
+				"description": None,
+				"value": 3.,
+				"ancestors": [
+					{
+						"id": 0,
+						"value": 1.5
+					}
+				]
+			}),
+			(0, {
+				"description": None,
+				"value": 1.5,
+				"ancestors": []
+			})
+		])
+		snapshot = task.snapshot()
+		self.assertEqual(snapshot[0]["value"], 1.5)
+		self.assertTrue(snapshot[0]["finished"])
+		self.assertEqual(snapshot[2], {
+			"description": "grandchild",
+			"parent-id": 1,
+			"cost": 0.1,
+			"value": 10.,
+			"finished": True
+		})
+		
+	def test_progress(self):
+	
+		values = self.progress_values()
+		self.assertEqual(values, [ float(i) for i in range(1, 101) ])
+		
+	def test_progress_interval(self):
+	
+		values = self.progress_values(progress_interval=60.)
+		self.assertEqual(values, [ 1., 100. ])
+		
+	def test_progress_delta(self):
+	
+		values = self.progress_values(progress_delta=10.)
+		self.assertEqual(values, [ float(i) for i in range(1, 101, 10) ] + [
+			100.
+		])
+		
+	def test_lazy(self):
+	
+		engine = Engine(self.state_res)
+		for name in ("a", "b", "c"):
+			engine.register(name, "fake", {}).result(5)
+		engine.register("d", "unknown", {}).result(5)
+		engine.store()
+		engine = Engine(self.state_res, self)
+		self.assertEqual(engine.platforms().result(5), 4)
+		self.assertEqual(FakePlatform.created, 0)
+		self.assertIn(("platform-entry", {
+			"name": "a",
+			"available": True,
+			"provider": "fake"
+		}), self.events)
+		self.assertIn(("platform-entry", {
+			"name": "d",
+			"available": False,
+			"provider": "unknown"
+		}), self.events)
+		FakePlatform.release.set()
+		engine.dismiss("a", True).result(5)
+		self.assertEqual(engine.preload([ "b", "d" ]).result(5), 1)
+		self.assertEqual(engine.preload().result(5), 2)
+		self.assertEqual(FakePlatform.created, 3)
+		with self.assertRaises(Exception):
+			engine.preload([ "missing" ]).result(5)
+			
+	def test_register_while_listing(self):
+	
+		listing = threading.Event()
+		
+		class EventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				if name == "platform-entry":
+					listing.set()
+					FakePlatform.release.wait(5)
+					
+		engine = Engine(self.state_res, EventQueue())
+		engine.register("a", "fake").result(5)
+		platforms = engine.platforms()
+		listing.wait(5)
+		engine.register("b", "fake").result(1)
+		engine.dismiss("a").result(1)
+		FakePlatform.release.set()
+		self.assertEqual(platforms.result(5), 1)
+		self.assertEqual(engine.platforms().result(5), 1)
+		
+	def test_platform_limit(self):
+	
+		engine = Engine(self.state_res, max_workers=4, platform_limit=1)
+		for name in ("slow", "other"):
+			engine.register(name, "fake").result(5)
+		destroy = engine.dismiss("slow", True)
+		FakePlatform.started.wait(5)
+		blocked = engine.watch("slow")
+		self.assertEqual(engine.watch("other").result(5)["state"], {
+			"calls": 1
+		})
+		self.assertEqual(engine.platforms().result(5), 2)
+		self.assertEqual(engine.stats()["tasks"]["keys"]["slow"], {
+			"queued": 1,
+			"running": 1
+		})
+		FakePlatform.release.set()
+		destroy.result(5)
+		with self.assertRaises(Exception):
+			blocked.result(5)
+			
+	def test_interactive_lane(self):
+	
+		engine = Engine(self.state_res, max_workers=2)
+		for name in ("a", "b", "c"):
+			engine.register(name, "fake").result(5)
+		destroys = [ engine.dismiss(name, True) for name in ("a", "b") ]
+		FakePlatform.started.wait(5)
+		self.assertEqual(engine.watch("c").result(5)["state"], {
+			"calls": 1
+		})
+		self.assertEqual(engine.stats()["tasks"]["lanes"]["bulk"], {
+			"queued": 1,
+			"running": 1
+		})
+		FakePlatform.release.set()
+		for destroy in destroys:
+			destroy.result(5)
+			
+	def test_single_worker(self):
+	
+		engine = Engine(self.state_res, max_workers=1)
+		engine.register("local", "fake").result(5)
+		self.assertEqual(engine.platforms().result(5), 1)
+		with self.assertRaises(ValueError):
+			Engine(self.state_res, max_workers=0)
+			
+	def single_flight(self, shared):
+	
+		listing = threading.Event()
+		events = []
+		
+		class EventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				events.append((task, name))
+				if name == "platform-entry" and not listing.is_set():
+					listing.set()
+					FakePlatform.release.wait(5)
+					
+		engine = Engine(self.state_res, EventQueue(), single_flight=shared)
+		engine.register("local", "fake").result(5)
+		first = engine.platforms()
+		listing.wait(5)
+		second = engine.platforms()
+		FakePlatform.release.set()
+		self.assertEqual(first.result(5), 1)
+		self.assertEqual(second.result(5), 1)
+		for task in (first, second):
+			names = [ name for source, name in events if source is task ]
+			self.assertEqual(names, [
+				"started",
+				"platform-entry",
+				"finished"
+			])
+		return engine
+		
+	def test_single_flight(self):
+	
+		engine = self.single_flight(True)
+		self.assertEqual(engine.stats()["deduplicated"], 1)
+		engine.platforms().result(5)
+		self.assertEqual(engine.stats()["deduplicated"], 1)
+		
+	def test_single_flight_disabled(self):
+	
+		engine = self.single_flight(False)
+		self.assertEqual(engine.stats()["deduplicated"], 0)
+		
+	def test_single_flight_cancel(self):
+	
+		class EventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				if name == "platform-entry":
+					if not FakePlatform.started.is_set():
+						FakePlatform.started.set()
+						FakePlatform.release.wait(5)
+						
+		engine = Engine(self.state_res, EventQueue(), single_flight=True)
+		for name in ("a", "b"):
+			engine.register(name, "fake").result(5)
+		first = engine.platforms()
+		FakePlatform.started.wait(5)
+		second = engine.platforms()
+		self.assertFalse(first.cancel())
+		self.assertFalse(first.cancel())
+		FakePlatform.release.set()
+		self.assertEqual(second.result(5), 2)
+		
+	def test_watch_cache(self):
+	
+		engine = Engine(self.state_res, watch_ttl=60.)
+		engine.register("local", "fake").result(5)
+		first = engine.watch("local").result(5)
+		self.assertEqual(first["state"], { "calls": 1 })
+		self.assertFalse(first["cached"])
+		second = engine.watch("local").result(5)
+		self.assertEqual(second["state"], { "calls": 1 })
+		self.assertTrue(second["cached"])
+		self.assertFalse(second["stale"])
+		self.assertGreaterEqual(second["age"], 0.)
+		engine.offer("local", None).result(5)
+		self.assertEqual(engine.watch("local").result(5)["state"], {
+			"calls": 2
+		})
+		emerged = layout.Layout()
+		emerged.executions.append(
+			layout.ContainerExecution(None, "local", None)
+		)
+		engine.emerge(emerged).result(5)
+		self.assertFalse(engine.watch("local").result(5)["cached"])
+		engine.invalidate()
+		self.assertFalse(engine.watch("local").result(5)["cached"])
+		self.assertEqual(FakePlatform.states, 4)
+		engine.dismiss("local").result(5)
+		with self.assertRaises(Exception):
+			engine.watch("local").result(5)
+			
+	def test_watch_stale(self):
+	
+		engine = Engine(self.state_res, self, watch_stale=60.)
+		engine.register("local", "fake").result(5)
+		self.assertFalse(engine.watch("local").result(5)["cached"])
+		stale = engine.watch("local").result(5)
+		self.assertTrue(stale["cached"])
+		self.assertTrue(stale["stale"])
+		self.assertEqual(stale["state"], { "calls": 1 })
+		watches = 2
+		deadline = time.monotonic() + 5.
+		while time.monotonic() < deadline:
+			state = engine.watch("local").result(5)["state"]
+			watches = watches + 1
+			if state["calls"] > 1:
+				break
+			time.sleep(0.01)
+		self.assertGreater(state["calls"], 1)
+		started = [ event for event in self.events if event[0] == "started" ]
+		self.assertEqual(len(started), watches + 1)
+		
+	def test_subscribe(self):
+	
+		engine = Engine(self.state_res, self)
+		engine.register("local", "fake").result(5)
+		first = queue.Queue()
+		second = queue.Queue()
+		with engine.subscribe("local", lambda *event: first.put(event), 0.01):
+			self.assertEqual(first.get(timeout=5), ("snapshot", {
+				"calls": 1
+			}))
+			self.assertEqual(first.get(timeout=5), ("diff", [
+				{
+					"op": "set",
+					"path": [ "calls" ],
+					"value": 2
+				}
+			]))
+			sub = engine.subscribe("local", lambda *event: second.put(event))
+			event, value = second.get(timeout=5)
+			self.assertEqual(event, "snapshot")
+			self.assertGreaterEqual(value["calls"], 2)
+			engine.dismiss("local").result(5)
+			self.assertEqual(second.get(timeout=5), ("closed", None))
+			started = [ event for event in self.events if event[0] == "started" ]
+			self.assertEqual(len(started), 2)
+			self.assertFalse(sub.cancelled)
+		with self.assertRaises(Exception):
+			engine.subscribe("local", lambda *event: None)
+			
+	def test_shutdown(self):
+	
+		engine = Engine(self.state_res)
+		engine.register("local", "fake").result(5)
+		FakePlatform.release.set()
+		destroy = engine.dismiss("local", True)
+		engine.shutdown()
+		self.assertIsNone(destroy.result(0))
+		with self.assertRaises(RuntimeError):
+			engine.platforms()
+			
+	def test_store_delay(self):
+	
+		engine = Engine(self.state_res, store_delay=0.01)
+		engine.register("local", "fake", {}).result(5)
+		deadline = time.monotonic() + 5.
+		while not self.state_res.exists() and time.monotonic() < deadline:
+			time.sleep(0.01)
+		self.assertFalse(engine.store())
+		self.assertEqual(Engine(self.state_res).platforms().result(5), 1)
+		
+	def test_shutdown_store(self):
+	
+		engine = Engine(self.state_res, store_delay=60.)
+		engine.register("local", "fake", {})
+		engine.shutdown()
+		self.assertTrue(self.state_res.exists())
+		self.assertEqual(Engine(self.state_res).platforms().result(5), 1)
+		
+class TestAsyncEngine(unittest.IsolatedAsyncioTestCase):
+
+	def setUp(self):
+	
+		sys.modules[fake_provider.__name__] = fake_provider
+		FakePlatform.started.clear()
+		FakePlatform.release.clear()
+		self.state_res = resource.ref("mem:///engine/state.json")
+		
+	def tearDown(self):
+	
+		FakePlatform.release.set()
+		del sys.modules[fake_provider.__name__]
+		mem.clear()
+		
+	async def test_events(self):
+	
+		engine = AsyncEngine(self.state_res)
+		await engine.register("local", "fake")
+		task = engine.platforms()
+		events = [ event async for event in task.events() ]
+		self.assertEqual(await task, 1)
+		self.assertEqual(events, [
+			("started", None),
+			("platform-entry", {
+				"name": "local",
+				"available": True,
+				"provider": "fake"
+			}),
+			("finished", None)
+		])
+		
+	async def test_exception(self):
+	
+		engine = AsyncEngine(self.state_res)
+		with self.assertRaises(Exception):
+			await engine.watch("missing")
+			
+	async def test_cancel(self):
+	
+		engine = AsyncEngine(self.state_res, max_workers=2)
+		for name in ("a", "b"):
+			await engine.register(name, "fake")
+		destroy = engine.dismiss("a", True)
+		queued = engine.dismiss("b", True)
+		with self.assertRaises(asyncio.TimeoutError):
+			await asyncio.wait_for(queued, 0.1)
+		self.assertTrue(queued.done())
+		FakePlatform.release.set()
+		await destroy
+		self.assertEqual(await engine.platforms(), 1)
+		
+	async def test_store(self):
+	
+		engine = AsyncEngine(self.state_res)
+		await engine.register("local", "fake", {})
+		self.assertTrue(await engine.store())
+		self.assertFalse(await engine.store())
+		
+	async def test_single_flight_cancel(self):
+	
+		class EventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				if name == "platform-entry":
+					if not FakePlatform.started.is_set():
+						FakePlatform.started.set()
+						FakePlatform.release.wait(5)
+						
+		engine = AsyncEngine(self.state_res, EventQueue(), single_flight=True)
+		for name in ("a", "b"):
+			await engine.register(name, "fake")
+		first = engine.platforms()
+		await asyncio.get_running_loop().run_in_executor(
+			None,
+			FakePlatform.started.wait,
+			5
+		)
+		second = engine.platforms()
+		self.assertTrue(first.cancel())
+		await asyncio.sleep(0)
+		FakePlatform.release.set()
+		self.assertEqual(await second, 2)
@@ -0,0 +1,156 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import persister
+from storm.module import jsons
+from storm.module import resource
+from storm.provider.resource import mem
+
+import gc
+import threading
+import time
+import unittest
+
+class TestStatePersister(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.state_res = resource.ref("mem:///engine/state.json")
+		self.state = {
+			"platforms": {}
+		}
+		self.builds = 0
+		
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def build(self):
+	
+		self.builds = self.builds + 1
+		return self.state
+		
+	def read(self):
+	
+		with self.state_res.open("r") as state_file:
+			return jsons.read(state_file).value()
+			
+	def test_store(self):
+	
+		state_persister = persister.StatePersister(self.state_res, self.build)
+		self.assertTrue(state_persister.store())
+		self.assertEqual(self.read(), self.state)
+		self.assertFalse(state_persister.store())
+		self.state["platforms"]["local"] = {
+			"provider": "fake"
+		}
+		self.assertTrue(state_persister.store())
+		self.assertEqual(self.read(), self.state)
+		self.assertEqual(state_persister.writes, 2)
+		self.assertEqual(state_persister.skipped, 1)
+		names = [ res.name() for res, stat in self.state_res.parent().list() ]
+		self.assertEqual(names, [ "state.json" ])
+		
+	def test_store_unchanged(self):
+	
+		persister.StatePersister(self.state_res, self.build).store()
+		stat = self.state_res.stat()
+		state_persister = persister.StatePersister(self.state_res, self.build)
+		self.assertFalse(state_persister.store())
+		self.assertEqual(self.state_res.stat().version, stat.version)
+		
+	def test_mark(self):
+	
+		state_persister = persister.StatePersister(
+			self.state_res,
+			self.build,
+			0.2
+		)
+		for i in range(5):
+			self.state["platforms"]["platform-{}".format(i)] = {
+				"provider": "fake"
+			}
+			state_persister.mark()
+		self.assertFalse(self.state_res.exists())
+		deadline = time.monotonic() + 5.
+		while state_persister.dirty and time.monotonic() < deadline:
+			time.sleep(0.01)
+		state_persister.close()
+		self.assertEqual(self.read(), self.state)
+		self.assertEqual(state_persister.writes, 1)
+		self.assertEqual(self.builds, 1)
+		with self.assertRaises(RuntimeError):
+			state_persister.mark()
+			
+	def test_retry(self):
+	
+		failures = [ 3 ]
+		
+		def build():
+		
+			self.builds = self.builds + 1
+			if failures[0] > 0:
+				failures[0] = failures[0] - 1
+				raise resource.ResourceNotFoundError("state")
+			return self.state
+			
+		retry_delay = persister.retry_delay
+		persister.retry_delay = 0.05
+		try:
+			state_persister = persister.StatePersister(
+				self.state_res,
+				build,
+				0.
+			)
+			start = time.monotonic()
+			state_persister.mark()
+			deadline = start + 5.
+			while not self.state_res.exists() and time.monotonic() < deadline:
+				time.sleep(0.01)
+			elapsed = time.monotonic() - start
+			state_persister.close()
+		finally:
+			persister.retry_delay = retry_delay
+		self.assertEqual(self.read(), self.state)
+		self.assertEqual(self.builds, 4)
+		self.assertGreaterEqual(elapsed, 0.15)
+		
+	def test_collect(self):
+	
+		threads = set(threading.enumerate())
+		state_persister = persister.StatePersister(self.state_res, self.build, 0.)
+		state_persister.mark()
+		thread, = set(threading.enumerate()) - threads
+		deadline = time.monotonic() + 5.
+		while state_persister.dirty and time.monotonic() < deadline:
+			time.sleep(0.01)
+		del state_persister
+		gc.collect()
+		thread.join(5)
+		self.assertFalse(thread.is_alive())
+		
+	def test_close(self):
+	
+		state_persister = persister.StatePersister(
+			self.state_res,
+			self.build,
+			60.
+		)
+		state_persister.mark()
+		state_persister.close()
+		self.assertEqual(self.read(), self.state)
+		self.assertFalse(state_persister.dirty)
@@ -0,0 +1,242 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import scheduler
+
+import gc
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+class TestScheduler(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.lock = threading.Lock()
+		self.order = []
+		self.started = threading.Event()
+		self.release = threading.Event()
+		
+	def tearDown(self):
+	
+		self.release.set()
+		
+	def record(self, value):
+	
+		with self.lock:
+			self.order.append(value)
+		return value
+		
+	def block(self, value):
+	
+		self.started.set()
+		self.release.wait(5)
+		return self.record(value)
+		
+	def test_result(self):
+	
+		sched = scheduler.Scheduler(2)
+		futures = [ sched.submit("key", self.record, (i, )) for i in range(5) ]
+		self.assertEqual([ f.result(5) for f in futures ], list(range(5)))
+		sched.shutdown()
+		
+	def test_exception(self):
+	
+		sched = scheduler.Scheduler(1)
+		future = sched.submit(None, int, ("invalid", ))
+		with self.assertRaises(ValueError):
+			future.result(5)
+		sched.shutdown()
+		
+	def test_round_robin(self):
+	
+		sched = scheduler.Scheduler(1)
+		sched.submit(None, self.block, (None, ))
+		self.started.wait(5)
+		futures = [
+			sched.submit("a", self.record, ("a{}".format(i), ))
+			for i in range(3)
+		]
+		futures.append(sched.submit("b", self.record, ("b0", )))
+		futures.append(sched.submit("c", self.record, ("c0", )))
+		self.release.set()
+		for future in futures:
+			future.result(5)
+		self.assertEqual(self.order, [ None, "a0", "b0", "c0", "a1", "a2" ])
+		sched.shutdown()
+		
+	def test_key_limit(self):
+	
+		sched = scheduler.Scheduler(4, 1, {
+			"wide": 2
+		})
+		futures = [
+			sched.submit(key, self.block, (key, ))
+			for key in ("slow", "wide")
+			for i in range(3)
+		]
+		other = sched.submit("other", self.record, ("other", ))
+		self.assertEqual(other.result(5), "other")
+		stats = sched.stats()
+		self.assertEqual(stats["keys"]["slow"], {
+			"queued": 2,
+			"running": 1
+		})
+		self.assertEqual(stats["keys"]["wide"], {
+			"queued": 1,
+			"running": 2
+		})
+		self.assertEqual(stats["running"], 3)
+		self.assertEqual(stats["queued"], 3)
+		self.release.set()
+		for future in futures:
+			future.result(5)
+		self.assertEqual(sched.stats()["queued"], 0)
+		sched.shutdown()
+		
+	def test_lanes(self):
+	
+		sched = scheduler.Scheduler(1)
+		sched.submit(None, self.block, (None, ))
+		self.started.wait(5)
+		futures = [
+			sched.submit("a", self.record, ("bulk", )),
+			sched.submit(
+				"b",
+				self.record,
+				("interactive", ),
+				lane=scheduler.INTERACTIVE
+			)
+		]
+		self.release.set()
+		for future in futures:
+			future.result(5)
+		self.assertEqual(self.order, [ None, "interactive", "bulk" ])
+		sched.shutdown()
+		
+	def test_reserved(self):
+	
+		sched = scheduler.Scheduler(2, reserved=1)
+		futures = [
+			sched.submit(i, self.block, ("bulk", ))
+			for i in range(2)
+		]
+		interactive = sched.submit(
+			None,
+			self.record,
+			("interactive", ),
+			lane=scheduler.INTERACTIVE
+		)
+		self.assertEqual(interactive.result(5), "interactive")
+		self.assertEqual(sched.stats()["lanes"], {
+			"interactive": {
+				"queued": 0,
+				"running": 0
+			},
+			"bulk": {
+				"queued": 1,
+				"running": 1
+			}
+		})
+		self.release.set()
+		for future in futures:
+			future.result(5)
+		sched.shutdown()
+		
+	def test_starvation(self):
+	
+		sched = scheduler.Scheduler(1, starvation_limit=2)
+		sched.submit(None, self.block, (None, ))
+		self.started.wait(5)
+		futures = [ sched.submit(None, self.record, ("bulk", )) ]
+		futures.extend(
+			sched.submit(
+				None,
+				self.record,
+				("interactive", ),
+				lane=scheduler.INTERACTIVE
+			)
+			for i in range(4)
+		)
+		self.release.set()
+		for future in futures:
+			future.result(5)
+		self.assertEqual(self.order, [
+			None,
+			"interactive",
+			"interactive",
+			"bulk",
+			"interactive",
+			"interactive"
+		])
+		sched.shutdown()
+		
+	def test_cancel(self):
+	
+		sched = scheduler.Scheduler(1)
+		blocker = sched.submit(None, self.block, ("blocker", ))
+		future = sched.submit(None, self.record, ("cancelled", ))
+		self.assertTrue(future.cancel())
+		self.release.set()
+		self.assertEqual(blocker.result(5), "blocker")
+		sched.shutdown()
+		self.assertEqual(self.order, [ "blocker" ])
+		
+	def test_shutdown(self):
+	
+		sched = scheduler.Scheduler(1)
+		sched.shutdown()
+		with self.assertRaises(RuntimeError):
+			sched.submit(None, self.record, (None, ))
+			
+	def test_collect(self):
+	
+		threads = set(threading.enumerate())
+		sched = scheduler.Scheduler(4)
+		futures = [ sched.submit(i, self.record, (i, )) for i in range(4) ]
+		for future in futures:
+			future.result(5)
+		threads = set(threading.enumerate()) - threads
+		self.assertGreater(len(threads), 0)
+		del sched, futures, future
+		gc.collect()
+		for thread in threads:
+			thread.join(5)
+			self.assertFalse(thread.is_alive())
+			
+	def test_exit(self):
+	
+		script = "\n".join([
+			"from storm.engine import scheduler",
+			"import time",
+			"sched = scheduler.Scheduler(1)",
+			"for i in range(3):",
+			"	sched.submit(None, time.sleep, (0.1, ))",
+			"sched.submit(None, print, ('done', ))"
+		])
+		env = dict(os.environ)
+		env["PYTHONPATH"] = os.pathsep.join(sys.path)
+		output = subprocess.run(
+			[ sys.executable, "-c", script ],
+			env=env,
+			capture_output=True,
+			text=True,
+			timeout=30
+		).stdout
+		self.assertEqual(output, "done\n")
@@ -0,0 +1,161 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import subscription
+
+import queue
+import threading
+import unittest
+
+class Source:
+
+	def __init__(self, state):
+	
+		self.state = state
+		self.polls = 0
+		self.notify = None
+		self.cancelled = threading.Event()
+		
+	def poll(self):
+	
+		self.polls = self.polls + 1
+		if isinstance(self.state, Exception):
+			raise self.state
+		return self.state
+		
+	def watch(self, notify):
+	
+		self.notify = notify
+		return self.cancelled.set
+		
+class TestDiff(unittest.TestCase):
+
+	def test_diff(self):
+	
+		old = {
+			"status": "running",
+			"containers": {
+				"a": { "cpu": 1 },
+				"b": { "cpu": 2 }
+			},
+			"ports": [ 80 ]
+		}
+		new = {
+			"status": "running",
+			"containers": {
+				"a": { "cpu": 3 },
+				"c": { "cpu": 1 }
+			},
+			"ports": [ 80, 443 ]
+		}
+		changes = subscription.diff(old, new)
+		self.assertEqual(changes, [
+			{
+				"op": "remove",
+				"path": [ "containers", "b" ]
+			},
+			{
+				"op": "set",
+				"path": [ "containers", "a", "cpu" ],
+				"value": 3
+			},
+			{
+				"op": "set",
+				"path": [ "containers", "c" ],
+				"value": { "cpu": 1 }
+			},
+			{
+				"op": "set",
+				"path": [ "ports" ],
+				"value": [ 80, 443 ]
+			}
+		])
+		self.assertEqual(subscription.patch(old, changes), new)
+		self.assertEqual(old["containers"]["a"], { "cpu": 1 })
+		
+	def test_diff_equal(self):
+	
+		self.assertEqual(subscription.diff({ "a": [ 1 ] }, { "a": [ 1 ] }), [])
+		
+	def test_diff_root(self):
+	
+		changes = subscription.diff(None, { "a": 1 })
+		self.assertEqual(changes, [
+			{
+				"op": "set",
+				"path": [],
+				"value": { "a": 1 }
+			}
+		])
+		self.assertEqual(subscription.patch(None, changes), { "a": 1 })
+		
+class TestStateFeed(unittest.TestCase):
+
+	def events(self, feed):
+	
+		events = queue.Queue()
+		sub = feed.subscribe(lambda event, value: events.put((event, value)))
+		return sub, events
+		
+	def test_poll(self):
+	
+		source = Source({ "a": 1 })
+		feed = subscription.StateFeed(source.poll, interval=0.01)
+		sub, events = self.events(feed)
+		self.assertEqual(events.get(timeout=5), ("snapshot", { "a": 1 }))
+		source.state = { "a": 2 }
+		self.assertEqual(events.get(timeout=5), ("diff", [
+			{
+				"op": "set",
+				"path": [ "a" ],
+				"value": 2
+			}
+		]))
+		other, other_events = self.events(feed)
+		self.assertEqual(other_events.get(timeout=5), ("snapshot", { "a": 2 }))
+		sub.cancel()
+		self.assertFalse(feed.closed)
+		other.cancel()
+		self.assertTrue(feed.closed)
+		self.assertIsNone(feed.subscribe(lambda event, value: None))
+		
+	def test_push(self):
+	
+		source = Source({ "a": 1 })
+		feed = subscription.StateFeed(source.poll, source.watch, 0.01)
+		sub, events = self.events(feed)
+		self.assertEqual(events.get(timeout=5), ("snapshot", { "a": 1 }))
+		self.assertEqual(source.polls, 1)
+		source.state = { "a": 2 }
+		source.notify()
+		self.assertEqual(events.get(timeout=5)[0], "diff")
+		self.assertEqual(source.polls, 2)
+		sub.cancel()
+		self.assertTrue(source.cancelled.wait(5))
+		
+	def test_error(self):
+	
+		source = Source(LookupError("missing"))
+		feed = subscription.StateFeed(source.poll, interval=0.01)
+		sub, events = self.events(feed)
+		event, value = events.get(timeout=5)
+		self.assertEqual(event, "error")
+		self.assertIsInstance(value, LookupError)
+		feed.close()
+		while event != "closed":
+			event, value = events.get(timeout=5)
+		self.assertTrue(feed.closed)
@@ -0,0 +1,483 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.module import resource
+from storm.provider.resource import mem
+
+import asyncio
+import bz2
+import gzip
+import hashlib
+import lzma
+import posixpath
+import queue
+import unittest
+
+class FakeProvider:
+
+	class ResourceHandler:
+	
+		def __init__(self, uri, props):
+		
+			self.uri = uri
+			self.props = props
+			
+		def exists(self):
+		
+			return True
+			
+		def name(self):
+		
+			return posixpath.basename(self.uri.path)
+			
+		def delete(self):
+		
+			return False
+			
+		def open(self, flags):
+		
+			raise resource.ResourceNotFoundError(str(self.uri))
+			
+	def isabs(self, path):
+	
+		return posixpath.isabs(path)
+		
+	def abspath(self, path):
+	
+		return posixpath.join("/", path)
+		
+	def dirname(self, path):
+	
+		return posixpath.dirname(path)
+		
+	def join(self, base_path, relative_path):
+	
+		return posixpath.join(base_path, relative_path)
+		
+class TestProvider(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.prov = FakeProvider()
+		resource.register("fake", self.prov)
+		
+	def tearDown(self):
+	
+		resource.unregister("fake")
+		
+	def test_registered(self):
+	
+		self.assertIs(resource.provider("fake"), self.prov)
+		res = resource.ref("fake://host/base/file.txt")
+		self.assertEqual(res.scheme, "fake")
+		self.assertEqual(str(res.location), "host")
+		self.assertEqual(res.path, "/base/file.txt")
+		self.assertEqual(res.name(), "file.txt")
+		
+	def test_ref_parent(self):
+	
+		res = resource.ref("fake://host/base/file.txt")
+		self.assertEqual(res.parent().unref(), "fake://host/base")
+		self.assertEqual(res.parent().ref("other").unref(), "fake://host/base/other")
+		
+	def test_relative(self):
+	
+		with self.assertRaises(TypeError):
+			resource.ref("fake:base/file.txt")
+			
+	def test_unregister(self):
+	
+		self.assertTrue(resource.unregister("fake"))
+		self.assertFalse(resource.unregister("fake"))
+		with self.assertRaises(ImportError):
+			resource.ref("fake:///base/file.txt")
+			
+	def test_generic_stat_many(self):
+	
+		res = resource.ref("fake:///base")
+		self.assertEqual(res.stat_many([ "a", "b" ]), [ None, None ])
+		with self.assertRaises(NotImplementedError):
+			list(res.walk())
+			
+	def test_values(self):
+	
+		res = resource.ref("fake://host/base/file.txt")
+		self.assertIs(res, resource.ref("fake://host/base/file.txt"))
+		self.assertIs(res, resource.ref("fake://host/base").ref("file.txt"))
+		self.assertNotEqual(res, resource.ref("fake://host/base/other.txt"))
+		self.assertNotEqual(res, resource.ref("fake://host/base/file.txt", {
+			"key": "value"
+		}))
+		resources = {
+			resource.ref("fake://host/base/file.txt"),
+			resource.ref("fake://host/base").ref("file.txt"),
+			resource.ref("fake://host/base/other.txt").parent().ref("file.txt")
+		}
+		self.assertEqual(len(resources), 1)
+		with self.assertRaises(AttributeError):
+			res.other = None
+			
+	def test_unhashable_props(self):
+	
+		props = {
+			"key": bytearray()
+		}
+		res = resource.ref("fake://host/base/file.txt", props)
+		self.assertEqual(res, resource.ref("fake://host/base/file.txt", props))
+		self.assertIsNot(res, resource.ref("fake://host/base/file.txt", props))
+		
+	def test_unknown(self):
+	
+		with self.assertRaises(ImportError):
+			resource.provider("unknown-scheme")
+			
+class TestCached(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.cache = resource.ResourceCache(16)
+		self.res = resource.cached(resource.ref("mem:///data"), self.cache)
+		with self.res.open("wb") as f:
+			f.write(b"content")
+			
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def read(self, res):
+	
+		with res.open("rb") as f:
+			return f.read()
+			
+	def test_hit(self):
+	
+		self.assertEqual(self.read(self.res), b"content")
+		self.assertEqual(self.read(self.res), b"content")
+		self.assertEqual(self.cache.hits, 1)
+		self.assertEqual(self.cache.misses, 1)
+		self.assertEqual(self.cache.size, 7)
+		
+	def test_revalidate(self):
+	
+		self.read(self.res)
+		with resource.ref("mem:///data").open("wb") as f:
+			f.write(b"changed")
+		self.assertEqual(self.read(self.res), b"changed")
+		self.assertEqual(self.cache.hits, 0)
+		self.assertEqual(self.cache.misses, 2)
+		
+	def test_text(self):
+	
+		with self.res.open("r") as f:
+			self.assertEqual(f.read(), "content")
+		self.assertEqual(self.read(self.res), b"content")
+		self.assertEqual(self.cache.size, 14)
+		
+	def test_eviction(self):
+	
+		other_res = self.res.parent().ref("other")
+		with other_res.open("wb") as f:
+			f.write(b"other content")
+		self.read(self.res)
+		self.read(other_res)
+		self.assertEqual(self.cache.size, 13)
+		self.read(self.res)
+		self.assertEqual(self.cache.hits, 0)
+		self.assertEqual(self.cache.misses, 3)
+		
+	def test_too_large(self):
+	
+		with self.res.open("wb") as f:
+			f.write(b"x" * 17)
+		self.read(self.res)
+		self.assertEqual(self.cache.size, 0)
+		
+	def test_delete(self):
+	
+		self.read(self.res)
+		self.assertTrue(self.res.delete())
+		self.assertEqual(self.cache.size, 0)
+		with self.assertRaises(resource.ResourceNotFoundError):
+			self.res.open("rb")
+			
+	def test_no_stat(self):
+	
+		resource.register("fake", FakeProvider())
+		try:
+			res = resource.cached(resource.ref("fake:///data"), self.cache)
+			with self.assertRaises(resource.ResourceNotFoundError):
+				res.open("rb")
+			self.assertEqual(self.cache.misses, 1)
+		finally:
+			resource.unregister("fake")
+			
+class TestDigest(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.base_res = resource.ref("mem:///base")
+		for name in ("a", "b", "c"):
+			with self.base_res.ref(name).open("wb") as f:
+				f.write(name.encode() * 1000)
+				
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def test_digest(self):
+	
+		res = self.base_res.ref("a")
+		expected = hashlib.sha256(b"a" * 1000).hexdigest()
+		self.assertEqual(res.digest(), expected)
+		expected = hashlib.md5(b"a" * 1000).hexdigest()
+		self.assertEqual(res.digest("md5"), expected)
+		
+	def test_cache(self):
+	
+		cache_res = self.base_res.ref("digests.json")
+		cache = resource.DigestCache(cache_res)
+		res = self.base_res.ref("a")
+		digest = res.digest(cache=cache)
+		uri_str = res.unref()
+		mtime = res.stat().mtime
+		size = res.stat().size
+		self.assertEqual(cache.get(uri_str, "sha256", mtime, size), digest)
+		cache.store()
+		
+		cache = resource.DigestCache(cache_res)
+		self.assertEqual(cache.get(uri_str, "sha256", mtime, size), digest)
+		self.assertIsNone(cache.get(uri_str, "sha256", mtime, 0))
+		self.assertIsNone(cache.get(uri_str, "md5", mtime, size))
+		
+		with res.open("wb") as f:
+			f.write(b"changed")
+		expected = hashlib.sha256(b"changed").hexdigest()
+		self.assertEqual(res.digest(cache=cache), expected)
+		
+	def test_cache_quoted(self):
+	
+		cache_res = self.base_res.ref("digests.json")
+		res = self.base_res.ref("quoted \"a\\b\"")
+		with res.open("wb") as f:
+			f.write(b"a")
+		cache = resource.DigestCache(cache_res)
+		digest = res.digest(cache=cache)
+		cache.store()
+		stat = res.stat()
+		cache = resource.DigestCache(cache_res)
+		self.assertEqual(
+			cache.get(res.unref(), "sha256", stat.mtime, stat.size),
+			digest
+		)
+		
+	def test_cache_corrupt(self):
+	
+		cache_res = self.base_res.ref("digests.json")
+		with cache_res.open("w") as f:
+			f.write("{ \"a\": ")
+		cache = resource.DigestCache(cache_res)
+		res = self.base_res.ref("a")
+		self.assertEqual(
+			res.digest(cache=cache),
+			hashlib.sha256(b"a" * 1000).hexdigest()
+		)
+		cache.store()
+		self.assertEqual(resource.DigestCache(cache_res).get(
+			res.unref(),
+			"sha256",
+			res.stat().mtime,
+			res.stat().size
+		), res.digest())
+		
+	def test_digests(self):
+	
+		resources = [ self.base_res.ref(name) for name in ("a", "b", "c") ]
+		expected = [
+			hashlib.sha256(name.encode() * 1000).hexdigest()
+			for name in ("a", "b", "c")
+		]
+		cache = resource.DigestCache()
+		self.assertEqual(resource.digests(resources, cache=cache), expected)
+		self.assertEqual(resource.digests(resources, cache=cache), expected)
+		
+class TestDecode(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.content = b"compressed content\n" * 1000
+		for name, compress in (
+			("data.gz", gzip.compress),
+			("data.bz2", bz2.compress),
+			("data.xz", lzma.compress),
+			("gzip", gzip.compress),
+			("plain", bytes)
+		):
+			with resource.ref("mem:///" + name).open("wb") as f:
+				f.write(compress(self.content))
+				
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def test_explicit(self):
+	
+		res = resource.ref("mem:///data.bz2")
+		with res.open("rb", "bz2") as f:
+			self.assertEqual(f.read(), self.content)
+			
+	def test_auto(self):
+	
+		for name in ("data.gz", "data.bz2", "data.xz", "gzip", "plain"):
+			res = resource.ref("mem:///" + name)
+			with res.open("rb", "auto") as f:
+				self.assertEqual(f.read(), self.content)
+				
+	def test_text(self):
+	
+		with resource.ref("mem:///data.xz").open("r", "auto") as f:
+			self.assertEqual(f.readline(), "compressed content\n")
+			
+	def test_digest(self):
+	
+		res = resource.ref("mem:///data.gz")
+		with res.open("rb", "auto", "sha256") as f:
+			while len(f.read(1000)) > 0:
+				pass
+			expected = hashlib.sha256(self.content).hexdigest()
+			self.assertEqual(f.hexdigest(), expected)
+			
+	def test_write(self):
+	
+		with self.assertRaises(ValueError):
+			resource.ref("mem:///data.gz").open("wb", "gzip")
+			
+	def test_unknown(self):
+	
+		with self.assertRaises(ValueError):
+			resource.ref("mem:///data.zst").open("rb", "zstd")
+			
+class TestWatch(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.events = queue.Queue()
+		
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def notify(self, res, event):
+	
+		self.events.put((res, event))
+		
+	def test_watch(self):
+	
+		res = resource.ref("mem:///dir/data")
+		with res.watch(self.notify, 0.01) as watch:
+			self.assertEqual(watch.polled, (res, ))
+			with res.open("wb") as f:
+				f.write(b"content")
+			self.assertEqual(self.events.get(timeout=5), (res, "created"))
+			with res.open("wb") as f:
+				f.write(b"other")
+			self.assertEqual(self.events.get(timeout=5), (res, "modified"))
+			res.delete()
+			self.assertEqual(self.events.get(timeout=5), (res, "deleted"))
+		self.assertTrue(self.events.empty())
+		
+	def test_watch_many(self):
+	
+		resources = [
+			resource.ref("mem:///dir/a"),
+			resource.ref("mem:///dir/b"),
+			resource.ref("mem:///other/c"),
+			resource.ref("mem:///dir/a")
+		]
+		with resource.watch_many(resources, self.notify, 0.01) as watch:
+			self.assertEqual(watch.resources, tuple(resources[:3]))
+			resources[2].open("wb").close()
+			self.assertEqual(
+				self.events.get(timeout=5),
+				(resources[2], "created")
+			)
+			resources[1].open("wb").close()
+			self.assertEqual(
+				self.events.get(timeout=5),
+				(resources[1], "created")
+			)
+			
+	def test_exists_only(self):
+	
+		resource.register("fake", FakeProvider())
+		try:
+			res = resource.ref("fake://host/file.txt")
+			with res.watch(self.notify, 0.01):
+				pass
+		finally:
+			resource.unregister("fake")
+		self.assertTrue(self.events.empty())
+		
+class TestAsync(unittest.IsolatedAsyncioTestCase):
+
+	def tearDown(self):
+	
+		mem.clear()
+		
+	async def test_open(self):
+	
+		res = resource.ref("mem:///data")
+		self.assertFalse(await res.aexists())
+		async with await res.aopen("w") as f:
+			await f.write("content")
+		self.assertTrue(await res.aexists())
+		async with await res.aopen("r") as f:
+			self.assertEqual(await f.read(), "content")
+		self.assertTrue(await res.adelete())
+		
+	async def test_read_write_all(self):
+	
+		resources = [
+			resource.ref("mem:///data/{}".format(i))
+			for i in range(100)
+		]
+		await asyncio.gather(*[
+			resource.write_all(res, "content {}".format(i).encode())
+			for i, res in enumerate(resources)
+		])
+		contents = await asyncio.gather(*[
+			resource.read_all(res)
+			for res in resources
+		])
+		self.assertEqual(contents, [
+			"content {}".format(i).encode()
+			for i in range(100)
+		])
+		
+	async def test_not_found(self):
+	
+		with self.assertRaises(resource.ResourceNotFoundError):
+			await resource.read_all(resource.ref("mem:///missing"))
+			
+	async def test_cached(self):
+	
+		cache = resource.ResourceCache(1024)
+		res = resource.cached(resource.ref("mem:///data"), cache)
+		await resource.write_all(res, b"content")
+		for i in range(2):
+			async with await res.aopen("rb") as f:
+				self.assertEqual(await f.read(), b"content")
+		self.assertEqual(cache.hits, 1)
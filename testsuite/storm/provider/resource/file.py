@@ -0,0 +1,272 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.module import resource
+
+import gzip
+import io
+import os.path
+import queue
+import sys
+import tempfile
+import unittest
+
+class TestFile(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.base_res = resource.ref(self.tmp_dir.name)
+		
+	def tearDown(self):
+	
+		self.tmp_dir.cleanup()
+		
+	def test_default_scheme(self):
+	
+		self.assertEqual(self.base_res.scheme, "file")
+		self.assertEqual(self.base_res.path, self.tmp_dir.name)
+		
+	def test_write_read(self):
+	
+		res = self.base_res.ref("dir").ref("data.txt")
+		self.assertFalse(res.exists())
+		with res.open("w") as f:
+			f.write("content")
+		self.assertTrue(res.exists())
+		self.assertEqual(res.name(), "data.txt")
+		with res.open("r") as f:
+			self.assertEqual(f.read(), "content")
+			
+	def test_not_found(self):
+	
+		res = self.base_res.ref("missing")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			res.open("r")
+			
+	def test_delete(self):
+	
+		res = self.base_res.ref("data")
+		self.assertFalse(res.delete())
+		with res.open("wb") as f:
+			f.write(b"content")
+		self.assertTrue(res.delete())
+		self.assertFalse(res.exists())
+		
+	def test_stat(self):
+	
+		res = self.base_res.ref("data")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			res.stat()
+		with res.open("wb") as f:
+			f.write(b"content")
+		stat = res.stat()
+		self.assertEqual(stat.size, 7)
+		self.assertFalse(stat.isdir)
+		self.assertTrue(self.base_res.stat().isdir)
+		
+	def test_copy_to(self):
+	
+		source_res = self.base_res.ref("source")
+		with source_res.open("wb") as f:
+			f.write(b"x" * 100000)
+		target_res = self.base_res.ref("dir").ref("target")
+		calls = []
+		
+		def progress(copied, size):
+		
+			calls.append((copied, size))
+			
+		self.assertEqual(source_res.copy_to(target_res, progress), 100000)
+		self.assertEqual(calls[-1], (100000, 100000))
+		with target_res.open("rb") as f:
+			self.assertEqual(f.read(), b"x" * 100000)
+			
+	def test_copy_to_mem(self):
+	
+		source_res = self.base_res.ref("source")
+		with source_res.open("wb") as f:
+			f.write(b"content")
+		target_res = resource.ref("mem:///target")
+		try:
+			self.assertEqual(source_res.copy_to(target_res), 7)
+			with target_res.open("rb") as f:
+				self.assertEqual(f.read(), b"content")
+		finally:
+			target_res.delete()
+			
+	def test_replace(self):
+	
+		source_res = self.base_res.ref("source")
+		target_res = self.base_res.ref("dir").ref("target")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			source_res.replace(target_res)
+		for res, content in ((target_res, "old"), (source_res, "new")):
+			with res.open("w") as f:
+				f.write(content)
+		self.assertTrue(source_res.replace(target_res))
+		self.assertFalse(source_res.exists())
+		with target_res.open("r") as f:
+			self.assertEqual(f.read(), "new")
+			
+	def test_replace_mem(self):
+	
+		source_res = self.base_res.ref("source")
+		with source_res.open("wb") as f:
+			f.write(b"content")
+		target_res = resource.ref("mem:///target")
+		try:
+			self.assertFalse(source_res.replace(target_res))
+			self.assertFalse(source_res.exists())
+			with target_res.open("rb") as f:
+				self.assertEqual(f.read(), b"content")
+		finally:
+			target_res.delete()
+			
+	def test_mmap(self):
+	
+		path = os.path.join(self.tmp_dir.name, "data")
+		res = resource.ref(path, {
+			"mmap": True
+		})
+		with res.open("wb") as f:
+			f.write(b"mapped content")
+		with res.open("rb") as f:
+			self.assertIsInstance(f, io.RawIOBase)
+			self.assertEqual(f.read(6), b"mapped")
+			buf = bytearray(3)
+			self.assertEqual(f.readinto(buf), 3)
+			self.assertEqual(buf, b" co")
+			self.assertEqual(f.read(), b"ntent")
+		with res.open_range(7) as f:
+			self.assertEqual(f.read(), b"content")
+		with io.BufferedReader(res.open("rb")) as f:
+			self.assertEqual(f.read(6), b"mapped")
+		
+	def test_view(self):
+	
+		res = self.base_res.ref("data")
+		with res.open("wb") as f:
+			f.write(b"content")
+		view = res.view()
+		self.assertTrue(view.readonly)
+		self.assertEqual(bytes(view), b"content")
+		
+	def test_mmap_decode(self):
+	
+		for name, content in (
+			("data", b"mapped content"),
+			("compressed", gzip.compress(b"mapped content"))
+		):
+			res = resource.ref(os.path.join(self.tmp_dir.name, name), {
+				"mmap": True
+			})
+			with res.open("wb") as f:
+				f.write(content)
+			with res.open("rb", "auto") as f:
+				self.assertEqual(f.read(), b"mapped content")
+				
+	def test_mmap_empty(self):
+	
+		path = os.path.join(self.tmp_dir.name, "empty")
+		res = resource.ref(path, {
+			"mmap": True
+		})
+		res.open("wb").close()
+		with res.open("rb") as f:
+			self.assertEqual(f.read(), b"")
+			
+	def test_list(self):
+	
+		for name in ("a", "b", "c"):
+			self.base_res.ref(name).open("wb").close()
+		entries = sorted(
+			(res.name(), stat.isdir)
+			for res, stat in self.base_res.list()
+		)
+		self.assertEqual(entries, [
+			("a", False),
+			("b", False),
+			("c", False)
+		])
+		
+	def test_walk(self):
+	
+		with self.base_res.ref("a/b/c").open("wb") as f:
+			f.write(b"content")
+		self.base_res.ref("a/d").open("wb").close()
+		entries = sorted(
+			(res.path[len(self.tmp_dir.name):], stat.size)
+			for res, stat in self.base_res.walk()
+			if not stat.isdir
+		)
+		self.assertEqual(entries, [
+			("/a/b/c", 7),
+			("/a/d", 0)
+		])
+		
+	@unittest.skipUnless(hasattr(os, "symlink"), "requires symbolic links")
+	def test_walk_symlink(self):
+	
+		with self.base_res.ref("a/b").open("wb") as f:
+			f.write(b"content")
+		os.symlink("..", os.path.join(self.tmp_dir.name, "a", "loop"))
+		entries = sorted(
+			(res.path[len(self.tmp_dir.name):], stat.isdir)
+			for res, stat in self.base_res.walk()
+		)
+		self.assertEqual(entries, [
+			("/a", True),
+			("/a/b", False),
+			("/a/loop", False)
+		])
+		
+	def test_stat_many(self):
+	
+		with self.base_res.ref("a/b").open("wb") as f:
+			f.write(b"content")
+		stats = self.base_res.stat_many([ "a", "a/b", "missing", "a/b/c" ])
+		self.assertTrue(stats[0].isdir)
+		self.assertEqual(stats[1].size, 7)
+		self.assertIsNone(stats[2])
+		self.assertIsNone(stats[3])
+		
+	@unittest.skipUnless(sys.platform == "linux", "requires inotify")
+	def test_watch(self):
+	
+		events = queue.Queue()
+		
+		def notify(res, event):
+		
+			events.put((res, event))
+			
+		res = self.base_res.ref("data")
+		with res.watch(notify) as watch:
+			self.assertEqual(watch.polled, ())
+			with res.open("wb") as f:
+				f.write(b"content")
+			self.assertEqual(events.get(timeout=5), (res, "created"))
+			self.assertEqual(events.get(timeout=5), (res, "modified"))
+			res.delete()
+			while events.get(timeout=5) != (res, "deleted"):
+				pass
+				
+	def test_watch_missing_parent(self):
+	
+		res = self.base_res.ref("missing/data")
+		with res.watch(lambda res, event: None) as watch:
+			self.assertEqual(watch.polled, (res, ))
@@ -0,0 +1,197 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.module import resource
+from storm.provider.resource import http as http_resource
+
+import hashlib
+import http.server
+import threading
+import unittest
+
+class TestHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = "HTTP/1.1"
+	
+	contents = {}
+	
+	connections = 0
+	
+	def setup(self):
+	
+		super().setup()
+		TestHTTPRequestHandler.connections += 1
+		
+	def log_message(self, format, *args):
+	
+		pass
+		
+	def __etag(self, data):
+	
+		return "\"{}\"".format(hashlib.sha256(data).hexdigest())
+		
+	def __reply(self, status, data=b"", headers=None, body=True):
+	
+		self.send_response(status)
+		self.send_header("Content-Length", str(len(data)))
+		for name, value in (headers or {}).items():
+			self.send_header(name, value)
+		self.end_headers()
+		if body:
+			self.wfile.write(data)
+			
+	def __get(self, body):
+	
+		data = self.contents.get(self.path)
+		if data is None:
+			self.__reply(404, body=body)
+			return
+		etag = self.__etag(data)
+		if self.headers.get("If-None-Match") == etag:
+			self.__reply(304, headers={
+				"ETag": etag
+			}, body=False)
+			return
+		byte_range = self.headers.get("Range")
+		if byte_range is not None:
+			start, end = byte_range[len("bytes="):].split("-")
+			if int(start) >= len(data):
+				self.__reply(416, body=body)
+				return
+			end = len(data) if end == "" else int(end) + 1
+			self.__reply(206, data[int(start):end], {
+				"ETag": etag
+			}, body)
+			return
+		self.__reply(200, data, {
+			"ETag": etag
+		}, body)
+		
+	def do_HEAD(self):
+	
+		self.__get(False)
+		
+	def do_GET(self):
+	
+		self.__get(True)
+		
+	def do_PUT(self):
+	
+		length = int(self.headers.get("Content-Length", 0))
+		self.contents[self.path] = self.rfile.read(length)
+		self.__reply(204)
+		
+	def do_DELETE(self):
+	
+		if self.contents.pop(self.path, None) is None:
+			self.__reply(404)
+		else:
+			self.__reply(204)
+			
+class TestHTTP(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+	
+		cls.server = http.server.ThreadingHTTPServer(
+			("127.0.0.1", 0),
+			TestHTTPRequestHandler
+		)
+		cls.thread = threading.Thread(target=cls.server.serve_forever)
+		cls.thread.start()
+		
+	@classmethod
+	def tearDownClass(cls):
+	
+		http_resource.clear()
+		cls.server.shutdown()
+		cls.server.server_close()
+		cls.thread.join()
+		
+	def setUp(self):
+	
+		TestHTTPRequestHandler.contents.clear()
+		TestHTTPRequestHandler.contents["/base/data"] = b"0123456789"
+		self.base_res = resource.ref("http://127.0.0.1:{}/base".format(
+			self.server.server_address[1]
+		))
+		
+	def test_read(self):
+	
+		res = self.base_res.ref("data")
+		self.assertTrue(res.exists())
+		self.assertEqual(res.name(), "data")
+		with res.open("rb") as f:
+			self.assertEqual(f.read(), b"0123456789")
+		with res.open("r") as f:
+			self.assertEqual(f.read(), "0123456789")
+			
+	def test_not_found(self):
+	
+		res = self.base_res.ref("missing")
+		self.assertFalse(res.exists())
+		with self.assertRaises(resource.ResourceNotFoundError):
+			res.open("rb")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			res.stat()
+			
+	def test_write_delete(self):
+	
+		res = self.base_res.ref("other")
+		with res.open("w") as f:
+			f.write("content")
+		contents = TestHTTPRequestHandler.contents
+		self.assertEqual(contents["/base/other"], b"content")
+		self.assertTrue(res.delete())
+		self.assertFalse(res.delete())
+		
+	def test_keep_alive(self):
+	
+		res = self.base_res.ref("data")
+		res.exists()
+		connections = TestHTTPRequestHandler.connections
+		for i in range(10):
+			with res.open("rb") as f:
+				f.read()
+			res.stat()
+		self.assertEqual(TestHTTPRequestHandler.connections, connections)
+		
+	def test_range(self):
+	
+		res = self.base_res.ref("data")
+		with res.open_range(2, 3) as f:
+			self.assertEqual(f.read(), b"234")
+		with res.open_range(7) as f:
+			self.assertEqual(f.read(), b"789")
+		with res.open_range(20, 2) as f:
+			self.assertEqual(f.read(), b"")
+		with res.open_range(20) as f:
+			self.assertEqual(f.read(), b"")
+			
+	def test_cached(self):
+	
+		cache = resource.ResourceCache(1024)
+		res = resource.cached(self.base_res.ref("data"), cache)
+		for i in range(3):
+			with res.open("rb") as f:
+				self.assertEqual(f.read(), b"0123456789")
+		self.assertEqual(cache.misses, 1)
+		self.assertEqual(cache.hits, 2)
+		TestHTTPRequestHandler.contents["/base/data"] = b"changed"
+		with res.open("rb") as f:
+			self.assertEqual(f.read(), b"changed")
+		self.assertEqual(cache.misses, 2)
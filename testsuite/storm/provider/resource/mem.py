@@ -0,0 +1,172 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.engine import Engine
+from storm.module import resource
+from storm.provider.resource import mem
+
+import io
+import threading
+import unittest
+
+class TestMem(unittest.TestCase):
+
+	def tearDown(self):
+	
+		mem.clear()
+		
+	def test_write_read(self):
+	
+		res = resource.ref("mem:///dir/data.txt")
+		self.assertFalse(res.exists())
+		with res.open("w") as f:
+			self.assertIsInstance(f, io.StringIO)
+			f.write("content")
+		self.assertTrue(res.exists())
+		self.assertTrue(res.parent().exists())
+		with res.open("r") as f:
+			self.assertEqual(f.read(), "content")
+		with res.open("a") as f:
+			f.write(" appended")
+		with res.open("rb") as f:
+			self.assertIsInstance(f, io.BytesIO)
+			self.assertEqual(f.read(), b"content appended")
+			
+	def test_not_found(self):
+	
+		with self.assertRaises(resource.ResourceNotFoundError):
+			resource.ref("mem:///missing").open("rb")
+			
+	def test_locations(self):
+	
+		res_a = resource.ref("mem://a/data")
+		res_b = resource.ref("mem://b/data")
+		with res_a.open("wb") as f:
+			f.write(b"a")
+		self.assertFalse(res_b.exists())
+		mem.clear("a")
+		self.assertFalse(res_a.exists())
+		
+	def test_view(self):
+	
+		res = resource.ref("mem:///data")
+		with res.open("wb") as f:
+			f.write(b"first")
+		view = res.view()
+		self.assertTrue(view.readonly)
+		self.assertIs(res.view().obj, view.obj)
+		with res.open("wb") as f:
+			f.write(b"second")
+		self.assertEqual(bytes(view), b"first")
+		self.assertEqual(bytes(res.view()), b"second")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			resource.ref("mem:///missing").view()
+		
+	def test_copy_to(self):
+	
+		source_res = resource.ref("mem:///source")
+		with source_res.open("wb") as f:
+			f.write(b"content")
+		target_res = resource.ref("mem://other/target")
+		self.assertEqual(source_res.copy_to(target_res), 7)
+		with target_res.open("rb") as f:
+			self.assertEqual(f.read(), b"content")
+		with source_res.open("ab") as f:
+			f.write(b" appended")
+		with target_res.open("rb") as f:
+			self.assertEqual(f.read(), b"content")
+			
+	def test_replace(self):
+	
+		source_res = resource.ref("mem:///dir/source")
+		target_res = resource.ref("mem:///other/target")
+		with self.assertRaises(resource.ResourceNotFoundError):
+			source_res.replace(target_res)
+		with source_res.open("wb") as f:
+			f.write(b"content")
+		self.assertTrue(source_res.replace(target_res))
+		self.assertFalse(source_res.exists())
+		self.assertFalse(resource.ref("mem:///dir").exists())
+		with target_res.open("rb") as f:
+			self.assertEqual(f.read(), b"content")
+			
+	def test_delete_list(self):
+	
+		base_res = resource.ref("mem:///base")
+		for name in ("a", "b"):
+			base_res.ref(name).open("wb").close()
+		names = sorted(res.name() for res, stat in base_res.list())
+		self.assertEqual(names, ["a", "b"])
+		self.assertTrue(base_res.ref("a").delete())
+		self.assertFalse(base_res.ref("a").delete())
+		self.assertTrue(base_res.ref("b").delete())
+		self.assertFalse(base_res.exists())
+		
+	def test_stat_many(self):
+	
+		base_res = resource.ref("mem:///base")
+		with base_res.ref("a/b").open("wb") as f:
+			f.write(b"content")
+		stats = base_res.stat_many([ "a", "a/b", "missing" ])
+		self.assertTrue(stats[0].isdir)
+		self.assertEqual(stats[1].size, 7)
+		self.assertIsNone(stats[2])
+		
+	def test_concurrent_writes(self):
+	
+		def write(index):
+		
+			for i in range(100):
+				res = resource.ref("mem:///dir/{}/{}".format(index, i))
+				with res.open("wb") as f:
+					f.write(b"x")
+					
+		threads = [
+			threading.Thread(target=write, args=(index,))
+			for index in range(8)
+		]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(list(resource.ref("mem:///dir").list())), 8)
+		self.assertEqual(len(list(resource.ref("mem:///dir").walk())), 808)
+		
+	def test_engine_state(self):
+	
+		state_res = resource.ref("mem:///engine/state.json")
+		engine = Engine(state_res)
+		engine.register("local", "unknown", {
+			"key": "value"
+		}).result()
+		engine.store()
+		
+		events = []
+		
+		class EventQueue:
+		
+			def dispatch(self, task, name, value):
+			
+				events.append((name, value))
+				
+		engine = Engine(state_res, EventQueue())
+		self.assertEqual(engine.platforms().result(), 1)
+		self.assertIn(("platform-entry", {
+			"name": "local",
+			"available": False,
+			"provider": "unknown"
+		}), events)
@@ -0,0 +1,74 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.module import resource
+
+import io
+import os.path
+import tarfile
+import tempfile
+import unittest
+
+class TestTar(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		
+	def tearDown(self):
+	
+		self.tmp_dir.cleanup()
+		
+	def archive(self, mode):
+	
+		name = "archive.tar.{}".format(mode).rstrip(".")
+		archive_path = os.path.join(self.tmp_dir.name, name)
+		with tarfile.open(archive_path, "w:{}".format(mode)) as tf:
+			for name, data in (
+				("a.txt", b"a content"),
+				("dir/b.txt", b"b content" * 1000)
+			):
+				info = tarfile.TarInfo(name)
+				info.size = len(data)
+				tf.addfile(info, io.BytesIO(data))
+		return resource.ref("tar://{}!/".format(archive_path))
+		
+	def check(self, base_res):
+	
+		with base_res.ref("a.txt").open("r") as f:
+			self.assertEqual(f.read(), "a content")
+		with base_res.ref("dir/b.txt").open("rb") as f:
+			self.assertEqual(f.read(), b"b content" * 1000)
+		with base_res.ref("dir/b.txt").open_range(9000 - 7) as f:
+			self.assertEqual(f.read(), b"content")
+		names = sorted(res.name() for res, stat in base_res.list())
+		self.assertEqual(names, [ "a.txt", "dir" ])
+		self.assertFalse(base_res.ref("missing").exists())
+		
+	def test_uncompressed(self):
+	
+		base_res = self.archive("")
+		self.check(base_res)
+		self.assertEqual(bytes(base_res.ref("a.txt").view()), b"a content")
+		
+	def test_gzip(self):
+	
+		self.check(self.archive("gz"))
+		
+	def test_xz(self):
+	
+		self.check(self.archive("xz"))
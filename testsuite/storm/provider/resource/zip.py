@@ -0,0 +1,131 @@
+#
+# This file is part of STORM.
+#
+# STORM is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# STORM is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with STORM.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from storm.module import resource
+
+import mmap
+import os
+import os.path
+import tempfile
+import time
+import unittest
+import zipfile
+
+class TestZip(unittest.TestCase):
+
+	def setUp(self):
+	
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.archive_path = os.path.join(self.tmp_dir.name, "archive.zip")
+		with zipfile.ZipFile(self.archive_path, "w") as zf:
+			zf.writestr("stored.txt", "stored content", zipfile.ZIP_STORED)
+			zf.writestr(
+				"dir/deflated.txt",
+				"deflated content",
+				zipfile.ZIP_DEFLATED
+			)
+		self.base_res = resource.ref("zip://{}!/".format(self.archive_path))
+		
+	def tearDown(self):
+	
+		self.tmp_dir.cleanup()
+		
+	def test_read(self):
+	
+		res = self.base_res.ref("stored.txt")
+		self.assertTrue(res.exists())
+		self.assertEqual(res.name(), "stored.txt")
+		with res.open("r") as f:
+			self.assertEqual(f.read(), "stored content")
+		res = self.base_res.ref("dir").ref("deflated.txt")
+		with res.open("rb") as f:
+			self.assertEqual(f.read(), b"deflated content")
+		self.assertEqual(res.stat().size, 16)
+		
+	def test_missing(self):
+	
+		res = self.base_res.ref("missing")
+		self.assertFalse(res.exists())
+		with self.assertRaises(resource.ResourceNotFoundError):
+			res.open("rb")
+		res = resource.ref("zip://{}.missing!/a".format(self.archive_path))
+		self.assertFalse(res.exists())
+		
+	def test_paths(self):
+	
+		res = self.base_res.ref("dir/deflated.txt")
+		self.assertEqual(res.parent().name(), "dir")
+		self.assertEqual(res.parent().parent().name(), "archive.zip")
+		self.assertEqual(res.parent().parent().parent().path, self.tmp_dir.name)
+		
+	def test_list(self):
+	
+		entries = sorted(
+			(res.name(), stat.isdir)
+			for res, stat in self.base_res.list()
+		)
+		self.assertEqual(entries, [
+			("dir", True),
+			("stored.txt", False)
+		])
+		self.assertEqual(len(list(self.base_res.walk())), 3)
+		
+	def test_view(self):
+	
+		view = self.base_res.ref("stored.txt").view()
+		self.assertTrue(view.readonly)
+		self.assertIsInstance(view.obj, mmap.mmap)
+		self.assertEqual(bytes(view), b"stored content")
+		view = self.base_res.ref("dir/deflated.txt").view()
+		self.assertEqual(bytes(view), b"deflated content")
+		
+	def test_invalidate(self):
+	
+		from storm.provider.resource import _archive
+		
+		res = self.base_res.ref("stored.txt")
+		res.stat()
+		idx = _archive._indexes[self.archive_path]
+		time.sleep(0.01)
+		with zipfile.ZipFile(self.archive_path, "w") as zf:
+			zf.writestr("other.txt", "other content")
+		self.assertFalse(res.exists())
+		self.assertTrue(self.base_res.ref("other.txt").exists())
+		self.assertIsNone(idx.handle.fp)
+		
+	def test_index_limit(self):
+	
+		from storm.provider.resource import _archive
+		
+		other_path = os.path.join(self.tmp_dir.name, "other.zip")
+		with zipfile.ZipFile(other_path, "w") as zf:
+			zf.writestr("other.txt", "other content")
+		index_limit = _archive.index_limit
+		_archive.index_limit = 1
+		try:
+			view = self.base_res.ref("stored.txt").view()
+			idx = _archive._indexes[self.archive_path]
+			f = self.base_res.ref("dir/deflated.txt").open("rb")
+			resource.ref("zip://{}!/other.txt".format(other_path)).stat()
+		finally:
+			_archive.index_limit = index_limit
+		self.assertNotIn(self.archive_path, _archive._indexes)
+		self.assertIsNone(idx.handle.fp)
+		with f:
+			self.assertEqual(f.read(), b"deflated content")
+		self.assertEqual(bytes(view), b"stored content")
+		self.assertTrue(self.base_res.ref("stored.txt").exists())